@@ -0,0 +1,104 @@
+import bisect
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Match tiers, best first
+CODE, CODE_PREFIX, WORD_PREFIX, TRIGRAM = range(4)
+
+
+def normalize(text):
+    """Lower-case text without accents, punctuation turned into spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def route_counts(routes):
+    """Number of routes ('FRA-MUC' codes) serving each airport."""
+    counts = Counter()
+    for route in routes:
+        origin, _, destination = route.partition('-')
+        if origin != destination:
+            counts[origin] += 1
+            counts[destination] += 1
+    return counts
+
+
+class AirportIndex:
+    """
+    In-memory search over airport code, name and city: exact and prefix
+    matches on the code, prefix matches on the words of the name and city,
+    then trigram matches for misspellings, each tier ranked by the number
+    of routes serving the airport.
+    """
+
+    def __init__(self, version, airports, routes):
+        self.version = version
+        self.airports = [dict(zip(airports, values)) for values in zip(*airports.values())]
+        counts = route_counts(routes)
+        for airport in self.airports:
+            airport['routes'] = counts.get(airport['code'], 0)
+        # Most served airports first, so every tier is already ranked
+        self.airports.sort(key=lambda a: (-a['routes'], a['code'] or ''))
+
+        self.codes = {}
+        words = set()
+        self.trigrams = defaultdict(set)
+        for i, airport in enumerate(self.airports):
+            code = normalize(airport['code'])
+            if code:
+                self.codes.setdefault(code, i)
+            text = normalize(f"{airport['name'] or ''} {airport['city'] or ''}")
+            for word in text.split():
+                words.add((word, i))
+            for gram in trigrams(f"{code} {text}"):
+                self.trigrams[gram].add(i)
+        # (word, airport index) pairs sorted for prefix range scans
+        self.words = sorted(words)
+        self.sorted_codes = sorted(self.codes)
+
+    def _code_prefixed(self, prefix):
+        start = bisect.bisect_left(self.sorted_codes, prefix)
+        end = bisect.bisect_left(self.sorted_codes, prefix + '\x7f')
+        return [self.codes[code] for code in self.sorted_codes[start:end]]
+
+    def _word_prefixed(self, prefix):
+        start = bisect.bisect_left(self.words, (prefix, -1))
+        end = bisect.bisect_left(self.words, (prefix + '\x7f', -1))
+        return {i for _, i in self.words[start:end]}
+
+    def search(self, q, limit=10):
+        """Airports matching q, best match first; the most served airports when q is empty."""
+        q = normalize(q)
+        if not q:
+            return self.airports[:limit]
+        # airport index -> (tier, -shared trigrams); lower is better
+        ranks = {}
+        if q in self.codes:
+            ranks[self.codes[q]] = (CODE, 0)
+        for i in self._code_prefixed(q):
+            ranks.setdefault(i, (CODE_PREFIX, 0))
+        # Every word of q must prefix a word of the name or city
+        matches = None
+        for term in q.split():
+            found = self._word_prefixed(term)
+            matches = found if matches is None else matches & found
+        for i in matches:
+            ranks.setdefault(i, (WORD_PREFIX, 0))
+        if len(ranks) < limit and len(q) >= 3:
+            grams = trigrams(q)
+            shared = Counter(i for gram in grams for i in self.trigrams.get(gram, ()))
+            # At least half of the trigrams of q, most shared first
+            for i, count in shared.most_common():
+                if count * 2 < len(grams):
+                    break
+                ranks.setdefault(i, (TRIGRAM, -count))
+        # Airports are sorted by route count, the index breaks ties
+        best = sorted(ranks, key=lambda i: (ranks[i], i))
+        return [self.airports[i] for i in best[:limit]]
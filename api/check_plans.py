@@ -0,0 +1,24 @@
+"""
+Fail if one of the hot API queries is planned with a full label or
+relationship scan, e.g. because an index is missing.
+
+Run in the fastapi container: python check_plans.py
+"""
+import logging
+import sys
+
+from neo4j import GraphDatabase
+
+from main import HOT_QUERIES
+import neo4j_schema
+
+logging.basicConfig(level=logging.INFO)
+
+driver = GraphDatabase.driver("bolt://neo4j:7687", auth=("neo4j", "neo4jproject"))
+try:
+    neo4j_schema.check_query_plans(driver, HOT_QUERIES)
+except RuntimeError as e:
+    logging.error(e)
+    sys.exit(1)
+finally:
+    driver.close()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroadcaster:
+    """
+    Fan out the events returned by poll() to every subscriber queue. poll
+    runs every `interval` seconds and only while someone is subscribed, so
+    upstream reads don't grow with the number of connections.
+    """
+
+    def __init__(self, poll, interval=2, queue_size=100):
+        self.poll = poll
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A subscriber that can't keep up is disconnected, it resyncs when it reconnects
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def run(self):
+        while self.subscribers:
+            try:
+                for event in await self.poll():
+                    self.publish(event)
+            except Exception:
+                logger.exception("Polling events failed")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+async def stream(broadcaster, first_events, encode, heartbeat=15):
+    """
+    Server-sent events stream of the events of broadcaster, after
+    first_events. A comment line is sent every heartbeat seconds so proxies
+    keep idle connections open.
+    """
+    queue = broadcaster.subscribe()
+    try:
+        for event in first_events:
+            yield b'data: ' + encode(event) + b'\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': keep-alive\n\n'
+                continue
+            if event is None:
+                return
+            yield b'data: ' + encode(event) + b'\n\n'
+    finally:
+        broadcaster.unsubscribe(queue)
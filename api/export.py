@@ -0,0 +1,60 @@
+import csv
+import io
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional, only needed for format=arrow
+    pa = None
+
+# Flights are decoded and encoded CHUNK_SIZE at a time, so memory doesn't grow
+# with the number of flights exported
+CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def record_chunks(snap, indexes, size=CHUNK_SIZE):
+    """Yield the flight records of snap at indexes, size at a time."""
+    for start in range(0, len(indexes), size):
+        yield snap.records(indexes[start:start + size])
+
+
+def ndjson_stream(chunks, encode):
+    """One JSON document per line."""
+    for records in chunks:
+        yield b''.join(encode(record) + b'\n' for record in records)
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def csv_stream(chunks, fields):
+    """A header line then one line per flight, empty fields for missing values."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields)
+    writer.writeheader()
+    yield _drain(buffer).encode('utf-8')
+    for records in chunks:
+        writer.writerows(records)
+        yield _drain(buffer).encode('utf-8')
+
+
+def arrow_stream(chunks, fields):
+    """Arrow IPC stream with one record batch per chunk."""
+    schema = pa.schema([(field, pa.int32() if field == 'flight_number' else pa.string()) for field in fields])
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, schema) as writer:
+        yield _drain(buffer)
+        for records in chunks:
+            writer.write_batch(pa.RecordBatch.from_pylist(records, schema))
+            yield _drain(buffer)
+    # End-of-stream marker
+    yield _drain(buffer)
@@ -0,0 +1,142 @@
+import numpy as np
+
+import timetable_file
+
+INF = float('inf')
+
+
+def to_minutes(times):
+    """Convert 'YYYY-MM-DDTHH:MM' strings to integer minutes since epoch."""
+    return np.array(times, dtype='datetime64[m]').astype('int64')
+
+
+def from_minutes(minutes):
+    return str(np.datetime64(int(minutes), 'm'))
+
+
+class Timetable:
+    """
+    Flights as connections sorted by departure time, searched with the
+    connection scan algorithm for itineraries of up to max_stops stops.
+    """
+
+    def __init__(self, stops, origin, destination, dep, arr, trip, flight):
+        """
+        Connections as parallel arrays: origin and destination (indexes into
+        the stop codes), departure and arrival minutes, and trip ids (equal
+        for the legs of one flight number). flight(i) returns the record of
+        connection i, it is only called for the legs of the itineraries found.
+        """
+        order = np.argsort(dep, kind='stable')
+        self.stop_index = {code: i for i, code in enumerate(stops)}
+        self.dep = dep[order]
+        self.dep_list = self.dep.tolist()
+        self.arr = arr[order].tolist()
+        self.origin = origin[order].tolist()
+        self.destination = destination[order].tolist()
+        # Legs of the same flight number don't need a connection time between them
+        self.trip = trip[order].tolist()
+        self.index = order
+        self.flight = flight
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        """Timetable of the flights of a TimetableSnapshot, read from its columns."""
+        flights = snap.flights
+        std, atd = flights['std'], flights['atd']
+        # Flights without both times can't be chained
+        indexes = np.flatnonzero((flights['origin'] != flights['destination'])
+                                 & (std != timetable_file.NULL_TIME) & (atd != timetable_file.NULL_TIME))
+        flights, std, atd = flights[indexes], std[indexes], atd[indexes]
+        # ATD is stored on the day of departure: overnight flights land the next day
+        atd = np.where(atd < std, atd + 1440, atd)
+        ids = np.union1d(flights['origin'], flights['destination'])
+        trip = (flights['airline'].astype('int64') << 32) | flights['flight_number'].astype('int64') & 0xffffffff
+        return cls([snap.strings[i] for i in ids.tolist()],
+                   np.searchsorted(ids, flights['origin']), np.searchsorted(ids, flights['destination']),
+                   std, atd, trip, lambda i: snap.record(int(indexes[i])))
+
+    def scan(self, origin, destination, start, max_stops, min_connection, max_duration):
+        """
+        Earliest arrival at destination with exactly 1..max_stops+1 flights,
+        leaving origin at or after start. Returns {legs: [connection indexes]}.
+        """
+        legs = max_stops + 1
+        best = [dict() for _ in range(legs + 1)]
+        parent = [dict() for _ in range(legs + 1)]
+        best[0][origin] = start - min_connection
+        # Stops a further flight can leave from
+        reached_stops = {origin}
+        dest_best = INF
+
+        dep, arr, orig, dest, trip = self.dep_list, self.arr, self.origin, self.destination, self.trip
+        end = start + max_duration
+        for c in range(int(np.searchsorted(self.dep, start)), len(dep)):
+            t = dep[c]
+            if t > dest_best or t > end:
+                break
+            o = orig[c]
+            if o not in reached_stops:
+                continue
+            d = dest[c]
+            # Descending so a connection is never chained to itself
+            for k in range(legs, 0, -1):
+                reached = best[k - 1].get(o)
+                if reached is None:
+                    continue
+                previous = parent[k - 1].get(o)
+                same_trip = previous is not None and trip[previous] == trip[c]
+                if t < reached + (0 if same_trip else min_connection):
+                    continue
+                if arr[c] < best[k].get(d, INF):
+                    best[k][d] = arr[c]
+                    parent[k][d] = c
+                    if k < legs:
+                        reached_stops.add(d)
+                    if d == destination and arr[c] < dest_best:
+                        dest_best = arr[c]
+
+        journeys = {}
+        for k in range(1, legs + 1):
+            if destination not in parent[k]:
+                continue
+            path, stop = [], destination
+            for j in range(k, 0, -1):
+                c = parent[j][stop]
+                path.append(c)
+                stop = self.origin[c]
+            journeys[k] = path[::-1]
+        return journeys
+
+    def search(self, origin, destination, after, max_stops=2, min_connection=45,
+               limit=3, max_duration=24 * 60):
+        """
+        Itineraries from origin to destination leaving after `after`
+        ('YYYY-MM-DDTHH:MM'), ranked by earliest arrival then fewest stops.
+        """
+        if origin not in self.stop_index or destination not in self.stop_index or origin == destination:
+            return []
+        o, d = self.stop_index[origin], self.stop_index[destination]
+        start = int(to_minutes([after])[0]) + 1
+        found = {}
+        while len(found) < limit:
+            journeys = self.scan(o, d, start, max_stops, min_connection, max_duration)
+            if not journeys:
+                break
+            for path in journeys.values():
+                found.setdefault(tuple(path), path)
+            # Next round: itineraries leaving after the earliest one found
+            start = min(self.dep_list[path[0]] for path in journeys.values()) + 1
+
+        itineraries = []
+        for path in found.values():
+            departure, arrival = self.dep_list[path[0]], self.arr[path[-1]]
+            itineraries.append({
+                'departure': from_minutes(departure),
+                'arrival': from_minutes(arrival),
+                'duration': arrival - departure,
+                'stops': len(path) - 1,
+                'flights': [self.flight(int(self.index[c])) for c in path],
+            })
+        itineraries.sort(key=lambda i: (i['arrival'], i['stops'], i['departure']))
+        return itineraries[:limit]
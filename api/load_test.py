@@ -0,0 +1,96 @@
+"""
+Load test the API at a fixed concurrency and report the latency percentiles
+of each path, e.g. before and after a change by passing both servers:
+
+    python load_test.py http://before:8000 http://after:8000 --concurrency 50 --duration 30
+
+Each of the `concurrency` clients sends the next request of the path mix as
+soon as its previous one completed. The default mix puts slow upstream
+calls (/flight_status) next to the snapshot lookups they must not stall.
+"""
+import argparse
+import asyncio
+import math
+import time
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_PATHS = ['/departures/FRA', '/arrivals/MUC', '/departures/JFK?limit=20', '/airports',
+                 '/flights_by_route?origin=FRA&destination=JFK', '/flight_status/LH400']
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+async def run_client(client, paths, offset, deadline, latencies, errors):
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.monotonic()
+        try:
+            response = await client.get(path)
+            failed = response.status_code >= 500
+        except httpx.HTTPError:
+            failed = True
+        latencies[path].append(time.monotonic() - start)
+        if failed:
+            errors[path] += 1
+
+
+async def load(url, paths, concurrency, duration, auth, timeout):
+    """Latencies (seconds) and error counts of each path, and the number of requests per second."""
+    latencies, errors = defaultdict(list), defaultdict(int)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, auth=auth, limits=limits, timeout=timeout) as client:
+        # Warm-up: snapshots and caches are built on the first requests
+        for path in paths:
+            await client.get(path)
+        deadline = time.monotonic() + duration
+        # Clients start on different paths so the mix is spread over time
+        await asyncio.gather(*(run_client(client, paths, i, deadline, latencies, errors)
+                               for i in range(concurrency)))
+    total = sum(len(values) for values in latencies.values())
+    return latencies, errors, total / duration
+
+
+def report(url, paths, latencies, errors, rate):
+    print(f"\n{url}: {rate:.0f} requests/s")
+    print(f"{'path':<48} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for path in paths:
+        values = sorted(latencies[path])
+        everything.extend(values)
+        print(f"{path:<48} {len(values):>8} {errors[path]:>6} "
+              f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f}")
+    everything.sort()
+    print(f"{'all':<48} {len(everything):>8} {sum(errors.values()):>6} "
+          f"{percentile(everything, 50) * 1000:>8.1f} {percentile(everything, 99) * 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('urls', nargs='+', help="base URLs of the servers to compare")
+    parser.add_argument('--path', action='append', dest='paths',
+                        help="path of the request mix, repeat for several (default: %s)" % ', '.join(DEFAULT_PATHS))
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30, help="seconds per server")
+    parser.add_argument('--user', default='sabrine')
+    parser.add_argument('--password', default='sab_project23')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    for url in args.urls:
+        latencies, errors, rate = asyncio.run(load(url, paths, args.concurrency, args.duration,
+                                                   (args.user, args.password), args.timeout))
+        report(url, paths, latencies, errors, rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,44 @@
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from fastapi import Depends, FastAPI, Header, HTTPException, Security
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Security
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from neo4j import GraphDatabase 
+from fastapi.middleware.gzip import GZipMiddleware
+from neo4j import AsyncGraphDatabase
 from datetime import datetime, timezone, timedelta
-import requests
+import asyncio
 import configparser
+import email.utils
+import os
+import time
+import sys
+import logging
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # optional, only makes large payloads faster to encode
+    orjson = None
+
+# Shared Lufthansa client lives next to the DAGs (mounted at /dags in the container)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+import lufthansa_async
+import timetable_file
+import snapshot
+import itineraries
+import positions
+import events
+import airport_search
+import network
+import export
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Lufthansa API",
               description="API to get information about Lufthansa flights",
               version="1.0.1")
-
-driver = GraphDatabase.driver("bolt://neo4j:7687", auth=("neo4j", "neo4jproject"))
+# Compress large payloads (e.g. /airports) for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Définir le dictionnaire d'utilisateurs et de mots de passe
 users = {
@@ -27,14 +54,175 @@ config = configparser.ConfigParser()
 config.read('config.ini')
 client_id = config.get('credentials', 'client_id')
 client_secret = config.get('credentials', 'client_secret')
-credentials = {'client_id':client_id, 'client_secret':client_secret,'grant_type':'client_credentials'}
 
+# Flight status responses are cached for status_cache_ttl seconds, 0 disables the cache
+status_cache_ttl = config.getint('lufthansa', 'status_cache_ttl', fallback=60)
+
+# Projected airport columns, optionally filtered by country and bounding box
+AIRPORT_COLUMNS_QUERY = """
+    MATCH (a:Airport)
+    WHERE ($country IS NULL OR a.country = $country)
+      AND ($bbox IS NULL OR (a.lon >= $bbox[0] AND a.lat >= $bbox[1] AND a.lon <= $bbox[2] AND a.lat <= $bbox[3]))
+    RETURN a.codeIATA AS code, a.airport_name AS name, a.city AS city, a.country AS country, a.lat AS lat, a.lon AS lon
+    ORDER BY code
+    """
+
+DATA_VERSION_QUERY = "MATCH (v:DataVersion {name: 'graph'}) RETURN v.version AS version, v.updated AS updated"
+
+# Flight statuses written by the status poller, after a (status_updated, key) cursor
+STATUS_CHANGES_QUERY = """
+    MATCH ()-[f:FLIGHT]->()
+    WHERE f.status_updated >= $since AND (f.status_updated > $since OR f.key > $key)
+    RETURN f.key AS key, f.airline AS airline, f.flight_number AS flight_number,
+           f.origin AS origin, f.destination AS destination, f.STD AS STD, f.ATD AS ATD,
+           f.status AS status, f.status_text AS status_text, f.time_status AS time_status,
+           f.departure_estimated AS departure_estimated, f.departure_actual AS departure_actual,
+           f.arrival_estimated AS arrival_estimated, f.arrival_actual AS arrival_actual,
+           f.status_updated AS updated
+    ORDER BY f.status_updated, f.key
+    LIMIT $limit
+    """
+
+# Cursor of the last status change, where the event stream starts
+LATEST_STATUS_QUERY = """
+    MATCH ()-[f:FLIGHT]->()
+    WHERE f.status_updated IS NOT NULL
+    RETURN f.status_updated AS updated, f.key AS key
+    ORDER BY f.status_updated DESC, f.key DESC
+    LIMIT 1
+    """
+
+# Queries served on every dashboard interaction, with sample parameters for check_plans.py.
+# Flight lookups are answered from the timetable snapshot, only the version check hits Neo4j.
+HOT_QUERIES = {
+    'data_version': (DATA_VERSION_QUERY, {}),
+    'status_changes': (STATUS_CHANGES_QUERY, {'since': '2023-05-01T00:00:00+00:00', 'key': '', 'limit': 1000}),
+}
+
+# The data-version stamp is read at most once per version_check_interval seconds
+version_check_interval = config.getfloat('cache', 'version_check_interval', fallback=5)
+
+# Timetable file written by the flights load, mapped by every worker instead
+# of reading the flights from Neo4j when it holds the current data version
+timetable_path = config.get('timetable', 'path', fallback=None)
+
+# Departures/arrivals boards are never longer than max_board_limit flights
+max_board_limit = 100
+# Airport searches return at most max_search_limit airports
+max_search_limit = 50
+# Pages of the status change feed are never longer than max_status_limit statuses
+max_status_limit = 1000
+
+driver = None
+lufthansa = None
+status_cache = None
+flight_snapshot = None
+# (snapshot, itineraries.Timetable), built on the first itinerary search of a snapshot
+flight_timetable = None
+fleet_positions = None
+airport_index = None
+flight_snapshot_lock = None
+airport_index_lock = None
+fleet_positions_lock = None
+# Last time a snapshot built from Neo4j looked for the timetable file of its version
+snapshot_file_checked = 0
+data_version = {'version': 0, 'updated': datetime.fromtimestamp(0, timezone.utc), 'checked': 0}
+# key -> (version, response body), oldest entries are dropped beyond response_cache_size
+response_cache = {}
+response_cache_size = config.getint('cache', 'size', fallback=256)
+# /positions bodies of positions_minute only, one per bbox: a new minute (or any
+# `at`) would otherwise push the other bodies out of response_cache
+positions_cache = {}
+positions_cache_size = config.getint('cache', 'positions_size', fallback=32)
+positions_minute = None
+
+# Version bumps and status changes are pushed to /events subscribers, polled every events_interval seconds
+events_interval = config.getfloat('events', 'interval', fallback=2)
+event_broadcaster = None
+# Last data version and status cursor sent to the subscribers
+event_state = {'version': None, 'since': None}
+
+@app.on_event("startup")
+async def startup():
+    # Created here so their locks and pools belong to the server's event loop
+    global driver, lufthansa, status_cache, flight_snapshot_lock, airport_index_lock, fleet_positions_lock
+    global event_broadcaster
+    driver = AsyncGraphDatabase.driver("bolt://neo4j:7687", auth=("neo4j", "neo4jproject"),
+        max_connection_pool_size=config.getint('neo4j', 'pool_size', fallback=50),
+        connection_timeout=config.getfloat('neo4j', 'connection_timeout', fallback=5),
+        connection_acquisition_timeout=config.getfloat('neo4j', 'acquisition_timeout', fallback=10))
+    # One token and one keep-alive connection pool per worker process
+    lufthansa = lufthansa_async.AsyncLufthansaClient(client_id, client_secret,
+        pool_size=config.getint('lufthansa', 'pool_size', fallback=10),
+        timeout=config.getfloat('lufthansa', 'timeout', fallback=10))
+    if status_cache_ttl > 0:
+        status_cache = lufthansa_async.AsyncTTLCache(status_cache_ttl)
+    flight_snapshot_lock = asyncio.Lock()
+    airport_index_lock = asyncio.Lock()
+    fleet_positions_lock = asyncio.Lock()
+    event_broadcaster = events.EventBroadcaster(poll_events, events_interval)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await driver.close()
+    await lufthansa.aclose()
+    await event_broadcaster.close()
+
+
+async def current_version():
+    """Return the (version, updated) stamp written by the last load."""
+    if time.monotonic() - data_version['checked'] > version_check_interval:
+        async with driver.session() as session:
+            result = await session.run(DATA_VERSION_QUERY)
+            record = await result.single()
+        if record is not None:
+            data_version['version'] = record['version']
+            data_version['updated'] = datetime.fromisoformat(record['updated'])
+        data_version['checked'] = time.monotonic()
+    return data_version['version'], data_version['updated']
+
+def encode_json(content):
+    if orjson is not None:
+        return orjson.dumps(content)
+    return JSONResponse(content=content).body
+
+async def cached_json(request, key, build, last_modified=None, cache=response_cache, cache_size=response_cache_size):
+    """
+    Serve the JSON returned by build() from cache until the data version
+    changes, with ETag/Last-Modified validators so clients can revalidate
+    with a conditional request and get a 304 Not Modified.
+    """
+    version, updated = await current_version()
+    last_modified = max(updated, last_modified) if last_modified else updated
+    headers = {'ETag': f'"{version}-{key}"',
+               'Last-Modified': email.utils.format_datetime(last_modified.replace(microsecond=0), usegmt=True)}
+
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_none_match is not None:
+        if headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since is not None:
+        try:
+            if last_modified.replace(microsecond=0) <= email.utils.parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    cached = cache.get(key)
+    if cached is None or cached[0] != version:
+        body = encode_json(jsonable_encoder(await build()))
+        cache.pop(key, None)
+        if len(cache) >= cache_size:
+            del cache[next(iter(cache))]
+        cached = cache[key] = (version, body)
+    return Response(content=cached[1], media_type='application/json', headers=headers)
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}    
  
-def root(credentials: HTTPBasicCredentials = Depends(security)):
+async def root(credentials: HTTPBasicCredentials = Depends(security)):
     """
     This function is used for authentification
     """
@@ -45,87 +233,363 @@ def root(credentials: HTTPBasicCredentials = Depends(security)):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     return {"message": "Authorized"}
-@app.get("/airports")
-def get_airports(root = Depends(root)):
-    with driver.session() as session:
-        result = session.run("MATCH (a:Airport) RETURN a")
-        airports = [record for record in result]
+async def read_airports():
+    async with driver.session() as session:
+        result = await session.run("MATCH (a:Airport) RETURN a")
+        airports = [record async for record in result]
         return {"airports": airports}
 
+def parse_bbox(bbox):
+    """Parse bbox=min_lon,min_lat,max_lon,max_lat, None if not given."""
+    if bbox is None:
+        return None
+    try:
+        bbox = [float(x) for x in bbox.split(',')]
+    except ValueError:
+        bbox = []
+    if len(bbox) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    return bbox
+
+async def read_airport_columns(country, bbox):
+    columns = {'code': [], 'name': [], 'city': [], 'country': [], 'lat': [], 'lon': []}
+    async with driver.session() as session:
+        result = await session.run(AIRPORT_COLUMNS_QUERY, country=country, bbox=bbox)
+        async for record in result:
+            for column, value in zip(columns.values(), record.values()):
+                column.append(value)
+    return columns
+
+@app.get("/airports")
+async def get_airports(request: Request, format: str = 'records', country: Optional[str] = None,
+                       bbox: Optional[str] = None, root = Depends(root)):
+    """
+    format=records (default) returns the airport nodes, format=columns returns
+    parallel arrays of code, name, city, country, lat and lon, optionally
+    filtered by country and bbox=min_lon,min_lat,max_lon,max_lat.
+    """
+    if format == 'records':
+        return await cached_json(request, 'airports', read_airports)
+    if format != 'columns':
+        raise HTTPException(status_code=400, detail="format must be 'records' or 'columns'")
+    bbox = parse_bbox(bbox)
+    key = f"airports-columns-{country or ''}-{','.join(map(str, bbox)) if bbox else ''}"
+    return await cached_json(request, key, lambda: read_airport_columns(country, bbox))
+
+async def current_airport_index():
+    global airport_index
+    snap = await current_snapshot()
+    if airport_index is None or airport_index.version != snap.version:
+        # Concurrent searches after a version bump wait for a single build
+        async with airport_index_lock:
+            if airport_index is None or airport_index.version != snap.version:
+                airports = await read_airport_columns(None, None)
+                # Routes are the keys of the per-route index of the snapshot
+                airport_index = await asyncio.get_running_loop().run_in_executor(
+                    None, airport_search.AirportIndex, snap.version, airports, list(snap.routes.offsets))
+    return airport_index
+
+@app.get("/airports/search")
+async def search_airports(q: str = '', limit: int = 10, root = Depends(root)):
+    """
+    Airports whose IATA code, name or city match q (code, then prefixes of
+    words, then close spellings), the most served by Lufthansa routes first.
+    """
+    index = await current_airport_index()
+    return index.search(q, min(max(limit, 1), max_search_limit))
+
+async def read_network():
+    snap = await current_snapshot()
+    return network.build_network(snap, await read_airport_columns(None, None))
+
+@app.get("/network")
+async def get_network(request: Request, root = Depends(root)):
+    """
+    Route network of the current data version: the airports served
+    (columns with their degree), the routes with their average daily
+    number of flights, and the number of days the timetable covers.
+    """
+    return await cached_json(request, 'network', read_network)
+
+def open_timetable_file(version):
+    """Map the timetable file if it holds version, else return None."""
+    if not timetable_path or not os.path.exists(timetable_path):
+        return None
+    try:
+        snap = snapshot.TimetableSnapshot.from_file(timetable_path)
+    except (OSError, ValueError) as e:
+        logger.warning("Can't read timetable file %s: %s", timetable_path, e)
+        return None
+    return snap if snap.version == version else None
+
+async def current_snapshot():
+    """Return the timetable snapshot of the current data version, rebuilding it once per version."""
+    global flight_snapshot, snapshot_file_checked
+    version, _ = await current_version()
+    if (flight_snapshot is not None and flight_snapshot.version == version and not flight_snapshot.mapped
+            and timetable_path and time.monotonic() - snapshot_file_checked > version_check_interval):
+        # Built from Neo4j while the file was missing or stale: switch to the shared file once it is written
+        snapshot_file_checked = time.monotonic()
+        snap = open_timetable_file(version)
+        if snap is not None:
+            flight_snapshot = snap
+    if flight_snapshot is None or flight_snapshot.version != version:
+        async with flight_snapshot_lock:
+            if flight_snapshot is None or flight_snapshot.version != version:
+                # The file is shared through the page cache, Neo4j is only read when it is missing or stale
+                snap = open_timetable_file(version)
+                if snap is None:
+                    async with driver.session() as session:
+                        result = await session.run(timetable_file.TIMETABLE_QUERY)
+                        rows = [(r['origin'], r['destination'], r['key'] or '', r['flight']) async for r in result]
+                    snap = await asyncio.get_running_loop().run_in_executor(
+                        None, snapshot.TimetableSnapshot.from_rows, version, rows)
+                # Swap the whole object so readers never see a half-built snapshot
+                flight_snapshot = snap
+    return flight_snapshot
+
+async def current_timetable():
+    global flight_timetable
+    snap = await current_snapshot()
+    if flight_timetable is None or flight_timetable[0] is not snap:
+        # Built from the snapshot columns, off the event loop
+        timetable = await asyncio.get_running_loop().run_in_executor(None, itineraries.Timetable.from_snapshot, snap)
+        flight_timetable = (snap, timetable)
+    return flight_timetable[1]
+
 # Définition de l'endpoint pour récupérer les informations sur les vols d'aujourd'hui
+async def read_flights(today, tomorrow):
+    snap = await current_snapshot()
+    return snap.departing_between(today, tomorrow)
+
 @app.get('/flights/today')
-def get_flights_today(root = Depends(root)):
+async def get_flights_today(request: Request, format: str = 'json', after: Optional[str] = None,
+                            limit: Optional[int] = None, root = Depends(root)):
+    """
+    Today's flights in (STD, key) order. format=json (default) returns a JSON
+    array, ndjson, csv and arrow (Arrow IPC stream) are streamed as they are
+    encoded. after (the X-Next-Cursor of the previous page) and limit page
+    through the day in every format.
+    """
     # Récupérer et formater la date d'aujourd'hui
     today = datetime.now().strftime("%Y-%m-%d")
     tomorrow = datetime.now() + timedelta(days=1)
     tomorrow = tomorrow.strftime("%Y-%m-%d")
-    with driver.session() as session:
-        # Récupérer les informations de vol pour aujourd'hui
-        result = session.run("""
-            MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
-            WHERE a1.codeIATA <> a2.codeIATA AND f.STD > $today AND f.STD < $tomorrow
-            RETURN {flight_number: f.flight_number, airline: f.airline, aircraft: f.aircraft, STD: f.STD, ATD: f.ATD, From: f.From, To: f.To, DepartAirport: f.FromAirportName, ArrivalAirport: f.ToAirportName} as flight""",
-            today=today,
-            tomorrow=tomorrow)
-        # Convertir le résultat en une liste de dictionnaires
-        flights = [record['flight'] for record in result]
-        return JSONResponse(content=flights)
+    if format == 'json' and after is None and limit is None:
+        # The response also changes at midnight, without a new data version
+        midnight = datetime.strptime(today, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        return await cached_json(request, f'flights-{today}', lambda: read_flights(today, tomorrow), midnight)
+    if format != 'json' and format not in export.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'json', 'ndjson', 'csv' or 'arrow'")
+    if format == 'arrow' and export.pa is None:
+        raise HTTPException(status_code=501, detail="format=arrow is not available on this server")
+
+    snap = await current_snapshot()
+    try:
+        indexes = snap.departing_indexes(today, tomorrow, after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be YYYY-MM-DDTHH:MM or a X-Next-Cursor")
+    cursor = None
+    if limit is not None:
+        limit = max(limit, 1)
+        if len(indexes) > limit:
+            indexes = indexes[:limit]
+            cursor = snap.cursor(indexes[-1], 'STD')
+    if format == 'json':
+        return board_response(snap.records(indexes), cursor)
+
+    # Records are decoded chunk by chunk while the response is sent
+    chunks = export.record_chunks(snap, indexes)
+    if format == 'ndjson':
+        body = export.ndjson_stream(chunks, encode_json)
+    elif format == 'csv':
+        body = export.csv_stream(chunks, snapshot.FIELDS)
+    else:
+        body = export.arrow_stream(chunks, snapshot.FIELDS)
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[format],
+                             headers={'X-Next-Cursor': cursor} if cursor else None)
+
+async def current_positions():
+    global fleet_positions
+    snap = await current_snapshot()
+    if fleet_positions is None or fleet_positions.snapshot is not snap:
+        async with fleet_positions_lock:
+            if fleet_positions is None or fleet_positions.snapshot is not snap:
+                airports = await read_airport_columns(None, None)
+                fleet_positions = await asyncio.get_running_loop().run_in_executor(
+                    None, positions.FleetPositions, snap, airports)
+    return fleet_positions
+
+def board_response(flights, cursor):
+    # The cursor of the last flight, to pass as after= for the next page
+    return JSONResponse(content=flights, headers={'X-Next-Cursor': cursor} if cursor else None)
 
 # Définition de l'endpoint pour récupérer les informations sur les vols lié à un aéroport
 @app.get('/departures/{IATA}')
-def get_departures(IATA, root = Depends(root)):
-    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
-            WHERE a1.codeIATA = $IATA AND f.STD > $now
-            RETURN {flight_number: f.flight_number, airline: f.airline, aircraft: f.aircraft, STD: f.STD, ATD: f.ATD, From: f.From, To: f.To, DepartAirport: f.FromAirportName, ArrivalAirport: f.ToAirportName} as flight
-            ORDER BY f.STD
-            LIMIT 5""",
-            IATA=IATA,
-            now=now)
-        flights = [record['flight'] for record in result]
-        return JSONResponse(content=flights)
+async def get_departures(IATA, limit: int = 5, after: Optional[str] = None, root = Depends(root)):
+    """
+    Next departures of an airport. after is a time (YYYY-MM-DDTHH:MM, default now)
+    or the X-Next-Cursor of the previous page.
+    """
+    after = after or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    snap = await current_snapshot()
+    try:
+        flights, cursor = snap.departures_after(IATA, after, min(max(limit, 1), max_board_limit))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be YYYY-MM-DDTHH:MM or a X-Next-Cursor")
+    return board_response(flights, cursor)
 
 @app.get('/arrivals/{IATA}')
-def get_arrivals(IATA, root = Depends(root)):
-    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
-            WHERE a2.codeIATA = $IATA AND f.ATD > $now
-            RETURN {flight_number: f.flight_number, airline: f.airline, aircraft: f.aircraft, STD: f.STD, ATD: f.ATD, From: f.From, To: f.To, DepartAirport: f.FromAirportName, ArrivalAirport: f.ToAirportName} as flight
-            ORDER BY f.ATD
-            LIMIT 5""",
-            IATA=IATA,
-            now=now)
-        flights = [record['flight'] for record in result]
-        return JSONResponse(content=flights)
+async def get_arrivals(IATA, limit: int = 5, after: Optional[str] = None, root = Depends(root)):
+    """
+    Next arrivals of an airport. after is a time (YYYY-MM-DDTHH:MM, default now)
+    or the X-Next-Cursor of the previous page.
+    """
+    after = after or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    snap = await current_snapshot()
+    try:
+        flights, cursor = snap.arrivals_after(IATA, after, min(max(limit, 1), max_board_limit))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be YYYY-MM-DDTHH:MM or a X-Next-Cursor")
+    return board_response(flights, cursor)
        
+@app.get('/positions')
+async def get_positions(request: Request, at: Optional[str] = None, bbox: Optional[str] = None, root = Depends(root)):
+    """
+    Estimated positions of the flights airborne at `at` (YYYY-MM-DDTHH:MM UTC,
+    default now), interpolated along the great circle between their airports
+    from the scheduled times, optionally within bbox=min_lon,min_lat,max_lon,max_lat.
+    Returns parallel arrays of flight, origin, destination, lat, lon and progress.
+    """
+    at = at or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    try:
+        minutes = int(itineraries.to_minutes([at])[0])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="at must be YYYY-MM-DDTHH:MM")
+    bbox = parse_bbox(bbox)
+    global positions_minute
+    fleet = await current_positions()
+    if positions_minute != minutes:
+        positions_cache.clear()
+        positions_minute = minutes
+    key = f"positions-{minutes}-{','.join(map(str, bbox)) if bbox else ''}"
+    # Positions also change every minute, without a new data version
+    minute = datetime.fromtimestamp(minutes * 60, timezone.utc)
+    return await cached_json(request, key, lambda: fleet_at(fleet, minutes, bbox), minute,
+                             positions_cache, positions_cache_size)
+
+async def fleet_at(fleet, minutes, bbox):
+    return fleet.at(minutes, bbox)
+
+async def fetch_flight_status(flightNumber, date):
+    response = await lufthansa.flight_status(flightNumber, date)
+    return response.is_success, response.json() if response.is_success else None
+
+@app.get('/statuses')
+async def get_status_changes(since: Optional[str] = None, limit: int = max_status_limit, root = Depends(root)):
+    """
+    Change feed of the flight statuses written by the status poller: the
+    statuses changed after since (the `since` of the previous response,
+    default every known status), oldest change first. Pass the returned
+    since back to get the following changes; more is true when a full page
+    was returned.
+    """
+    limit = min(max(limit, 1), max_status_limit)
+    statuses, since = await read_status_changes(since, limit)
+    return {'statuses': statuses, 'since': since, 'more': len(statuses) == limit}
+
+async def read_status_changes(since, limit):
+    """Return the status changes after the since cursor ('updated|key') and the cursor of the last one."""
+    updated, _, key = (since or '').partition('|')
+    async with driver.session() as session:
+        result = await session.run(STATUS_CHANGES_QUERY, since=updated, key=key, limit=limit)
+        statuses = [record.data() async for record in result]
+    for status in statuses:
+        status['flight'] = f"{status['airline']}{status['flight_number']}"
+    if statuses:
+        since = f"{statuses[-1]['updated']}|{statuses[-1]['key']}"
+    return statuses, since
+
+def version_event(version, updated):
+    return {'type': 'version', 'version': version, 'updated': updated.isoformat()}
+
+async def poll_events():
+    """Events since the previous poll: a data-version bump and the status changes."""
+    new_events = []
+    version, updated = await current_version()
+    if event_state['version'] != version:
+        event_state['version'] = version
+        new_events.append(version_event(version, updated))
+    if event_state['since'] is None:
+        # Subscribers get the changes made from now on, older ones are read from /statuses
+        async with driver.session() as session:
+            latest = await (await session.run(LATEST_STATUS_QUERY)).single()
+        event_state['since'] = f"{latest['updated']}|{latest['key']}" if latest else ''
+        return new_events
+    more = True
+    while more:
+        after = event_state['since']
+        statuses, since = await read_status_changes(after, max_status_limit)
+        more = len(statuses) == max_status_limit
+        if statuses:
+            event_state['since'] = since
+            # after lets subscribers check they haven't missed the previous changes
+            new_events.append({'type': 'statuses', 'after': after, 'since': since, 'statuses': statuses})
+    return new_events
+
+@app.get('/events')
+async def get_events(root = Depends(root)):
+    """
+    Server-sent events: {type: version} when the data version changes (and
+    once on connection) and {type: statuses} with the status changes, whose
+    `after` is the `since` of the previous statuses event.
+    """
+    version, updated = await current_version()
+    stream = events.stream(event_broadcaster, [version_event(version, updated)], encode_json)
+    # An encoded response is passed through by GZipMiddleware, which would otherwise hold the events back
+    return StreamingResponse(stream, media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                                      'Content-Encoding': 'identity'})
+
 @app.get('/flight_status/{flightNumber}')
-def get_flight_status(flightNumber, root = Depends(root)):
-	token = requests.post("https://api.lufthansa.com/v1/oauth/token", credentials)
-	access_token = 'Bearer ' + token.json()['access_token']
-	headers = {'Authorization':access_token}
+async def get_flight_status(flightNumber, root = Depends(root)):
 	today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-	response = requests.get(f"https://api.lufthansa.com/v1/operations/flightstatus/{flightNumber}/{today}", headers = headers)
-	if response.ok:
-		return response.json()
+	if status_cache is None:
+		ok, status = await fetch_flight_status(flightNumber, today)
+	else:
+		ok, status = await status_cache.get((flightNumber, today), lambda: fetch_flight_status(flightNumber, today))
+	if ok:
+		return status
 	else: raise HTTPException(status_code=404, detail="Invalid flight number")
         
 @app.get("/flights_by_route")
-def get_flights(origin:str, destination:str, root = Depends(root)):
+async def get_flights(origin:str, destination:str, root = Depends(root)):
     now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
-    with driver.session() as session:
-        result = session.run("""
-        MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport) 
-        WHERE a1.codeIATA = $origin AND a2.codeIATA = $destination AND f.STD > $now
-        RETURN {flight_number: f.flight_number, airline: f.airline, aircraft: f.aircraft, STD: f.STD, ATD: f.ATD, From: f.From, To: f.To, DepartAirport: f.FromAirportName, ArrivalAirport: f.ToAirportName} as flight
-        ORDER BY f.STD
-        LIMIT 5""",
-        origin=origin, destination=destination, now=now)
-        flights = [record for record in result]
-        if not flights:
-            return {"message": "No flights found between {} and {}".format(origin, destination)}
-        else:
-            return {"flights": flights}
+    snap = await current_snapshot()
+    flights, _ = snap.route_after(origin, destination, now, 5)
+    if not flights:
+        return {"message": "No flights found between {} and {}".format(origin, destination)}
+    else:
+        # One-column records, as returned by the former Cypher query
+        return {"flights": [[flight] for flight in flights]}
+
+@app.get("/itineraries")
+async def get_itineraries(origin: str, destination: str, after: Optional[str] = None, max_stops: int = 2,
+                          min_connection: int = 45, limit: int = 3, root = Depends(root)):
+    """
+    Itineraries with up to max_stops connections (at least min_connection
+    minutes each) leaving after `after` (YYYY-MM-DDTHH:MM, default now),
+    ranked by earliest arrival.
+    """
+    if not 0 <= max_stops <= 2:
+        raise HTTPException(status_code=400, detail="max_stops must be between 0 and 2")
+    after = after or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    timetable = await current_timetable()
+    try:
+        found = timetable.search(origin, destination, after, max_stops=max_stops,
+                                 min_connection=max(min_connection, 0), limit=min(max(limit, 1), 10))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be YYYY-MM-DDTHH:MM")
+    if not found:
+        return {"message": "No itineraries found between {} and {}".format(origin, destination)}
+    return {"itineraries": found}
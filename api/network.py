@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def build_network(snap, airports):
+    """
+    Summary of the route network of a timetable snapshot: the airports with
+    at least one flight and their degree (airports reached directly), the
+    routes and their average number of flights per day. Airports without
+    coordinates are left out.
+    """
+    flights = snap.flights
+    served = flights['origin'] != flights['destination']
+    origin = flights['origin'][served].astype('int64')
+    destination = flights['destination'][served].astype('int64')
+    days = max(len(np.unique(flights['std'][served] // 1440)), 1)
+
+    routes, counts = np.unique(origin << 32 | destination, return_counts=True)
+    route_origin, route_destination = routes >> 32, routes & 0xffffffff
+    # Degree counts each neighbour once, whatever the direction
+    pairs = np.unique(np.stack([np.minimum(route_origin, route_destination),
+                                np.maximum(route_origin, route_destination)], axis=1), axis=0)
+    ids, degree = np.unique(pairs.ravel(), return_counts=True)
+
+    strings = snap.strings
+    # Each airport code is decoded once
+    code_of = {i: strings[i] for i in ids.tolist()}
+    codes = {code_of[i]: d for i, d in zip(ids.tolist(), degree.tolist())}
+    nodes = {'code': [], 'name': [], 'city': [], 'country': [], 'lat': [], 'lon': [], 'degree': []}
+    for code, name, city, country, lat, lon in zip(airports['code'], airports['name'], airports['city'],
+                                                   airports['country'], airports['lat'], airports['lon']):
+        if code in codes and lat is not None and lon is not None:
+            for column, value in zip(nodes.values(), (code, name, city, country, lat, lon, codes.pop(code))):
+                column.append(value)
+
+    located = set(nodes['code'])
+    edges = {'origin': [], 'destination': [], 'daily': []}
+    for o, d, count in zip(route_origin.tolist(), route_destination.tolist(), counts.tolist()):
+        o, d = code_of[o], code_of[d]
+        if o in located and d in located:
+            edges['origin'].append(o)
+            edges['destination'].append(d)
+            edges['daily'].append(round(count / days, 2))
+    return {'days': days, 'airports': nodes, 'routes': edges}
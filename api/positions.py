@@ -0,0 +1,97 @@
+import bisect
+
+import numpy as np
+
+# Flights that left more than MAX_DURATION minutes ago are never airborne
+MAX_DURATION = 20 * 60
+
+
+def unit_vectors(lat, lon):
+    """Points on the unit sphere of arrays of latitudes and longitudes in degrees."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def to_lat_lon(points):
+    return np.degrees(np.arcsin(np.clip(points[:, 2], -1, 1))), np.degrees(np.arctan2(points[:, 1], points[:, 0]))
+
+
+def slerp(a, b, t):
+    """Points at fraction t along the great circle arcs from unit vectors a to b."""
+    omega = np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1, 1))
+    sin_omega = np.sin(omega)
+    # Same (or antipodal) endpoints have no single arc: interpolate linearly
+    linear = sin_omega < 1e-9
+    sin_omega = np.where(linear, 1, sin_omega)
+    wa = np.where(linear, 1 - t, np.sin((1 - t) * omega) / sin_omega)
+    wb = np.where(linear, t, np.sin(t * omega) / sin_omega)
+    points = wa[:, None] * a + wb[:, None] * b
+    norm = np.linalg.norm(points, axis=1, keepdims=True)
+    return points / np.where(norm == 0, 1, norm)
+
+
+def decode(strings, ids):
+    """Strings of an array of string table ids, decoding each distinct id once."""
+    unique, inverse = np.unique(ids, return_inverse=True)
+    values = np.array([strings[i] for i in unique.tolist()], dtype=object)
+    return values[inverse].tolist()
+
+
+class FleetPositions:
+    """
+    Position estimates of the flights of a timetable snapshot, interpolated
+    along the great circle between their airports from the scheduled times.
+    """
+
+    def __init__(self, snap, airports):
+        self.snapshot = snap
+        self.version = snap.version
+        # Airport coordinates indexed by string table id, NaN for unknown airports
+        strings = snap.strings
+        self.lat = np.full(len(strings), np.nan)
+        self.lon = np.full(len(strings), np.nan)
+        for code, lat, lon in zip(airports['code'], airports['lat'], airports['lon']):
+            i = strings.find(code) if code else 0
+            if i and lat is not None and lon is not None:
+                self.lat[i], self.lon[i] = lat, lon
+
+    def at(self, minutes, bbox=None):
+        """
+        Columns of the flights airborne at minutes (since epoch), optionally
+        within bbox [min_lon, min_lat, max_lon, max_lat].
+        """
+        snap = self.snapshot
+        # Flights are stored by STD: only those of the last MAX_DURATION minutes can be in the air
+        lo = bisect.bisect_left(snap.std, minutes - MAX_DURATION)
+        hi = bisect.bisect_right(snap.std, minutes)
+        flights = snap.flights[lo:hi]
+        std = flights['std']
+        atd = flights['atd']
+        # ATD is stored on the day of departure: overnight flights land the next day
+        atd = np.where(atd < std, atd + 1440, atd)
+        origin, destination = flights['origin'], flights['destination']
+        airborne = ((atd > minutes) & (origin != destination)
+                    & ~np.isnan(self.lat[origin]) & ~np.isnan(self.lat[destination]))
+        indexes = np.flatnonzero(airborne)
+        std, atd, origin, destination = std[indexes], atd[indexes], origin[indexes], destination[indexes]
+
+        progress = (minutes - std) / (atd - std)
+        points = slerp(unit_vectors(self.lat[origin], self.lon[origin]),
+                       unit_vectors(self.lat[destination], self.lon[destination]), progress)
+        lat, lon = to_lat_lon(points)
+        if bbox is not None:
+            inside = (lon >= bbox[0]) & (lat >= bbox[1]) & (lon <= bbox[2]) & (lat <= bbox[3])
+            indexes, origin, destination = indexes[inside], origin[inside], destination[inside]
+            lat, lon, progress = lat[inside], lon[inside], progress[inside]
+
+        strings = snap.strings
+        airlines = decode(strings, flights['airline'][indexes])
+        numbers = flights['flight_number'][indexes].tolist()
+        return {
+            'flight': [f"{airline or ''}{number}" for airline, number in zip(airlines, numbers)],
+            'origin': decode(strings, origin),
+            'destination': decode(strings, destination),
+            'lat': np.round(lat, 4).tolist(),
+            'lon': np.round(lon, 4).tolist(),
+            'progress': np.round(progress, 3).tolist(),
+        }
@@ -0,0 +1,157 @@
+import bisect
+
+import numpy as np
+
+import timetable_file
+from itineraries import to_minutes
+
+# Sorts after any flight key
+LAST_KEY = '\uffff'
+
+FIELDS = timetable_file.FIELDS
+
+
+def decode_column(values, convert):
+    """convert() of each value of an array as a list, converting each distinct value once."""
+    unique, inverse = np.unique(values, return_inverse=True)
+    converted = np.empty(len(unique), dtype=object)
+    converted[:] = [convert(value) for value in unique.tolist()]
+    return converted[inverse].tolist()
+
+
+def parse_cursor(after):
+    """Split an 'STD|key' cursor into (minutes, key). A bare time skips every flight at that time."""
+    time, separator, key = after.partition('|')
+    return int(to_minutes([time])[0]), key if separator else LAST_KEY
+
+
+class GroupIndex:
+    """Flight indexes grouped by airport (or route) and sorted by (time, key) within a group."""
+
+    def __init__(self, order, groups, strings, times, keys):
+        self.order = order
+        self.strings = strings
+        self.times = times
+        self.keys = keys
+        self.offsets = {strings[int(code)]: (int(start), int(end)) for code, start, end in groups.tolist()}
+
+    def after(self, code, time, key, limit):
+        """Return the indexes of the limit flights of code following (time, key) and whether more follow."""
+        start, end = self.offsets.get(code, (0, 0))
+        order = self.order[start:end]
+        times = self.times[order]
+        lo = int(np.searchsorted(times, time, 'left'))
+        hi = int(np.searchsorted(times, time, 'right'))
+        # Key ids follow string order, so the cursor key is compared by id
+        i = lo + int(np.searchsorted(self.keys[order[lo:hi]], self.strings.first_after(key), 'left'))
+        return order[i:i + limit], i + limit < len(order)
+
+
+class TimetableSnapshot:
+    """
+    Read-only copy of the FLIGHT relationships of one data version, over the
+    sections of a timetable file: either mapped from the file written by the
+    flights load or built in memory from Neo4j rows. Lookups are binary
+    searches over per-airport and per-route sorted offsets.
+    """
+
+    def __init__(self, version, tables, mapped=False):
+        self.version = version
+        # False when built from Neo4j rows, in this process's memory only
+        self.mapped = mapped
+        self.flights = tables['records']
+        self.strings = timetable_file.StringTable(tables['string_offsets'], tables['string_data'])
+        self.std = self.flights['std']
+        self.departures = GroupIndex(tables['departures'], tables['departures_groups'], self.strings,
+                                     self.std, self.flights['key'])
+        self.arrivals = GroupIndex(tables['arrivals'], tables['arrivals_groups'], self.strings,
+                                   self.flights['atd'], self.flights['key'])
+        self.routes = GroupIndex(tables['routes'], tables['routes_groups'], self.strings,
+                                 self.std, self.flights['key'])
+
+    @classmethod
+    def from_rows(cls, version, rows):
+        return cls(version, timetable_file.build_tables(rows))
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(*timetable_file.open_timetable(path), mapped=True)
+
+    def __len__(self):
+        return len(self.flights)
+
+    def record(self, index):
+        flight = self.flights[index]
+        strings = self.strings
+        return {
+            'flight_number': None if flight['flight_number'] == timetable_file.NULL_INT else int(flight['flight_number']),
+            'airline': strings[flight['airline']],
+            'aircraft': strings[flight['aircraft']],
+            'STD': timetable_file.format_minutes(flight['std']),
+            'ATD': timetable_file.format_minutes(flight['atd']),
+            'From': strings[flight['From']],
+            'To': strings[flight['To']],
+            'DepartAirport': strings[flight['DepartAirport']],
+            'ArrivalAirport': strings[flight['ArrivalAirport']],
+        }
+
+    def columns(self, indexes):
+        """FIELDS of the flights at indexes as parallel lists, decoded column by column."""
+        flights = self.flights[np.asarray(indexes, dtype='int64')]
+        strings = self.strings
+        columns = {
+            'flight_number': [None if n == timetable_file.NULL_INT else n for n in flights['flight_number'].tolist()],
+            'STD': decode_column(flights['std'], timetable_file.format_minutes),
+            'ATD': decode_column(flights['atd'], timetable_file.format_minutes),
+        }
+        for field in timetable_file.STRING_FIELDS:
+            columns[field] = decode_column(flights[field], strings.__getitem__)
+        return columns
+
+    def records(self, indexes):
+        columns = self.columns(indexes)
+        return [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+
+    def cursor(self, index, time_field):
+        flight = self.flights[index]
+        return f"{timetable_file.format_minutes(flight[time_field.lower()])}|{self.strings[flight['key']]}"
+
+    def _page(self, index, code, after, limit, time_field):
+        time, key = parse_cursor(after)
+        indexes, more = index.after(code, time, key, limit)
+        cursor = self.cursor(indexes[-1], time_field) if more and len(indexes) else None
+        return self.records(indexes), cursor
+
+    def departures_after(self, code, after, limit):
+        """Next departures of an airport and the cursor of the next page."""
+        return self._page(self.departures, code, after, limit, 'STD')
+
+    def arrivals_after(self, code, after, limit):
+        """Next arrivals of an airport and the cursor of the next page."""
+        return self._page(self.arrivals, code, after, limit, 'ATD')
+
+    def route_after(self, origin, destination, after, limit):
+        """Next flights from origin to destination and the cursor of the next page."""
+        return self._page(self.routes, f"{origin}-{destination}", after, limit, 'STD')
+
+    def departing_indexes(self, start, end, after=None):
+        """
+        Indexes of the flights between two different airports with
+        start <= STD < end ('YYYY-MM-DD...') in (STD, key) order, following
+        the 'STD|key' cursor after if given.
+        """
+        start, end = to_minutes([start, end]).tolist()
+        # Flights are stored by (STD, key); bisect reads the mapped column without copying it
+        lo, hi = bisect.bisect_left(self.std, start), bisect.bisect_left(self.std, end)
+        if after:
+            time, key = parse_cursor(after)
+            if time >= start:
+                lo = bisect.bisect_left(self.std, time, lo, hi)
+                same = bisect.bisect_right(self.std, time, lo, hi)
+                lo += int(np.searchsorted(self.flights['key'][lo:same], self.strings.first_after(key), 'left'))
+        flights = self.flights[lo:hi]
+        return lo + np.flatnonzero(flights['origin'] != flights['destination'])
+
+    def departing_between(self, start, end):
+        """Flights between two different airports with start <= STD < end ('YYYY-MM-DD...')."""
+        return self.records(self.departing_indexes(start, end))
@@ -0,0 +1,135 @@
+"""
+Compare /airports as node records (format=records) with the projected
+columnar format (format=columns): server time with and without the
+per-version cache, bytes sent with and without gzip, and the time the
+dashboard takes to turn the body into its airports frame.
+
+The API runs in process on a Neo4j stand-in holding --airports synthetic airports.
+Run from the repository root: python benchmarks/bench_airports.py [--airports 10000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from timing import ROOT, best_of
+
+import httpx
+import pandas as pd
+
+AUTH = ('sabrine', 'sab_project23')
+
+
+class StandInResult:
+    def __init__(self, records):
+        self.records = records
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for record in self.records:
+            yield record
+
+    async def single(self):
+        return self.records[0] if self.records else None
+
+
+class StandInRecord(dict):
+    def values(self):
+        return list(super().values())
+
+
+class StandInSession:
+    def __init__(self, airports):
+        self.airports = airports
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def run(self, query, **params):
+        if 'DataVersion' in query:
+            return StandInResult([{'version': 1, 'updated': '2023-05-01T10:00:00+00:00'}])
+        if 'RETURN a.codeIATA AS code' in query:
+            return StandInResult([StandInRecord(code=a['codeIATA'], name=a['airport_name'], city=a['city'],
+                                                country=a['country'], lat=a['lat'], lon=a['lon'])
+                                  for a in self.airports])
+        return StandInResult([{'a': airport} for airport in self.airports])
+
+
+class StandInDriver:
+    def __init__(self, airports):
+        self.airports = airports
+
+    def session(self, **kwargs):
+        return StandInSession(self.airports)
+
+    async def close(self):
+        pass
+
+
+def synthetic_airports(n, seed=0):
+    rnd = random.Random(seed)
+    return [{'codeIATA': f'A{i:05d}', 'airport_name': f'Airport {i} International', 'city': f'City {i % 3000}',
+             'country': rnd.choice(['Germany', 'United States', 'France', 'Italy', 'Brazil']),
+             'lat': round(rnd.uniform(-60, 70), 4), 'lon': round(rnd.uniform(-180, 180), 4),
+             'content_hash': '%032x' % rnd.getrandbits(128)} for i in range(n)]
+
+
+def records_frame(body):
+    return pd.DataFrame([record['a'] for record in json.loads(body)['airports']])
+
+
+def columns_frame(body):
+    return pd.DataFrame(json.loads(body))
+
+
+async def measure(main, path, repeat):
+    """p50 of uncached and cached requests in seconds, the body and its gzipped size."""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://api', auth=AUTH) as client:
+        uncached, cached = [], []
+        for _ in range(repeat):
+            main.response_cache.clear()
+            start = time.perf_counter()
+            response = await client.get(path, headers={'Accept-Encoding': 'identity'})
+            uncached.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await client.get(path, headers={'Accept-Encoding': 'identity'})
+            cached.append(time.perf_counter() - start)
+        gzipped = await client.get(path, headers={'Accept-Encoding': 'gzip'})
+    return sorted(uncached)[repeat // 2], sorted(cached)[repeat // 2], response.content, gzipped.num_bytes_downloaded
+
+
+async def run(args):
+    os.chdir(os.path.join(ROOT, 'api'))
+    import main
+    await main.startup()
+    main.driver = StandInDriver(synthetic_airports(args.airports))
+    main.version_check_interval = 60
+
+    print(f"{args.airports} airports, orjson {'on' if main.orjson else 'off'}")
+    print(f"{'format':<8} {'uncached ms':>11} {'cached ms':>9} {'bytes':>10} {'gzip bytes':>10} {'frame ms':>8}")
+    for name, path, to_frame in (('records', '/airports', records_frame),
+                                 ('columns', '/airports?format=columns', columns_frame)):
+        uncached, cached, body, gzipped = await measure(main, path, args.repeat)
+        frame_time, frame = best_of(args.repeat, to_frame, body)
+        assert len(frame) == args.airports
+        print(f"{name:<8} {uncached * 1000:>11.1f} {cached * 1000:>9.1f} {len(body):>10} {gzipped:>10} "
+              f"{frame_time * 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--airports', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=11)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
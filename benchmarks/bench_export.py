@@ -0,0 +1,145 @@
+"""
+Time to first byte, total time and peak memory of /flights/today on a large
+synthetic day, for the whole-day JSON array (built as one list, then
+encoded) and the streamed ndjson, csv and arrow exports. Peak memory is
+the largest Python allocation traced (tracemalloc) while the request runs,
+in a separate run since tracing slows it down.
+
+The API runs in process on a Neo4j stand-in holding --flights flights departing today.
+Run from the repository root: python benchmarks/bench_export.py [--flights 200000]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+from timing import ROOT
+from synthetic import timetable_rows
+
+AUTH = b'Basic ' + base64.b64encode(b'sabrine:sab_project23')
+
+
+class StandInResult:
+    def __init__(self, records):
+        self.records = records
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for record in self.records:
+            yield record
+
+    async def single(self):
+        return self.records[0] if self.records else None
+
+
+class StandInSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def run(self, query, **params):
+        if 'DataVersion' in query:
+            return StandInResult([{'version': 1, 'updated': '2023-05-01T10:00:00+00:00'}])
+        return StandInResult([{'origin': origin, 'destination': destination, 'key': key, 'flight': flight}
+                              for origin, destination, key, flight in self.rows])
+
+
+class StandInDriver:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def session(self, **kwargs):
+        return StandInSession(self.rows)
+
+    async def close(self):
+        pass
+
+
+async def request(app, query_string, trace=False):
+    """Seconds to the first body bytes and to the end of the response, bytes sent and the traced peak."""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': '/flights/today', 'raw_path': b'/flights/today', 'query_string': query_string.encode(),
+             'root_path': '', 'headers': [(b'host', b'api'), (b'authorization', AUTH)],
+             'client': ('127.0.0.1', 1), 'server': ('api', 80)}
+    finished = asyncio.Event()
+    received = False
+    first, sent = None, 0
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Streaming responses listen for the client disconnecting
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal first, sent
+        if message['type'] == 'http.response.body' and message.get('body'):
+            if first is None:
+                first = time.perf_counter() - start
+            sent += len(message['body'])
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    total = time.perf_counter() - start
+    finished.set()
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return first, total, sent, peak
+
+
+async def run(args):
+    os.chdir(os.path.join(ROOT, 'api'))
+    import main
+    await main.startup()
+    today = datetime.now().strftime('%Y-%m-%d')
+    main.driver = StandInDriver(timetable_rows(args.flights, args.airports, days=1, start=f'{today}T00:00'))
+    main.version_check_interval = 60
+    main.timetable_path = None
+    snap = await main.current_snapshot()
+
+    formats = ['', 'format=json&limit=1000', 'format=ndjson', 'format=csv']
+    if main.export.pa is not None:
+        formats.append('format=arrow')
+    print(f"{len(snap)} flights today, orjson {'on' if main.orjson else 'off'}")
+    print(f"{'request':<24} {'TTFB ms':>8} {'total ms':>9} {'MB':>7} {'peak MB':>8}")
+    for query_string in formats:
+        runs = []
+        for _ in range(args.repeat):
+            # The whole-day array is otherwise served from the response cache
+            main.response_cache.clear()
+            runs.append(await request(main.app, query_string))
+        main.response_cache.clear()
+        peak = (await request(main.app, query_string, trace=True))[3]
+        first = sorted(run[0] for run in runs)[args.repeat // 2]
+        total = sorted(run[1] for run in runs)[args.repeat // 2]
+        print(f"{query_string or 'json':<24} {first * 1000:>8.1f} {total * 1000:>9.1f} "
+              f"{runs[0][2] / 2 ** 20:>7.1f} {peak / 2 ** 20:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', type=int, default=200000)
+    parser.add_argument('--airports', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Time the connection scan itinerary search: building the timetable from a
+snapshot, then the p50/p99 latency of random searches by number of stops.
+The earliest arrivals of the first searches are checked against, and timed
+with, a depth-first expansion of every path, the way a variable-length
+Cypher path query enumerates them.
+
+Run from the repository root: python benchmarks/bench_itineraries.py [--flights 100000]
+"""
+import argparse
+import bisect
+import random
+from collections import defaultdict
+
+from timing import best_of, percentiles
+import itineraries
+import snapshot
+from synthetic import timetable_rows
+
+INF = float('inf')
+
+
+def departures_by_origin(rows):
+    """(departure, arrival, destination, trip) of each flight in minutes, by origin and departure."""
+    by_origin = defaultdict(list)
+    for origin, destination, _, flight in rows:
+        departure, arrival = itineraries.to_minutes([flight['STD'], flight['ATD']]).tolist()
+        if arrival < departure:
+            arrival += 1440
+        by_origin[origin].append((departure, arrival, destination, (flight['airline'], flight['flight_number'])))
+    for flights in by_origin.values():
+        flights.sort()
+    return by_origin
+
+
+def expand_paths(by_origin, origin, destination, after, max_stops, min_connection=45, max_duration=24 * 60):
+    """Earliest arrival (minutes) over every path of at most max_stops stops, INF if none."""
+    start = int(itineraries.to_minutes([after])[0]) + 1
+    end = start + max_duration
+    best = INF
+
+    def visit(stop, ready, trip, legs):
+        nonlocal best
+        flights = by_origin.get(stop, [])
+        for departure, arrival, next_stop, next_trip in flights[bisect.bisect_left(flights, (ready,)):]:
+            if departure > end:
+                break
+            if trip is not None and next_trip != trip and departure < ready + min_connection:
+                continue
+            if next_stop == destination:
+                best = min(best, arrival)
+            elif legs <= max_stops:
+                visit(next_stop, arrival, next_trip, legs + 1)
+
+    visit(origin, start, None, 1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', type=int, default=100000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--searches', type=int, default=200)
+    parser.add_argument('--checked', type=int, default=20, help="searches also run as a path expansion")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = timetable_rows(args.flights, args.airports, seed=args.seed)
+    snap = snapshot.TimetableSnapshot.from_rows(1, rows)
+    build, timetable = best_of(3, itineraries.Timetable.from_snapshot, snap)
+    print(f"{args.flights} flights between {args.airports} airports, timetable built in {build * 1000:.0f} ms")
+
+    rnd = random.Random(args.seed)
+    codes = sorted({row[0] for row in rows})
+    searches = [(*rnd.sample(codes, 2), f'2099-05-01T{rnd.randrange(24):02d}:{rnd.randrange(60):02d}')
+                for _ in range(args.searches)]
+    print(f"{'stops':>5} {'scan p50 ms':>11} {'scan p99 ms':>11} {'paths p50 ms':>12} {'mismatches':>10}")
+    by_origin = departures_by_origin(rows)
+    for max_stops in (0, 1, 2):
+        p50, p99 = percentiles(timetable.search, [(*search, max_stops) for search in searches])
+        checked = searches[:args.checked]
+        paths_p50, _ = percentiles(expand_paths, [(by_origin, *search, max_stops) for search in checked])
+        mismatches = 0
+        for origin, destination, after in checked:
+            found = timetable.search(origin, destination, after, max_stops)
+            earliest = expand_paths(by_origin, origin, destination, after, max_stops)
+            expected = itineraries.from_minutes(earliest) if earliest != INF else None
+            mismatches += (found[0]['arrival'] if found else None) != expected
+        print(f"{max_stops:>5} {p50 * 1000:>11.2f} {p99 * 1000:>11.2f} {paths_p50 * 1000:>12.2f} "
+              f"{mismatches:>6}/{len(checked)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Time the UNWIND batch loader of the FLIGHT relationships against the
+per-row path it replaced (one query per flight), on a local Neo4j stand-in
+that charges a fixed round trip per query plus a cost per row written.
+
+Run from the repository root: python benchmarks/bench_loader.py [--flights 20000]
+With --uri (e.g. bolt://localhost:7687) both paths write to that Neo4j instead.
+"""
+import argparse
+import time
+
+from timing import best_of
+import neo4j_loader
+import schedule_transform
+from synthetic import schedules
+
+
+class StandInResult:
+    def consume(self):
+        pass
+
+
+class StandInSession:
+    """Session of a driver whose queries each take round_trip + per_row * rows seconds."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def run(self, query, rows=(), **params):
+        self.driver.queries += 1
+        time.sleep(self.driver.round_trip + self.driver.per_row * len(rows))
+        return StandInResult()
+
+    def write_transaction(self, function, *args):
+        return function(self, *args)
+
+
+class StandInDriver:
+    def __init__(self, round_trip, per_row):
+        self.round_trip = round_trip
+        self.per_row = per_row
+        self.queries = 0
+
+    def session(self):
+        return StandInSession(self)
+
+
+def load_per_row(driver, final_df):
+    """The former loader: one MERGE query per flight."""
+    with driver.session() as session:
+        for row in neo4j_loader.frame_to_rows(neo4j_loader.add_flight_keys(final_df), neo4j_loader.FLIGHT_COLUMNS):
+            session.run(neo4j_loader.FLIGHT_QUERY, rows=[row]).consume()
+    return len(final_df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', type=int, default=20000, help="operated legs to load")
+    parser.add_argument('--batch-size', type=int, default=neo4j_loader.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--round-trip', type=float, default=0.5, help="stand-in latency per query, ms")
+    parser.add_argument('--per-row', type=float, default=0.02, help="stand-in cost per row written, ms")
+    parser.add_argument('--uri', help="load into this Neo4j instead of the stand-in")
+    parser.add_argument('--auth', default='neo4j:neo4jproject')
+    args = parser.parse_args()
+
+    # About 1.5 operated legs and days per flight of the synthetic schedule
+    final_df = schedule_transform.transform_schedule(schedules(int(args.flights / 1.5) + 1))[:args.flights]
+    if args.uri:
+        from neo4j import GraphDatabase
+        driver = GraphDatabase.driver(args.uri, auth=tuple(args.auth.split(':', 1)))
+        print(f"{len(final_df)} flights into {args.uri}")
+    else:
+        driver = StandInDriver(args.round_trip / 1000, args.per_row / 1000)
+        print(f"{len(final_df)} flights into the stand-in: {args.round_trip} ms per query, "
+              f"{args.per_row} ms per row")
+
+    per_row, _ = best_of(1, load_per_row, driver, final_df)
+    batched, _ = best_of(1, neo4j_loader.load_flights, driver, final_df, args.batch_size)
+    print(f"per-row            {per_row:8.2f} s  {len(final_df) / per_row:10.0f} rows/s")
+    print(f"UNWIND {args.batch_size:>5}-row   {batched:8.2f} s  {len(final_df) / batched:10.0f} rows/s  "
+          f"({per_row / batched:.1f}x)")
+    if args.uri:
+        driver.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Time the vectorized fleet position estimates of /positions against the
+per-flight estimate of the flight status page applied to every flight
+(parse the times, look up both airports, interpolate), on a synthetic
+timetable snapshot. Both follow the great circle, so their positions are
+also compared.
+
+Run from the repository root: python benchmarks/bench_positions.py [--flights 100000]
+"""
+import argparse
+import math
+from datetime import datetime, timedelta
+
+from timing import best_of, percentiles
+import positions
+import snapshot
+import timetable_file
+from synthetic import airport_columns, timetable_rows
+
+
+def great_circle_point(lat1, lon1, lat2, lon2, t):
+    """Point at fraction t of the great circle arc between two points, in degrees."""
+    a = [math.cos(math.radians(lat1)) * math.cos(math.radians(lon1)),
+         math.cos(math.radians(lat1)) * math.sin(math.radians(lon1)), math.sin(math.radians(lat1))]
+    b = [math.cos(math.radians(lat2)) * math.cos(math.radians(lon2)),
+         math.cos(math.radians(lat2)) * math.sin(math.radians(lon2)), math.sin(math.radians(lat2))]
+    omega = math.acos(max(-1.0, min(1.0, sum(x * y for x, y in zip(a, b)))))
+    if math.sin(omega) < 1e-9:
+        point = [(1 - t) * x + t * y for x, y in zip(a, b)]
+    else:
+        wa, wb = math.sin((1 - t) * omega) / math.sin(omega), math.sin(t * omega) / math.sin(omega)
+        point = [wa * x + wb * y for x, y in zip(a, b)]
+    norm = math.sqrt(sum(x * x for x in point)) or 1
+    x, y, z = (value / norm for value in point)
+    return math.degrees(math.asin(max(-1.0, min(1.0, z)))), math.degrees(math.atan2(y, x))
+
+
+def per_flight_positions(flights, coordinates, now):
+    """(flight, origin, destination, lat, lon) of the airborne flights, estimated one flight at a time."""
+    found = []
+    for flight in flights:
+        if flight['From'] == flight['To'] or flight['From'] not in coordinates or flight['To'] not in coordinates:
+            continue
+        departure = datetime.strptime(flight['STD'], '%Y-%m-%dT%H:%M')
+        arrival = datetime.strptime(flight['ATD'], '%Y-%m-%dT%H:%M')
+        # ATD is stored on the day of departure: overnight flights land the next day
+        if arrival < departure:
+            arrival += timedelta(days=1)
+        if not departure <= now < arrival:
+            continue
+        done = (now - departure) / (arrival - departure)
+        lat, lon = great_circle_point(*coordinates[flight['From']], *coordinates[flight['To']], done)
+        found.append((f"{flight['airline']}{flight['flight_number']}", flight['From'], flight['To'], lat, lon))
+    return found
+
+
+def max_difference(vectorized, expected):
+    """Largest lat/lon difference in degrees between the two estimates of the same flights."""
+    estimates = {}
+    for flight, origin, destination, lat, lon in expected:
+        estimates.setdefault((flight, origin, destination), []).append((lat, lon))
+    difference = 0
+    for flight, origin, destination, lat, lon in zip(vectorized['flight'], vectorized['origin'],
+                                                     vectorized['destination'], vectorized['lat'], vectorized['lon']):
+        # Nearest estimate of the flight (a flight number can be airborne twice on a route)
+        difference = max(difference, min(max(abs(lat - other_lat), abs((lon - other_lon + 180) % 360 - 180))
+                                         for other_lat, other_lon in estimates[flight, origin, destination]))
+    return difference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', type=int, default=100000)
+    parser.add_argument('--airports', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=100, help="estimated minutes, spread over the first day")
+    args = parser.parse_args()
+
+    rows = timetable_rows(args.flights, args.airports)
+    # The origin and destination codes are kept in From/To for the per-flight estimate
+    for origin, destination, _, flight in rows:
+        flight['From'], flight['To'] = origin, destination
+    snap = snapshot.TimetableSnapshot.from_rows(1, rows)
+    airports = airport_columns(sorted({row[0] for row in rows} | {row[1] for row in rows}))
+    build, fleet = best_of(3, positions.FleetPositions, snap, airports)
+
+    first = datetime(2099, 5, 1, 6)
+    times = [first + timedelta(minutes=i * 1440 // args.samples) for i in range(args.samples)]
+    minutes = [int(timetable_file.to_minutes([f'{time:%Y-%m-%dT%H:%M}'])[0]) for time in times]
+    p50, p99 = percentiles(fleet.at, [(m,) for m in minutes])
+    bbox_p50, bbox_p99 = percentiles(fleet.at, [(m, [-10, 35, 30, 60]) for m in minutes])
+
+    # The per-flight estimate decodes every record, then walks them
+    flights = snap.records(range(len(snap)))
+    coordinates = dict(zip(airports['code'], zip(airports['lat'], airports['lon'])))
+    loop_p50, _ = percentiles(per_flight_positions, [(flights, coordinates, time) for time in times[:10]])
+
+    vectorized = fleet.at(minutes[0])
+    expected = per_flight_positions(flights, coordinates, times[0])
+    print(f"{args.flights} flights between {args.airports} airports, FleetPositions built in {build * 1000:.1f} ms")
+    print(f"{len(vectorized['flight'])} airborne at {times[0]:%H:%M}, "
+          f"{len(expected)} with the per-flight estimate, max difference {max_difference(vectorized, expected):.4f} deg")
+    print(f"vectorized        p50 {p50 * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms")
+    print(f"vectorized bbox   p50 {bbox_p50 * 1000:8.2f} ms  p99 {bbox_p99 * 1000:8.2f} ms")
+    print(f"per-flight        p50 {loop_p50 * 1000:8.2f} ms  ({loop_p50 / p50:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
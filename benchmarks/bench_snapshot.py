@@ -0,0 +1,68 @@
+"""
+Read latency of the timetable snapshot behind /departures, /arrivals,
+/flights_by_route and /flights/today, on a synthetic timetable: p50 and
+p99 over random airports, routes and times, for the snapshot built in
+memory from Neo4j rows and for the same snapshot mapped from its
+timetable file. Each read returns the decoded records of a page.
+
+Run from the repository root: python benchmarks/bench_snapshot.py [--flights 200000]
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from timing import best_of, percentiles
+import snapshot
+import timetable_file
+from synthetic import timetable_rows
+
+START = '2099-05-01T00:00'
+
+
+def reads(snap, rows, samples, limit, seed):
+    """Args of each timed read, on the airports, routes and days of rows."""
+    rnd = random.Random(seed)
+    first = datetime.strptime(START, '%Y-%m-%dT%H:%M')
+    times = [f'{first + timedelta(minutes=rnd.randrange(2 * 1440)):%Y-%m-%dT%H:%M}' for _ in range(samples)]
+    picked = [rows[rnd.randrange(len(rows))] for _ in range(samples)]
+    return {
+        'departures': (snap.departures_after, [(origin, time, limit) for (origin, *_), time in zip(picked, times)]),
+        'arrivals': (snap.arrivals_after, [(destination, time, limit)
+                                           for (_, destination, *_), time in zip(picked, times)]),
+        'route': (snap.route_after, [(origin, destination, time, limit)
+                                     for (origin, destination, *_), time in zip(picked, times)]),
+        # One page of /flights/today: the day's indexes from a cursor, then limit records
+        'day page': (lambda start, end, after: snap.records(snap.departing_indexes(start, end, after)[:limit]),
+                     [(time[:10], f'{time[:10]}T23:59', time) for time in times]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--flights', type=int, default=200000)
+    parser.add_argument('--airports', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=20, help="flights per page, as the boards' default")
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = timetable_rows(args.flights, args.airports, start=START, seed=args.seed)
+    build, built = best_of(1, snapshot.TimetableSnapshot.from_rows, 1, rows)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'timetable.bin')
+        timetable_file.write_timetable(path, 1, rows)
+        opened, mapped = best_of(3, snapshot.TimetableSnapshot.from_file, path)
+
+        print(f"{args.flights} flights between {args.airports} airports, pages of {args.limit}")
+        print(f"built from rows in {build * 1000:.0f} ms, mapped from the file in {opened * 1000:.2f} ms")
+        print(f"{'read':<12} {'snapshot':<8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, snap in (('memory', built), ('mapped', mapped)):
+            for read, (function, args_list) in reads(snap, rows, args.samples, args.limit, args.seed).items():
+                p50, p99 = percentiles(function, args_list)
+                print(f"{read:<12} {name:<8} {p50 * 1000:>8.3f} {p99 * 1000:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Peak RSS of the schedule transform on a multi-airline, multi-week pull
+(8 airlines of 3000 flights operated over 4 weeks by default). Each stage
+runs in a fresh process, as the peak RSS of a process only grows:
+
+- typed: transform_pages, categorical codes and int32 minutes;
+- strings: the same rows converted at the output boundary (add_flight_keys),
+  the representation final_df had before the typed transform;
+- old: the transform it replaced (tests/old_transform.py), with --old. It
+  takes several minutes on a full pull, try --flights 300.
+
+Run from the repository root: python benchmarks/bench_transform_memory.py [--weeks 4] [--old]
+"""
+import argparse
+import gc
+import multiprocessing
+import resource
+import warnings
+from datetime import date, timedelta
+
+from timing import best_of
+import neo4j_loader
+import schedule_transform
+from old_transform import old_transform
+from synthetic import schedules
+
+AIRLINES = ['LH', 'LX', 'OS', 'SN', 'EW', '4Y', 'EN', 'WK']
+START = date(2023, 5, 1)
+
+
+def pull(airlines, flights, weeks, seed):
+    """Pages of at most 1000 flights per airline, each flight operated until the end of the period."""
+    end = (START + timedelta(weeks=weeks, days=-1)).strftime('%d%b%y').upper()
+    pages = []
+    for i, airline in enumerate(AIRLINES[:airlines]):
+        response = schedules(flights, seed=seed + i, daily=False, start=START)
+        for flight in response:
+            flight['airline'] = airline
+            flight['periodOfOperationUTC']['endDate'] = end
+        pages.extend(response[start:start + 1000] for start in range(0, len(response), 1000))
+    return pages
+
+
+def old(pages):
+    with warnings.catch_warnings():
+        # freq='d' of the old code is deprecated in recent pandas
+        warnings.simplefilter('ignore')
+        return old_transform([flight for page in pages for flight in page])
+
+
+STAGES = {
+    'typed': schedule_transform.transform_pages,
+    'strings': lambda pages: neo4j_loader.add_flight_keys(schedule_transform.transform_pages(pages)),
+    'old': old,
+}
+
+
+def peak_rss():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(stage, args, results):
+    pages = pull(args.airlines, args.flights, args.weeks, args.seed)
+    gc.collect()
+    before = peak_rss()
+    seconds, final_df = best_of(1, STAGES[stage], pages)
+    results.put((seconds, before, peak_rss(), len(final_df), final_df.memory_usage(deep=True).sum() / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--airlines', type=int, default=8)
+    parser.add_argument('--flights', type=int, default=3000, help='flights per airline')
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--old', action='store_true')
+    args = parser.parse_args()
+
+    # spawn rather than fork: the child must not start with the parent's pages
+    context = multiprocessing.get_context('spawn')
+    print(f"{args.airlines} airlines x {args.flights} flights over {args.weeks} weeks")
+    for stage in ['typed', 'strings'] + (['old'] if args.old else []):
+        results = context.Queue()
+        process = context.Process(target=measure, args=(stage, args, results))
+        process.start()
+        seconds, before, peak, rows, frame = results.get()
+        process.join()
+        # The old transform ignores the days of operation and expands every day
+        print(f"{stage:8} {rows:9d} rows  {seconds:7.2f} s  frame {frame:7.1f} MB  "
+              f"peak RSS {peak:7.0f} MB (+{peak - before:.0f} MB over the pull)")
+
+
+if __name__ == '__main__':
+    main()
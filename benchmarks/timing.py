@@ -0,0 +1,29 @@
+"""Import paths and timing helpers shared by the benchmark scripts."""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules are imported as in their containers, with the synthetic data of the tests
+sys.path[:0] = [os.path.join(ROOT, 'dags'), os.path.join(ROOT, 'api'), os.path.join(ROOT, 'tests')]
+
+
+def best_of(repeat, function, *args):
+    """Shortest of repeat runs in seconds, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def percentiles(function, args_list):
+    """p50 and p99 in seconds of function called once with each args of args_list."""
+    times = []
+    for args in args_list:
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2], times[min(int(len(times) * 0.99), len(times) - 1)]
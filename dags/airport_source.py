@@ -0,0 +1,83 @@
+import csv
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+AIRPORTS_URL = 'https://query.data.world/s/iizp6mghtd73iij65xv5imaavvhr6p?dws=00000'
+
+# Data.World column -> Airport property
+CSV_COLUMNS = {
+    'Airport Name': 'airport_name',
+    'three-digit code': 'codeIATA',
+    'Country': 'country',
+    'City': 'city',
+    'l1': 'lat',
+    'l2': 'lon',
+}
+
+
+def open_airports(url=AIRPORTS_URL, validators=None, timeout=60):
+    """
+    Start downloading the airports CSV, the body is read as it is parsed.
+    validators ({'etag', 'last_modified'} of the previous download) make it a
+    conditional request: None is returned if the file didn't change.
+    """
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    response = requests.get(url, headers=headers, stream=True, timeout=timeout)
+    if response.status_code == 304:
+        response.close()
+        return None
+    response.raise_for_status()
+    return response
+
+
+def response_validators(response):
+    """ETag and Last-Modified of a download, to pass to the next open_airports."""
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def parse_airport(row):
+    """Airport properties of a CSV row, None if it has no code or no valid coordinates."""
+    airport = {prop: (row.get(column) or '').strip() for column, prop in CSV_COLUMNS.items()}
+    if not airport['codeIATA']:
+        return None
+    try:
+        airport['lat'], airport['lon'] = float(airport['lat']), float(airport['lon'])
+    except ValueError:
+        return None
+    if not (-90 <= airport['lat'] <= 90 and -180 <= airport['lon'] <= 180):
+        return None
+    return airport
+
+
+def iter_airports(lines):
+    """Yield the valid airports of the CSV lines (bytes), skipping and counting the others."""
+    # utf-8-sig drops the byte order mark of the first line
+    decoded = (line.decode('utf-8-sig' if i == 0 else 'utf-8') for i, line in enumerate(lines))
+    skipped = 0
+    for row in csv.DictReader(decoded):
+        airport = parse_airport(row)
+        if airport is None:
+            skipped += 1
+            continue
+        yield airport
+    if skipped:
+        logger.warning("Skipped %d airport rows without code or valid coordinates", skipped)
+
+
+def iter_airport_batches(lines, batch_size):
+    """Yield lists of at most batch_size airports parsed from CSV lines, e.g. a streamed response's iter_lines()."""
+    batch = []
+    for airport in iter_airports(lines):
+        batch.append(airport)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,17 +1,51 @@
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from neo4j import GraphDatabase
-import csv
-import requests
 from datetime import datetime, timedelta
-import io
 import configparser
-import pandas as pd
+import logging
+import shutil
+import neo4j_loader
+import neo4j_schema
+import lufthansa_client
+import timetable_file
+import flight_status
+import airport_source
+import flight_pipeline
+import landing_zone
 
 config = configparser.ConfigParser()
 config.read('/opt/airflow/dags/config.ini')
 client_id = config.get('credentials', 'client_id')
 client_secret = config.get('credentials', 'client_secret')
+batch_size = config.getint('neo4j', 'batch_size', fallback=neo4j_loader.DEFAULT_BATCH_SIZE)
+# 'incremental' only writes the schedule changes, 'full' deletes and reloads every flight
+sync_mode = config.get('neo4j', 'sync_mode', fallback='incremental')
+# Airports CSV, another URL (e.g. a local file server) can be set for tests
+airports_url = config.get('airports', 'url', fallback=airport_source.AIRPORTS_URL)
+# Also delete the airports dropped from Data.World that no flight uses
+airport_cleanup = config.getboolean('neo4j', 'airport_cleanup', fallback=False)
+airlines = [a.strip() for a in config.get('lufthansa', 'airlines', fallback='LH').split(',')]
+schedule_days = config.getint('lufthansa', 'days', fallback=2)
+max_workers = config.getint('lufthansa', 'max_workers', fallback=4)
+rate = config.getint('lufthansa', 'rate', fallback=lufthansa_client.DEFAULT_RATE)
+# Flight status poller: flights leaving within status_lookahead minutes are polled,
+# at most status_max_calls status requests per run
+status_lookahead = config.getint('status', 'lookahead', fallback=120)
+status_max_calls = config.getint('status', 'max_calls', fallback=200)
+status_batch_size = config.getint('status', 'batch_size', fallback=50)
+# Origin partitions of the flights load, loaded in parallel
+flight_partitions = config.getint('neo4j', 'partitions', fallback=4)
+# Shared volume where the stages of the flights load hand over their Parquet files
+staging_path = config.get('staging', 'path', fallback='/opt/airflow/staging')
+# Raw pulls and typed flights are kept there by date, for replays and backfills
+landing_path = config.get('landing', 'path', fallback=None)
+# Binary timetable mapped by the API workers, rewritten with every data version
+timetable_path = config.get('timetable', 'path', fallback=None)
+
+# Token is cached on disk so consecutive runs don't request a new one
+token_manager = lufthansa_client.TokenManager(client_id, client_secret,
+                                              cache_path=config.get('lufthansa', 'token_cache', fallback=None))
 
 dag_airport = DAG(
     dag_id='airports_DAG',
@@ -28,36 +62,69 @@ dag_airport = DAG(
     '''
 )
 
-def get_airports_data(): 
-    response = requests.get("https://query.data.world/s/iizp6mghtd73iij65xv5imaavvhr6p?dws=00000")
-    airports = []
-    if response.status_code == 200:
-        # Parse response content as CSV
-        csv_reader = csv.DictReader(io.StringIO(response.content.decode('utf-8'))) 
-        # Convert CSV rows to a list of airport dictionaries
-        for row in csv_reader:
-            airport = {
-                'airport_name': row['Airport Name'],
-                'codeIATA': row['three-digit code'],
-                'country': row['Country'],
-                'city': row['City'],
-                'lat': float(row['l1']),
-                'lon': float(row['l2'])
-            }
-            airports.append(airport)
+def export_timetable(driver):
+    """
+    Writer of the timetable file of the next data version, passed to
+    publish_data_version so the file is in place before the version is.
+    """
+    if not timetable_path:
+        return None
+    return lambda version: timetable_file.export_timetable(driver, timetable_path, version)
+
+def replay_date(dag_run):
+    """Pull date of the landing zone snapshot to replay, set when triggering with {"replay": "YYYY-MM-DD"}."""
+    return (dag_run.conf or {}).get('replay') if dag_run else None
+
+def replay_flights(dag_run):
+    """
+    Whether the typed flights saved by the transform stage are reloaded as
+    they are ({"replay": ..., "replay_from": "flights"}) rather than the raw
+    schedules responses fetched and transformed again.
+    """
+    return bool(replay_date(dag_run)) and (dag_run.conf or {}).get('replay_from') == 'flights'
+
+def replay_path(dag_run, kind):
+    """Landing zone path of the snapshot of kind to replay, None for a live run."""
+    replay = replay_date(dag_run)
+    if not replay:
+        return None
+    if not landing_path:
+        raise ValueError(f"Can't replay {replay}: no landing zone, set [landing] path in config.ini")
+    return landing_zone.snapshot_path(landing_path, kind, replay)
+
+def get_airports_data(dag_run=None): 
+    replay = replay_path(dag_run, landing_zone.AIRPORTS)
     driver = GraphDatabase.driver('bolt://neo4j:7687', auth=('neo4j', 'neo4jproject'))
-    with driver.session() as session:
-    # Iterate over each airport in the data
-        for airport in airports:
-            # Create a node for the airport
-            session.run("MERGE (:Airport {airport_name: $name, codeIATA: $code, country: $country, city: $city, lat: $lat, lon: $lon})",
-             name=airport['airport_name'], 
-             code=airport['codeIATA'],
-             country=airport['country'],
-             city=airport['city'],
-             lat=airport['lat'],
-             lon=airport['lon']
-             )        
+    # Also collapses the Airport nodes duplicated by earlier loads
+    neo4j_schema.apply_schema(driver, batch_size)
+    if replay:
+        # Reload a saved download, without any network access
+        response = None
+        lines = landing_zone.replay_lines(replay)
+    else:
+        # Conditional GET: an unchanged file is neither downloaded nor loaded
+        validators = neo4j_loader.read_source_validators(driver, 'airports')
+        response = airport_source.open_airports(airports_url, validators)
+        if response is None:
+            logging.info("Airports file not modified since the last load")
+            driver.close()
+            return
+        lines = response.iter_lines()
+        if landing_path:
+            today = datetime.today().strftime('%Y-%m-%d')
+            lines = landing_zone.record_lines(lines, landing_zone.snapshot_path(landing_path, landing_zone.AIRPORTS, today))
+    # The CSV is parsed as it is downloaded and written in fixed-size batches,
+    # only new and changed airports are written
+    try:
+        neo4j_loader.sync_airports(driver, airport_source.iter_airport_batches(lines, batch_size),
+                                   batch_size, cleanup=airport_cleanup)
+    finally:
+        if response is not None:
+            response.close()
+    if response is not None:
+        neo4j_loader.save_source_validators(driver, 'airports', airport_source.response_validators(response))
+    # The timetable reads airport names and countries from the airport nodes: export it again
+    neo4j_loader.publish_data_version(driver, export_timetable(driver))
     # Close the driver
     driver.close()
 
@@ -94,93 +161,156 @@ def convert_to_neo4j_date(date, time):
     minute = time % 60
     return f"{date}T{hour:02d}:{minute:02d}"
 
-def get_flights_data():
-    start = datetime.today().strftime('%d%b%y').upper()
-    end = datetime.today() + timedelta(days=2)
-    end = end.strftime('%d%b%y').upper()
-    
-    # Get data from Lufthansa API
-    credentials = {'client_id':client_id, 'client_secret':client_secret,'grant_type':'client_credentials'}
-    token = requests.post("https://api.lufthansa.com/v1/oauth/token", credentials)
-    access_token = 'Bearer ' + token.json()['access_token']
-    headers = {'Authorization':access_token}
-    response = requests.get(f"https://api.lufthansa.com/v1/flight-schedules/flightschedules/passenger?airlines=LH&startDate={start}&endDate={end}&daysOfOperation=1234567&timeMode=UTC", headers = headers)
-    df = pd.DataFrame(response.json())
-    
-    #Unpack flight legs and period of operation 
-    df_legs = df['legs'].apply(pd.Series)
-    df_op = df['periodOfOperationUTC'].apply(pd.Series)
-    df = pd.concat((df, df_op, df_legs), axis=1)
-    flight_list = []
-
-    # Flatten flight legs to one row per flight
-    for i in df_legs:
-            leg_df  = df[['airline', 'flightNumber','startDate', 'endDate', i]]
-            leg_df = leg_df.dropna(axis = 0)
-            unpacked_leg = leg_df[i].apply(pd.Series)
-            leg_df =  pd.concat((leg_df, unpacked_leg[['origin', 'destination', 'sequenceNumber',
-                    'aircraftDepartureTimeUTC', 'aircraftArrivalTimeUTC', 'aircraftType']]), axis = 1)
-            leg_df = leg_df.drop(i, axis = 1)
-            flight_list.append(leg_df)
-    
-    clean_df = pd.concat((i for i in flight_list))
-    clean_df[['startDate', 'endDate']] = clean_df[['startDate', 'endDate']].applymap(lambda x:datetime.strptime(x, '%d%b%y'))
-    
-    # Duplicate flights that operates on multiple day
-    df1 = clean_df[clean_df['startDate'] == clean_df['endDate']]
-    df2 = clean_df[clean_df['startDate'] != clean_df['endDate']]
-    sub_dfs= []
-    for gv ,gd in df2.groupby(['airline', 'flightNumber', 'sequenceNumber']):
-            gsd = gd['startDate'].min()
-            ged = gd['endDate'].max()
-            gdr = pd.date_range(gsd, ged, freq = 'd')
-            ngd= gd.set_index('startDate').reindex(gdr, method='ffill').reset_index().rename({'index':'startDate'}, axis=1)
-            sub_dfs.append(ngd)
-    df2b = pd.concat(sub_dfs, axis=0)
-    final_df = pd.concat([df1, df2b])
-    final_df = final_df.reset_index()
-    
-    # Format departure and arrival time to neo4j date format
-    final_df['aircraftDepartureTimeUTC'] = final_df['aircraftDepartureTimeUTC'].apply(lambda x: f'{x//60:02d}:{x%60:02d}')
-    final_df['aircraftArrivalTimeUTC'] = final_df['aircraftArrivalTimeUTC'].apply(lambda x: f'{x//60:02d}:{x%60:02d}')
-    final_df['departureTime'] = final_df['startDate'].astype(str) + 'T' + final_df['aircraftDepartureTimeUTC']
-    final_df['arrivalTime'] = final_df['startDate'].astype(str) + 'T' + final_df['aircraftArrivalTimeUTC']
-    
-    # Delete previous data
+def staging_directory(ts_nodash):
+    return flight_pipeline.run_directory(staging_path, ts_nodash)
+
+def fetch_flights_data(ts_nodash, dag_run=None):
+    replay = replay_date(dag_run)
+    if replay_flights(dag_run):
+        # Nothing to fetch: the transform stage reads the saved flights
+        return {'legs': None, 'date': replay, 'flights': replay_path(dag_run, landing_zone.FLIGHTS)}
+    if replay:
+        # Responses saved by an earlier run, without any network access
+        pages = landing_zone.replay_pages(replay_path(dag_run, landing_zone.SCHEDULES))
+    else:
+        start = datetime.today()
+        end = start + timedelta(days=schedule_days)
+
+        # Get data from Lufthansa API, one sub-query per airline and day
+        client = lufthansa_client.LufthansaClient(token_manager, rate=rate, max_workers=max_workers)
+        pages = client.iter_schedules(airlines, start.date(), end.date())
+        if landing_path:
+            pages = landing_zone.record_pages(pages, landing_zone.snapshot_path(
+                landing_path, landing_zone.SCHEDULES, start.strftime('%Y-%m-%d')))
+    # Flattened legs are written to Parquet on the shared volume, not to XCom
+    legs = flight_pipeline.fetch_legs(pages, staging_directory(ts_nodash))
+    if not legs:
+        # The schedules API answers 404 rather than failing: never load an empty pull
+        raise ValueError("No flight legs fetched, the flights load is stopped")
+    return {'legs': legs, 'date': replay or start.strftime('%Y-%m-%d')}
+
+def transform_flights_data(ts_nodash, ti, dag_run=None):
+    driver = GraphDatabase.driver('bolt://neo4j:7687', auth=('neo4j', 'neo4jproject'))
+    # Schema changes and global cleanups run once, before the parallel loads
+    neo4j_schema.apply_schema(driver, batch_size)
+    unkeyed = neo4j_loader.delete_unkeyed_flights(driver, batch_size)
+    driver.close()
+    fetched = ti.xcom_pull(task_ids='fetch_flights')
+    # The typed final rows of a live pull are kept in the landing zone
+    snapshot = None
+    if landing_path and not replay_date(dag_run):
+        snapshot = landing_zone.snapshot_path(landing_path, landing_zone.FLIGHTS, fetched['date'])
+    replay = fetched.get('flights')
+    # One row per leg and day of operation, split by origin airport
+    partitions = flight_pipeline.partition_flights(staging_directory(ts_nodash), flight_partitions,
+                                                   snapshot, replay=replay)
+    return {'partitions': partitions, 'deleted': unkeyed}
+
+def load_flights_partition(partition, ts_nodash):
+    final_df = flight_pipeline.read_partition(staging_directory(ts_nodash), partition)
+    origins = final_df['origin'].unique().tolist()
     driver = GraphDatabase.driver('bolt://neo4j:7687', auth=('neo4j', 'neo4jproject'))
-    with driver.session() as session: 
-            session.run("""
-                    MATCH (a)-[f:FLIGHT]-(a2)
-                    DELETE f
-                    """)
-    # Import new data 
-    with driver.session() as session:
-            for i,r in final_df.iterrows():
-                    session.run("""
-                            MERGE (a1:Airport {codeIATA: $origin})
-                            MERGE (a2:Airport {codeIATA: $destination})
-                            MERGE (a1)-[f:FLIGHT {flight_number: $flight_number, airline: $airline, aircraft: $aircraft, STD: $STD, ATD: $ATD}]->(a2)
-                            SET f.From = a1.country,
-                                    f.To = a2.country,
-                                    f.FromAirportName = a1.airport_name,
-                                    f.ToAirportName = a2.airport_name
-                            """,
-                            origin=r["origin"],
-                            destination=r["destination"],
-                            flight_number=r["flightNumber"],
-                            airline=r["airline"],
-                            aircraft=r["aircraftType"],
-                            STD=r["departureTime"],
-                            ATD=r["arrivalTime"]
-                            )
-
-    driver.close()    
-
-task2 = PythonOperator(
-    task_id='request_flight',
-    python_callable=get_flights_data,
+    if sync_mode == 'full':
+        # Delete the previous flights of the partition's airports and import the new ones
+        deleted = neo4j_loader.delete_origin_flights(driver, origins, batch_size)
+        inserted = neo4j_loader.load_flights(driver, final_df, batch_size)
+        counts = {'inserted': inserted, 'updated': 0, 'deleted': deleted}
+    else:
+        counts = neo4j_loader.sync_flights(driver, final_df, batch_size, origins=origins)
+    driver.close()
+    # Returned counts are pushed to XCom
+    return counts
+
+def publish_flights_data(ts_nodash, ti):
+    directory = staging_directory(ts_nodash)
+    driver = GraphDatabase.driver('bolt://neo4j:7687', auth=('neo4j', 'neo4jproject'))
+    # Airports without any flight left in the schedule belong to no partition
+    deleted = neo4j_loader.delete_other_origins_flights(driver, flight_pipeline.scheduled_origins(directory),
+                                                        batch_size)
+    counts = {'inserted': 0, 'updated': 0, 'deleted': deleted + ti.xcom_pull(task_ids='transform_flights')['deleted']}
+    for partition_counts in ti.xcom_pull(task_ids=load_task_ids):
+        for name, count in partition_counts.items():
+            counts[name] += count
+    # Tell the API its cached flights are stale
+    if any(counts.values()):
+        neo4j_loader.publish_data_version(driver, export_timetable(driver))
+    driver.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    # Returned counts are pushed to XCom
+    return counts
+
+fetch_flights = PythonOperator(
+    task_id='fetch_flights',
+    python_callable=fetch_flights_data,
+    dag=dag_flight,
+    doc_md='''#Request API
+    Retrieve flights data from Lufthansa API and stage the flattened legs as Parquet
+    '''
+)
+
+transform_flights = PythonOperator(
+    task_id='transform_flights',
+    python_callable=transform_flights_data,
+    dag=dag_flight,
+    doc_md='''#Transform
+    Expand the legs to one row per day of operation and split them by origin airport
+    '''
+)
+
+# One load task per origin partition, run in parallel by the Celery workers
+load_task_ids = [f'load_flights_{p}' for p in range(flight_partitions)]
+load_flights = [PythonOperator(
+    task_id=task_id,
+    python_callable=load_flights_partition,
+    op_kwargs={'partition': p},
+    dag=dag_flight,
+    doc_md='''#Load
+    Write the flights of one origin partition to Neo4j
+    '''
+) for p, task_id in enumerate(load_task_ids)]
+
+publish_flights = PythonOperator(
+    task_id='publish_flights',
+    python_callable=publish_flights_data,
     dag=dag_flight,
+    doc_md='''#Publish
+    Delete the flights of airports left out of the schedule, then publish the data version
+    '''
+)
+
+fetch_flights >> transform_flights >> load_flights >> publish_flights
+
+dag_status = DAG(
+    dag_id='flight_status_DAG',
+    description='Mise a jour des statuts des vols en cours via l\'API Lufthansa',
+    tags=['projet'],
+    schedule_interval='*/5 * * * *',
+    default_args={
+        'owner': 'airflow',
+        'start_date': datetime(2023, 4, 24),
+    },
+    catchup = False,
+    max_active_runs = 1,
+    doc_md= '''#Flight status DAG
+    Poll the status of the flights of the active window
+    '''
+)
+
+def poll_flight_statuses():
+    client = lufthansa_client.LufthansaClient(token_manager, rate=rate, max_workers=max_workers)
+    driver = GraphDatabase.driver('bolt://neo4j:7687', auth=('neo4j', 'neo4jproject'))
+    counts = flight_status.poll_statuses(driver, client, lookahead=status_lookahead,
+                                         max_calls=status_max_calls, batch_size=status_batch_size)
+    driver.close()
+    # Returned counts are pushed to XCom
+    return counts
+
+task3 = PythonOperator(
+    task_id='poll_flight_status',
+    python_callable=poll_flight_statuses,
+    dag=dag_status,
     doc_md='''#Request API
-    Retrieve flights data from Lufthansa API
+    Refresh the status of flights near departure or arrival first and write it
+    onto their FLIGHT relationship
     '''
 )
@@ -0,0 +1,103 @@
+import glob
+import logging
+import os
+import shutil
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import landing_zone
+import schedule_transform
+
+logger = logging.getLogger(__name__)
+
+# Stages of a flights load hand over Parquet files in a per-run directory:
+#   legs/part-NNNNN.parquet    flattened legs, one file per schedules response
+#   flights/part-NN.parquet    final rows, one file per origin partition
+LEGS_DIR = 'legs'
+FLIGHTS_DIR = 'flights'
+
+
+def run_directory(root, run):
+    return os.path.join(root, 'flights', run)
+
+
+def _write(df, path):
+    # Written next to path then renamed, a retried task never reads half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def _read_parts(directory, columns=None):
+    paths = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+    return [pd.read_parquet(path, columns=columns) for path in paths]
+
+
+def fetch_legs(pages, directory):
+    """
+    Write the flattened legs of each flight-schedules response to its own
+    part file as it arrives. Returns the number of legs written.
+    """
+    shutil.rmtree(os.path.join(directory, LEGS_DIR), ignore_errors=True)
+    total = 0
+    for i, flights in enumerate(pages):
+        if not flights:
+            continue
+        legs = schedule_transform.flatten_legs(flights)
+        _write(legs, os.path.join(directory, LEGS_DIR, f'part-{i:05d}.parquet'))
+        total += len(legs)
+    logger.info("Fetched %d legs", total)
+    return total
+
+
+def partition_of(codes, partitions):
+    """Partition number of each airport code, stable across runs and processes."""
+    codes = codes.astype('category')
+    # Hashed once per distinct code
+    numbers = np.array([zlib.crc32(str(code).encode('utf-8')) % partitions for code in codes.cat.categories],
+                       dtype='int64')
+    return numbers[codes.cat.codes.to_numpy()]
+
+
+def partition_flights(directory, partitions, snapshot=None, replay=None):
+    """
+    Expand the fetched legs to the final rows and split them by origin airport
+    into `partitions` files. Within a file rows are ordered by origin and
+    destination, so concurrent loads lock airport nodes in the same order.
+    With snapshot, the final rows are also kept there (see landing_zone).
+    With replay, the final rows saved at that path are split instead of the
+    fetched legs. Returns the number of rows of each partition. Raises
+    ValueError if no flight was fetched.
+    """
+    if replay:
+        final_df = landing_zone.read_flights(replay)
+    else:
+        final_df = schedule_transform.transform_legs(_read_parts(os.path.join(directory, LEGS_DIR)))
+    if final_df.empty:
+        # E.g. every schedules query answered 404: loading it would delete every flight
+        raise ValueError("No flights in the fetched schedules")
+    if snapshot:
+        landing_zone.write_flights(final_df, snapshot)
+    final_df = final_df.sort_values(['origin', 'destination', 'departureTime'], kind='mergesort')
+    partition = partition_of(final_df['origin'], partitions)
+    shutil.rmtree(os.path.join(directory, FLIGHTS_DIR), ignore_errors=True)
+    counts = []
+    for p in range(partitions):
+        # Empty partitions are written too, every load task has its file
+        part = final_df[partition == p].reset_index(drop=True)
+        _write(part, os.path.join(directory, FLIGHTS_DIR, f'part-{p:02d}.parquet'))
+        counts.append(len(part))
+    logger.info("Partitioned %d flights: %s", len(final_df), counts)
+    return counts
+
+
+def read_partition(directory, partition):
+    return pd.read_parquet(os.path.join(directory, FLIGHTS_DIR, f'part-{partition:02d}.parquet'))
+
+
+def scheduled_origins(directory):
+    """Origin airports of every partition."""
+    parts = _read_parts(os.path.join(directory, FLIGHTS_DIR), columns=['origin'])
+    return sorted(set().union(*(part['origin'].unique() for part in parts)))
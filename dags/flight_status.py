@@ -0,0 +1,168 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M'
+# status_checked is stored in UTC as '2023-05-01T10:00:00+00:00', the offset is dropped when read
+CHECKED_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Flights that left more than MAX_DURATION minutes ago have landed
+MAX_DURATION = 20 * 60
+
+# Landed and cancelled flights are not polled again
+FINAL_STATUSES = ['LD', 'CD']
+
+# Status properties stored on the FLIGHT relationship
+STATUS_FIELDS = ['status', 'status_text', 'time_status', 'departure_estimated', 'departure_actual',
+                 'arrival_estimated', 'arrival_actual']
+
+# Flights of the active window whose status can still change
+ACTIVE_FLIGHTS_QUERY = """
+    MATCH ()-[f:FLIGHT]->()
+    WHERE f.STD >= $start AND f.STD <= $end
+      AND (f.status IS NULL OR NOT f.status IN $final)
+    RETURN f.key AS key, f.origin AS origin, f.airline AS airline, f.flight_number AS flight_number,
+           f.STD AS STD, f.ATD AS ATD, f.status_checked AS checked
+    """
+
+# status_updated only moves when the status changed, it orders the change feed:
+# $updated is stamped when the batch is written and grows with every batch
+STATUS_QUERY = """
+    UNWIND $rows AS r
+    MATCH (:Airport {codeIATA: r.origin})-[f:FLIGHT {key: r.key}]->()
+    SET f.status_checked = r.checked
+    WITH f, r
+    WHERE r.fingerprint IS NOT NULL AND coalesce(f.status_fingerprint, '') <> r.fingerprint
+    SET f.status = r.status,
+        f.status_text = r.status_text,
+        f.time_status = r.time_status,
+        f.departure_estimated = r.departure_estimated,
+        f.departure_actual = r.departure_actual,
+        f.arrival_estimated = r.arrival_estimated,
+        f.arrival_actual = r.arrival_actual,
+        f.status_fingerprint = r.fingerprint,
+        f.status_updated = $updated
+    RETURN count(f) AS changed
+    """
+
+
+def _utc(time):
+    """'2023-05-01T10:00Z' of the status API as stored in the graph: '2023-05-01T10:00'."""
+    return time['DateTime'].rstrip('Z') if time else None
+
+
+def parse_statuses(body):
+    """Yield ((origin, scheduled departure), status) for each leg of a flight status response."""
+    flights = body['FlightStatusResource']['Flights']['Flight']
+    # A single flight is returned as an object rather than a list
+    if isinstance(flights, dict):
+        flights = [flights]
+    for flight in flights:
+        departure, arrival = flight['Departure'], flight['Arrival']
+        yield (departure['AirportCode'], _utc(departure.get('ScheduledTimeUTC'))), {
+            'status': flight.get('FlightStatus', {}).get('Code'),
+            'status_text': flight.get('FlightStatus', {}).get('Definition'),
+            'time_status': arrival.get('TimeStatus', {}).get('Definition'),
+            'departure_estimated': _utc(departure.get('EstimatedTimeUTC')),
+            'departure_actual': _utc(departure.get('ActualTimeUTC')),
+            'arrival_estimated': _utc(arrival.get('EstimatedTimeUTC')),
+            'arrival_actual': _utc(arrival.get('ActualTimeUTC')),
+        }
+
+
+def due_flights(flights, now, max_calls, near=60, near_interval=5, far_interval=30):
+    """
+    Group the flights whose status is due by (flight number, date) request,
+    flights within `near` minutes of their departure or arrival first.
+    Those are refreshed every near_interval minutes, the others every
+    far_interval minutes. At most max_calls requests are returned.
+    """
+    now = now.replace(tzinfo=None)
+    ranked = []
+    for flight in flights:
+        std = datetime.strptime(flight['STD'], TIME_FORMAT)
+        atd = datetime.strptime(flight['ATD'], TIME_FORMAT) if flight['ATD'] else std
+        # ATD is stored on the day of departure: overnight flights land the next day
+        if atd < std:
+            atd += timedelta(days=1)
+        distance = min(abs(std - now), abs(atd - now)) / timedelta(minutes=1)
+        interval = near_interval if distance <= near else far_interval
+        if flight['checked']:
+            # strptime rather than fromisoformat, which the workers' Python 3.6 doesn't have
+            checked = datetime.strptime(flight['checked'][:19], CHECKED_FORMAT)
+            if now - checked < timedelta(minutes=interval):
+                continue
+        ranked.append((distance, flight))
+    ranked.sort(key=lambda item: item[0])
+
+    requests = {}
+    for _, flight in ranked:
+        request = (f"{flight['airline']}{flight['flight_number']}", flight['STD'][:10])
+        if request not in requests:
+            if len(requests) == max_calls:
+                continue
+            requests[request] = []
+        requests[request].append(flight)
+    return requests
+
+
+def _write_statuses(tx, rows, updated):
+    return tx.run(STATUS_QUERY, rows=rows, updated=updated).single()['changed']
+
+
+def _next_stamp(previous=None):
+    """
+    The current time as a status_updated stamp, later than previous: a reader
+    of the change feed that saw a batch never misses the batches after it.
+    """
+    stamp = datetime.now(timezone.utc)
+    if previous is not None and stamp <= previous:
+        stamp = previous + timedelta(microseconds=1)
+    return stamp
+
+
+def poll_statuses(driver, client, now=None, lookahead=120, max_calls=200, batch_size=50):
+    """
+    Refresh the status of the flights of the active window (departed in the
+    last MAX_DURATION minutes or leaving within lookahead minutes), most
+    urgent first, and write it onto their FLIGHT relationship in batches.
+    Returns the counts of requests, checked and changed flights.
+    """
+    now = now or datetime.now(timezone.utc)
+    start = (now - timedelta(minutes=MAX_DURATION)).strftime(TIME_FORMAT)
+    end = (now + timedelta(minutes=lookahead)).strftime(TIME_FORMAT)
+    with driver.session() as session:
+        flights = session.read_transaction(
+            lambda tx: [r.data() for r in tx.run(ACTIVE_FLIGHTS_QUERY, start=start, end=end, final=FINAL_STATUSES)])
+    requests = due_flights(flights, now, max_calls)
+
+    checked = now.isoformat(timespec='seconds')
+    counts = {'requests': len(requests), 'checked': 0, 'changed': 0}
+    rows = []
+    updated = None
+
+    def write(session, rows):
+        nonlocal updated
+        updated = _next_stamp(updated)
+        counts['changed'] += session.write_transaction(_write_statuses, rows,
+                                                       updated.isoformat(timespec='microseconds'))
+        counts['checked'] += len(rows)
+
+    with driver.session() as session:
+        for flight_number, date, body in client.iter_flight_statuses(list(requests)):
+            statuses = dict(parse_statuses(body)) if body else {}
+            for flight in requests[(flight_number, date)]:
+                status = statuses.get((flight['origin'], flight['STD']))
+                row = {'key': flight['key'], 'origin': flight['origin'], 'checked': checked, 'fingerprint': None}
+                row.update(status or dict.fromkeys(STATUS_FIELDS))
+                if status:
+                    row['fingerprint'] = '|'.join(str(status[field]) for field in STATUS_FIELDS)
+                rows.append(row)
+            if len(rows) >= batch_size:
+                write(session, rows)
+                rows = []
+        if rows:
+            write(session, rows)
+    logger.info("Flight status poll: %(requests)d requests, %(checked)d flights checked, %(changed)d changed", counts)
+    return counts
@@ -0,0 +1,77 @@
+import gzip
+import json
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Landing zone layout, one directory per pull date:
+#   raw/schedules/date=YYYY-MM-DD/pages.jsonl.gz     schedules responses, one per line
+#   raw/airports/date=YYYY-MM-DD/airports.csv.gz     airports CSV as downloaded
+#   flights/date=YYYY-MM-DD/flights.parquet          typed final_df (see schedule_transform)
+SCHEDULES = ('raw/schedules', 'pages.jsonl.gz')
+AIRPORTS = ('raw/airports', 'airports.csv.gz')
+FLIGHTS = ('flights', 'flights.parquet')
+
+
+def snapshot_path(root, kind, day):
+    """Path of a snapshot of kind (SCHEDULES, AIRPORTS or FLIGHTS) pulled on day ('YYYY-MM-DD')."""
+    directory, name = kind
+    return os.path.join(root, directory, f'date={day}', name)
+
+
+def _open_for_write(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return gzip.open(path + '.tmp', 'wb')
+
+
+def record_pages(pages, path):
+    """
+    Yield the schedules responses of pages, writing each one to the gzipped
+    JSON lines file at path. The file only replaces a previous snapshot once
+    every page was read.
+    """
+    with _open_for_write(path) as f:
+        for flights in pages:
+            f.write(json.dumps(flights).encode('utf-8') + b'\n')
+            yield flights
+    os.replace(path + '.tmp', path)
+    logger.info("Saved raw schedules to %s", path)
+
+
+def replay_pages(path):
+    """Schedules responses saved by record_pages."""
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def record_lines(lines, path):
+    """Yield the lines (bytes, without line break) of a download, writing them gzipped to path."""
+    with _open_for_write(path) as f:
+        for line in lines:
+            f.write(line + b'\n')
+            yield line
+    os.replace(path + '.tmp', path)
+    logger.info("Saved raw download to %s", path)
+
+
+def replay_lines(path):
+    """Lines saved by record_lines."""
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            yield line.rstrip(b'\n')
+
+
+def write_flights(final_df, path):
+    # The typed columns are kept as is: dictionary-encoded codes, int32 minutes
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    final_df.to_parquet(path + '.tmp', index=False, compression='zstd')
+    os.replace(path + '.tmp', path)
+    logger.info("Saved %d flights to %s", len(final_df), path)
+
+
+def read_flights(path):
+    return pd.read_parquet(path)
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+import lufthansa_client
+from lufthansa_client import API_URL, DEFAULT_RATE, RETRY_STATUS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTokenBucket:
+    """Token bucket for coroutines of one event loop."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncTokenManager(lufthansa_client.TokenManager):
+    """
+    TokenManager for an async HTTP client. Ahead of expiry the token is
+    refreshed by one background task while callers keep the current one.
+    """
+
+    def __init__(self, client_id, client_secret, client, **kwargs):
+        super().__init__(client_id, client_secret, session=client, **kwargs)
+        self.alock = asyncio.Lock()
+        self.refreshing = None
+
+    async def get(self):
+        if self._valid(self.margin):
+            return 'Bearer ' + self.token
+        if self._valid():
+            if self.refreshing is None or self.refreshing.done():
+                self.refreshing = asyncio.ensure_future(self._refresh_ahead())
+            return 'Bearer ' + self.token
+        async with self.alock:
+            if not self._valid():
+                await self.refresh()
+        return 'Bearer ' + self.token
+
+    async def _refresh_ahead(self):
+        async with self.alock:
+            try:
+                await self.refresh()
+            except httpx.HTTPError:
+                logger.warning("Lufthansa token refresh failed, using current token", exc_info=True)
+
+    async def refresh(self):
+        response = await self.session.post(self.url, data=self.credentials)
+        response.raise_for_status()
+        data = response.json()
+        self.token = data['access_token']
+        self.expires_at = time.time() + int(data.get('expires_in', 0))
+        self._save()
+        logger.info("Fetched new Lufthansa token, valid for %ss", data.get('expires_in'))
+
+    def invalidate(self):
+        self.token = None
+        self.expires_at = 0
+
+
+class AsyncTTLCache:
+    """
+    TTL cache for coroutines: concurrent misses on the same key await a
+    single fetch.
+    """
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = {}
+        self.pending = {}
+
+    async def get(self, key, fetch):
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self._fill(key, fetch))
+        # A cancelled caller must not cancel the fetch shared with the others
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, fetch):
+        try:
+            value = await fetch()
+        finally:
+            del self.pending[key]
+        if len(self.entries) >= self.maxsize:
+            now = time.monotonic()
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+            if len(self.entries) >= self.maxsize:
+                self.entries.pop(min(self.entries, key=lambda k: self.entries[k][0]))
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+
+class AsyncLufthansaClient:
+    """Non-blocking counterpart of LufthansaClient used by the API."""
+
+    def __init__(self, client_id, client_secret, base_url=API_URL, rate=DEFAULT_RATE,
+                 pool_size=10, timeout=10, max_retries=2, backoff=0.5):
+        self.client = httpx.AsyncClient(timeout=timeout,
+                                        limits=httpx.Limits(max_connections=pool_size,
+                                                            max_keepalive_connections=pool_size))
+        self.tokens = AsyncTokenManager(client_id, client_secret, self.client, base_url=base_url)
+        self.base_url = base_url
+        self.bucket = AsyncTokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def request(self, url, params=None):
+        """GET url, retrying 429/5xx with exponential backoff and 401 with a new token."""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            response = await self.client.get(url, params=params,
+                                             headers={'Authorization': await self.tokens.get(),
+                                                      'Accept': 'application/json'})
+            if response.status_code == 401 and attempt == 0:
+                self.tokens.invalidate()
+                continue
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+            logger.warning("%s returned %s, retrying in %.1fs", url, response.status_code, delay)
+            await asyncio.sleep(delay)
+        return response
+
+    async def flight_status(self, flight_number, date):
+        """Return the operations/flightstatus response of a flight on date (YYYY-MM-DD)."""
+        return await self.request(f"{self.base_url}/operations/flightstatus/{flight_number}/{date}")
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.lufthansa.com/v1'
+SCHEDULES_PATH = '/flight-schedules/flightschedules/passenger'
+
+# Lufthansa public plan: 5 calls per second
+DEFAULT_RATE = 5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def pooled_session(pool_size=10):
+    """requests session keeping up to pool_size keep-alive connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second on average."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TokenManager:
+    """
+    Cache the OAuth client-credentials token until it expires, shared by all
+    threads of the process. Within `margin` seconds of expiry a single thread
+    refreshes it while the others keep using the current token.
+    With cache_path the token is also kept on disk so it is reused across runs.
+    """
+
+    def __init__(self, client_id, client_secret, session=None, base_url=API_URL,
+                 cache_path=None, margin=300):
+        self.credentials = {'client_id': client_id, 'client_secret': client_secret,
+                            'grant_type': 'client_credentials'}
+        self.session = session or requests.Session()
+        self.url = base_url + '/oauth/token'
+        self.cache_path = cache_path
+        self.margin = margin
+        self.token = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self.token, self.expires_at = cached['access_token'], cached['expires_at']
+        except (ValueError, KeyError):
+            pass
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        tmp = self.cache_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'access_token': self.token, 'expires_at': self.expires_at}, f)
+        os.replace(tmp, self.cache_path)
+
+    def _valid(self, margin=0):
+        return self.token is not None and time.time() < self.expires_at - margin
+
+    def get(self):
+        """Return the Authorization header value, fetching a new token if needed."""
+        if self._valid(self.margin):
+            return 'Bearer ' + self.token
+        if self._valid():
+            # Refresh ahead of expiry: only the thread that gets the lock waits
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.refresh()
+                except requests.RequestException:
+                    logger.warning("Lufthansa token refresh failed, using current token", exc_info=True)
+                finally:
+                    self.lock.release()
+            return 'Bearer ' + self.token
+        with self.lock:
+            # Another thread may have refreshed it while we waited
+            if not self._valid():
+                self.refresh()
+        return 'Bearer ' + self.token
+
+    def refresh(self):
+        response = self.session.post(self.url, self.credentials, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        self.token = data['access_token']
+        self.expires_at = time.time() + int(data.get('expires_in', 0))
+        self._save()
+        logger.info("Fetched new Lufthansa token, valid for %ss", data.get('expires_in'))
+
+    def invalidate(self):
+        with self.lock:
+            self.token = None
+            self.expires_at = 0
+
+
+class LufthansaClient:
+    """
+    Rate-limited Lufthansa Open API client with retries and pagination.
+    Sub-queries of a schedule pull run concurrently on a bounded thread pool.
+    """
+
+    def __init__(self, token_manager, session=None, base_url=API_URL, rate=DEFAULT_RATE,
+                 max_workers=4, max_retries=5, backoff=1.0, timeout=30):
+        self.tokens = token_manager
+        self.session = session or pooled_session(max_workers)
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def request(self, url, params=None):
+        """GET url, retrying 429/5xx with exponential backoff and 401 with a new token."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = self.session.get(url, params=params, timeout=self.timeout,
+                                        headers={'Authorization': self.tokens.get(),
+                                                 'Accept': 'application/json'})
+            if response.status_code == 401 and attempt == 0:
+                self.tokens.invalidate()
+                continue
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+            logger.warning("%s returned %s, retrying in %.1fs", url, response.status_code, delay)
+            time.sleep(delay)
+        return response
+
+    def iter_pages(self, path, params=None):
+        """Yield the JSON body of each page, following Link: rel="next" headers."""
+        url = self.base_url + path
+        while url:
+            response = self.request(url, params)
+            # The schedules API answers 404 when no flight matches
+            if response.status_code == 404:
+                return
+            response.raise_for_status()
+            yield response.json()
+            url = response.links.get('next', {}).get('url')
+            params = None
+
+    def flight_status(self, flight_number, date):
+        """Return the operations/flightstatus response of a flight on date (YYYY-MM-DD)."""
+        return self.request(f"{self.base_url}/operations/flightstatus/{flight_number}/{date}")
+
+    def _fetch_flight_status(self, flight_number, date):
+        response = self.flight_status(flight_number, date)
+        if not response.ok:
+            # 404: unknown flight; other errors only skip this flight until the next poll
+            if response.status_code != 404:
+                logger.warning("Flight status of %s on %s returned %s", flight_number, date, response.status_code)
+            return None
+        return response.json()
+
+    def iter_flight_statuses(self, flights):
+        """
+        Fetch the status of each (flight_number, date) concurrently and yield
+        (flight_number, date, body) as each one completes, body None on error.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_flight_status, *flight): flight for flight in flights}
+            for future in as_completed(futures):
+                yield (*futures[future], future.result())
+
+    def _fetch_schedules(self, params):
+        flights = []
+        for page in self.iter_pages(SCHEDULES_PATH, params):
+            flights.extend(page if isinstance(page, list) else [page])
+        return flights
+
+    def iter_schedules(self, airlines, start, end, days_per_query=1):
+        """
+        Split [start, end] and the airline list into sub-queries and yield
+        the flights of each one as soon as it completes.
+        """
+        queries = []
+        day = start
+        while day <= end:
+            last = min(day + timedelta(days=days_per_query - 1), end)
+            for airline in airlines:
+                queries.append({'airlines': airline,
+                                'startDate': day.strftime('%d%b%y').upper(),
+                                'endDate': last.strftime('%d%b%y').upper(),
+                                'daysOfOperation': '1234567',
+                                'timeMode': 'UTC'})
+            day = last + timedelta(days=1)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch_schedules, q) for q in queries]
+            for future in as_completed(futures):
+                yield future.result()
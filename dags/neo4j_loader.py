@@ -0,0 +1,412 @@
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import schedule_transform
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Flights are merged on their leg key so the same query inserts new legs
+# and updates changed ones
+FLIGHT_QUERY = """
+    UNWIND $rows AS r
+    MERGE (a1:Airport {codeIATA: r.origin})
+    MERGE (a2:Airport {codeIATA: r.destination})
+    MERGE (a1)-[f:FLIGHT {key: r.key}]->(a2)
+    SET f.flight_number = r.flight_number,
+        f.airline = r.airline,
+        f.sequence = r.sequence,
+        f.aircraft = r.aircraft,
+        f.STD = r.STD,
+        f.ATD = r.ATD,
+        f.origin = r.origin,
+        f.destination = r.destination,
+        f.From = a1.country,
+        f.To = a2.country,
+        f.FromAirportName = a1.airport_name,
+        f.ToAirportName = a2.airport_name
+    """
+
+DELETE_FLIGHT_QUERY = """
+    UNWIND $rows AS r
+    MATCH (:Airport {codeIATA: r.origin})-[f:FLIGHT {key: r.key}]->()
+    DELETE f
+    """
+
+DELETE_UNKEYED_FLIGHTS_QUERY = """
+    MATCH ()-[f:FLIGHT]->()
+    WHERE f.key IS NULL
+    WITH f LIMIT $limit
+    DELETE f
+    RETURN count(*) AS deleted
+    """
+
+STORED_FLIGHTS_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
+    WHERE f.key IS NOT NULL
+    RETURN f.key AS key, a1.codeIATA AS origin, a2.codeIATA AS destination, f.aircraft AS aircraftType, f.ATD AS arrivalTime
+    """
+
+# Same for the flights leaving some airports, read through the airport_code index
+STORED_ORIGIN_FLIGHTS_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
+    WHERE a1.codeIATA IN $origins AND f.key IS NOT NULL
+    RETURN f.key AS key, a1.codeIATA AS origin, a2.codeIATA AS destination, f.aircraft AS aircraftType, f.ATD AS arrivalTime
+    """
+
+DELETE_ORIGIN_FLIGHTS_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->()
+    WHERE a1.codeIATA IN $origins
+    WITH f LIMIT $limit
+    DELETE f
+    RETURN count(*) AS deleted
+    """
+
+# Flights leaving airports that are no longer in the schedule
+DELETE_OTHER_ORIGINS_FLIGHTS_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->()
+    WHERE NOT a1.codeIATA IN $origins
+    WITH f LIMIT $limit
+    DELETE f
+    RETURN count(*) AS deleted
+    """
+
+# Airports are merged on their code, content_hash tells later loads whether
+# the row changed
+AIRPORT_QUERY = """
+    UNWIND $rows AS r
+    MERGE (a:Airport {codeIATA: r.code})
+    SET a.airport_name = r.name,
+        a.country = r.country,
+        a.city = r.city,
+        a.lat = r.lat,
+        a.lon = r.lon,
+        a.content_hash = r.hash
+    """
+
+STORED_AIRPORTS_QUERY = """
+    MATCH (a:Airport)
+    RETURN a.codeIATA AS code, a.content_hash AS hash
+    """
+
+# Airports dropped from the source that no flight uses anymore
+DELETE_STALE_AIRPORTS_QUERY = """
+    UNWIND $rows AS r
+    MATCH (a:Airport {codeIATA: r.code})
+    WHERE NOT (a)-[:FLIGHT]-()
+    DELETE a
+    RETURN count(a) AS deleted
+    """
+
+# HTTP validators of the last download of an external source (e.g. the airports
+# CSV), kept in the graph so they are lost with the data they describe
+SOURCE_VALIDATORS_QUERY = """
+    MATCH (s:Source {name: $name})
+    RETURN s.etag AS etag, s.last_modified AS last_modified
+    """
+
+SAVE_SOURCE_VALIDATORS_QUERY = """
+    MERGE (s:Source {name: $name})
+    SET s.etag = $etag, s.last_modified = $last_modified
+    """
+
+# Bumped at the end of every load so readers can tell when their cached data is stale
+CURRENT_DATA_VERSION_QUERY = "MATCH (v:DataVersion {name: 'graph'}) RETURN v.version AS version"
+
+# $version was prepared (e.g. its timetable file written) before it is
+# published; a concurrent publish still moves the stamp forward
+DATA_VERSION_QUERY = """
+    MERGE (v:DataVersion {name: 'graph'})
+    SET v.version = CASE WHEN coalesce(v.version, 0) < $version THEN $version ELSE v.version + 1 END,
+        v.updated = $updated
+    RETURN v.version AS version
+    """
+
+# Properties compared against the stored flight to detect an update
+SYNC_COLUMNS = ['origin', 'destination', 'aircraftType', 'arrivalTime']
+
+# Query parameter name -> final_df column
+FLIGHT_COLUMNS = {
+    'key': 'key',
+    'origin': 'origin',
+    'destination': 'destination',
+    'flight_number': 'flightNumber',
+    'airline': 'airline',
+    'sequence': 'sequenceNumber',
+    'aircraft': 'aircraftType',
+    'STD': 'departureTime',
+    'ATD': 'arrivalTime',
+}
+
+DELETE_COLUMNS = {'key': 'key', 'origin': 'origin'}
+
+# Query parameter name -> airport property
+AIRPORT_COLUMNS = {
+    'code': 'codeIATA',
+    'name': 'airport_name',
+    'country': 'country',
+    'city': 'city',
+    'lat': 'lat',
+    'lon': 'lon',
+}
+
+# Airport properties covered by the content hash
+AIRPORT_FIELDS = ['codeIATA', 'airport_name', 'country', 'city', 'lat', 'lon']
+
+
+def frame_to_rows(df, columns):
+    """
+    Build the list of query parameter dicts from the column arrays of df.
+    tolist() converts numpy scalars to python types the driver can pack.
+    """
+    keys = list(columns)
+    values = [df[c].tolist() for c in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def iter_batches(df, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield row payloads of at most batch_size rows, one chunk at a time."""
+    for start in range(0, len(df), batch_size):
+        yield frame_to_rows(df.iloc[start:start + batch_size], columns)
+
+
+def _run_batch(tx, query, rows):
+    tx.run(query, rows=rows).consume()
+
+
+def run_batched(driver, query, batches, label='rows'):
+    """
+    Run query once per batch, each batch in its own write transaction.
+    Returns the number of rows written.
+    """
+    total = 0
+    started = time.perf_counter()
+    with driver.session() as session:
+        for rows in batches:
+            if not rows:
+                continue
+            session.write_transaction(_run_batch, query, rows)
+            total += len(rows)
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    logger.info("Loaded %d %s in %.1fs (%.0f rows/s)", total, label, elapsed, rate)
+    return total
+
+
+def add_flight_keys(final_df):
+    """
+    Output form of the typed final_df (see schedule_transform): plain string
+    codes, 'YYYY-MM-DDTHH:MM' times and the stable leg key (airline, flight
+    number, leg sequence, STD), e.g. LH400/1/2023-05-01T10:00, used to match
+    a leg with its stored FLIGHT.
+    """
+    final_df = final_df.copy()
+    for column in final_df.columns:
+        if isinstance(final_df[column].dtype, pd.CategoricalDtype):
+            final_df[column] = final_df[column].astype(object)
+    for column in ['departureTime', 'arrivalTime']:
+        final_df[column] = schedule_transform.format_minutes(final_df[column])
+    final_df['key'] = (final_df['airline'].astype(str)
+                       + final_df['flightNumber'].astype('int64').astype(str)
+                       + '/' + final_df['sequenceNumber'].astype('int64').astype(str)
+                       + '/' + final_df['departureTime'].astype(str))
+    return final_df
+
+
+def load_flights(driver, final_df, batch_size=DEFAULT_BATCH_SIZE):
+    """MERGE one FLIGHT relationship per row of final_df using UNWIND batches."""
+    batches = iter_batches(add_flight_keys(final_df), FLIGHT_COLUMNS, batch_size)
+    return run_batched(driver, FLIGHT_QUERY, batches, label='flights')
+
+
+def _read_stored_flights(tx, origins=None):
+    if origins is None:
+        return [record.data() for record in tx.run(STORED_FLIGHTS_QUERY)]
+    return [record.data() for record in tx.run(STORED_ORIGIN_FLIGHTS_QUERY, origins=origins)]
+
+
+def _delete_limit(tx, query, limit, params):
+    return tx.run(query, limit=limit, **params).single()['deleted']
+
+
+def delete_in_batches(driver, query, batch_size=DEFAULT_BATCH_SIZE, **params):
+    """Run a `WITH f LIMIT $limit DELETE f` query until it deletes less than batch_size. Returns the count."""
+    total = 0
+    with driver.session() as session:
+        while True:
+            deleted = session.write_transaction(_delete_limit, query, batch_size, params)
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+
+def delete_unkeyed_flights(driver, batch_size=DEFAULT_BATCH_SIZE):
+    """Flights loaded before legs were keyed can't be matched, drop them."""
+    return delete_in_batches(driver, DELETE_UNKEYED_FLIGHTS_QUERY, batch_size)
+
+
+def delete_origin_flights(driver, origins, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete every flight leaving the airports of origins."""
+    return delete_in_batches(driver, DELETE_ORIGIN_FLIGHTS_QUERY, batch_size, origins=list(origins))
+
+
+def delete_other_origins_flights(driver, origins, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete the flights leaving airports that are not in origins."""
+    if not origins:
+        # NOT IN [] matches every flight
+        raise ValueError("No scheduled origin: refusing to delete every flight")
+    return delete_in_batches(driver, DELETE_OTHER_ORIGINS_FLIGHTS_QUERY, batch_size, origins=list(origins))
+
+
+def diff_flights(final_df, stored):
+    """
+    Compare the new schedule with the stored flights.
+    Returns (upserts, deletes) frames and the inserted/updated/deleted counts.
+    """
+    new = add_flight_keys(final_df).drop_duplicates('key')
+    stored = pd.DataFrame(stored, columns=['key'] + SYNC_COLUMNS)
+    merged = new[['key'] + SYNC_COLUMNS].merge(stored, on='key', how='outer',
+                                               suffixes=('', '_db'), indicator=True)
+    both = merged['_merge'] == 'both'
+    changed = pd.Series(False, index=merged.index)
+    for c in SYNC_COLUMNS:
+        changed |= merged[c] != merged[c + '_db']
+    # A relationship can't be moved to other airports: delete and recreate it
+    moved = both & ((merged['origin'] != merged['origin_db'])
+                    | (merged['destination'] != merged['destination_db']))
+
+    inserted = merged['_merge'] == 'left_only'
+    updated = both & changed
+    upsert_keys = merged.loc[inserted | updated, 'key']
+    upserts = new[new['key'].isin(upsert_keys)]
+    deletes = merged.loc[(merged['_merge'] == 'right_only') | moved, ['key', 'origin_db']]
+    deletes = deletes.rename(columns={'origin_db': 'origin'})
+    counts = {
+        'inserted': int(inserted.sum()),
+        'updated': int(updated.sum()),
+        'deleted': int((merged['_merge'] == 'right_only').sum()),
+    }
+    return upserts, deletes, counts
+
+
+def sync_flights(driver, final_df, batch_size=DEFAULT_BATCH_SIZE, origins=None):
+    """
+    Bring the stored FLIGHT relationships in line with final_df, writing
+    only the legs that were added, changed or dropped from the schedule.
+    With origins, only the flights leaving those airports are compared, so
+    final_df can be one origin partition of the schedule.
+    Returns the inserted/updated/deleted counts. An empty final_df without
+    origins is refused, it would delete every stored flight.
+    """
+    if origins is None and final_df.empty:
+        raise ValueError("Empty schedule: refusing to delete every stored flight")
+    unkeyed = 0
+    if origins is None:
+        unkeyed = delete_unkeyed_flights(driver, batch_size)
+    with driver.session() as session:
+        stored = session.read_transaction(_read_stored_flights, None if origins is None else list(origins))
+
+    upserts, deletes, counts = diff_flights(final_df, stored)
+    counts['deleted'] += unkeyed
+    run_batched(driver, DELETE_FLIGHT_QUERY, iter_batches(deletes, DELETE_COLUMNS, batch_size),
+                label='deleted flights')
+    run_batched(driver, FLIGHT_QUERY, iter_batches(upserts, FLIGHT_COLUMNS, batch_size),
+                label='upserted flights')
+    logger.info("Flight sync: %(inserted)d inserted, %(updated)d updated, %(deleted)d deleted", counts)
+    return counts
+
+
+def airport_hash(airport):
+    """Content hash of the AIRPORT_FIELDS of an airport."""
+    values = '\x1f'.join(str(airport[field]) for field in AIRPORT_FIELDS)
+    return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+
+def _read_stored_airports(tx):
+    return [record.data() for record in tx.run(STORED_AIRPORTS_QUERY)]
+
+
+def _delete_stale_airports(tx, rows):
+    return tx.run(DELETE_STALE_AIRPORTS_QUERY, rows=rows).single()['deleted']
+
+
+def sync_airports(driver, batches, batch_size=DEFAULT_BATCH_SIZE, cleanup=False):
+    """
+    Upsert batches of airports (dicts of AIRPORT_FIELDS) on their code,
+    writing only those whose content hash differs from the stored one. The
+    first row of a code wins. cleanup also deletes the stored airports
+    missing from batches that no flight uses.
+    Returns the inserted/updated/unchanged(/deleted) counts.
+    """
+    with driver.session() as session:
+        stored = {r['code']: r['hash'] for r in session.read_transaction(_read_stored_airports)}
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    seen = set()
+
+    def changed_rows():
+        # Batches are filtered as they arrive, so only one is held at a time
+        for airports in batches:
+            rows = []
+            for airport in airports:
+                code = airport['codeIATA']
+                if not code or code in seen:
+                    continue
+                seen.add(code)
+                content_hash = airport_hash(airport)
+                if stored.get(code) == content_hash:
+                    counts['unchanged'] += 1
+                    continue
+                counts['inserted' if code not in stored else 'updated'] += 1
+                row = {name: airport[column] for name, column in AIRPORT_COLUMNS.items()}
+                row['hash'] = content_hash
+                rows.append(row)
+            yield rows
+
+    run_batched(driver, AIRPORT_QUERY, changed_rows(), label='airports')
+
+    if cleanup:
+        stale = [{'code': code} for code in stored.keys() - seen]
+        counts['deleted'] = 0
+        with driver.session() as session:
+            for start in range(0, len(stale), batch_size):
+                counts['deleted'] += session.write_transaction(_delete_stale_airports, stale[start:start + batch_size])
+    logger.info("Airport sync: %s", ', '.join(f"{count} {name}" for name, count in counts.items()))
+    return counts
+
+
+def read_source_validators(driver, name):
+    """HTTP validators saved by the last load of a source, None if it was never loaded."""
+    with driver.session() as session:
+        record = session.read_transaction(lambda tx: tx.run(SOURCE_VALIDATORS_QUERY, name=name).single())
+    return dict(record) if record else None
+
+
+def save_source_validators(driver, name, validators):
+    with driver.session() as session:
+        session.write_transaction(
+            lambda tx: tx.run(SAVE_SOURCE_VALIDATORS_QUERY, name=name, **validators).consume())
+
+
+def publish_data_version(driver, prepare=None):
+    """
+    Increment the data-version stamp. Returns the new version.
+    prepare(version) is called with the next version before it is published,
+    e.g. to write its timetable file: a reader that sees the new version
+    finds everything made for it.
+    """
+    with driver.session() as session:
+        record = session.read_transaction(lambda tx: tx.run(CURRENT_DATA_VERSION_QUERY).single())
+    version = (record['version'] if record else 0) + 1
+    if prepare is not None:
+        prepare(version)
+    updated = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    with driver.session() as session:
+        version = session.write_transaction(
+            lambda tx: tx.run(DATA_VERSION_QUERY, version=version, updated=updated).single()['version'])
+    logger.info("Published data version %d", version)
+    return version
@@ -0,0 +1,125 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every statement is idempotent so the schema can be applied before each load
+SCHEMA = [
+    "CREATE CONSTRAINT airport_code IF NOT EXISTS FOR (a:Airport) REQUIRE a.codeIATA IS UNIQUE",
+    "CREATE CONSTRAINT data_version_name IF NOT EXISTS FOR (v:DataVersion) REQUIRE v.name IS UNIQUE",
+    "CREATE CONSTRAINT source_name IF NOT EXISTS FOR (s:Source) REQUIRE s.name IS UNIQUE",
+    "CREATE INDEX flight_std IF NOT EXISTS FOR ()-[f:FLIGHT]-() ON (f.STD)",
+    "CREATE INDEX flight_atd IF NOT EXISTS FOR ()-[f:FLIGHT]-() ON (f.ATD)",
+    "CREATE INDEX flight_key IF NOT EXISTS FOR ()-[f:FLIGHT]-() ON (f.key)",
+    "CREATE INDEX flight_route IF NOT EXISTS FOR ()-[f:FLIGHT]-() ON (f.origin, f.destination)",
+    "CREATE INDEX flight_status_updated IF NOT EXISTS FOR ()-[f:FLIGHT]-() ON (f.status_updated)",
+]
+
+DUPLICATE_AIRPORTS_QUERY = """
+    MATCH (a:Airport)
+    WITH a.codeIATA AS code, count(*) AS nodes
+    WHERE nodes > 1
+    RETURN count(code) AS duplicates
+    """
+
+# Keep the first node of each code and move the flights of the others to it
+MERGE_DUPLICATE_AIRPORTS_QUERIES = [
+    """
+    MATCH (a:Airport)
+    WITH a.codeIATA AS code, collect(a) AS nodes
+    WHERE size(nodes) > 1
+    WITH head(nodes) AS keep, tail(nodes) AS dups
+    UNWIND dups AS dup
+    MATCH (dup)-[f:FLIGHT]->(a2)
+    CREATE (keep)-[f2:FLIGHT]->(a2)
+    SET f2 = properties(f)
+    DELETE f
+    """,
+    """
+    MATCH (a:Airport)
+    WITH a.codeIATA AS code, collect(a) AS nodes
+    WHERE size(nodes) > 1
+    WITH head(nodes) AS keep, tail(nodes) AS dups
+    UNWIND dups AS dup
+    MATCH (a1)-[f:FLIGHT]->(dup)
+    CREATE (a1)-[f2:FLIGHT]->(keep)
+    SET f2 = properties(f)
+    DELETE f
+    """,
+    """
+    MATCH (a:Airport)
+    WITH a.codeIATA AS code, collect(a) AS nodes
+    WHERE size(nodes) > 1
+    UNWIND tail(nodes) AS dup
+    DETACH DELETE dup
+    """,
+]
+
+# Flights loaded before origin/destination were stored on the relationship
+BACKFILL_ROUTE_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
+    WHERE f.origin IS NULL
+    WITH a1, f, a2 LIMIT $limit
+    SET f.origin = a1.codeIATA, f.destination = a2.codeIATA
+    RETURN count(f) AS updated
+    """
+
+# Plan operators reading every node or relationship of the graph, a label or a type
+SCAN_OPERATORS = (
+    'AllNodesScan',
+    'NodeByLabelScan',
+    'DirectedAllRelationshipsScan',
+    'UndirectedAllRelationshipsScan',
+    'DirectedRelationshipTypeScan',
+    'UndirectedRelationshipTypeScan',
+)
+
+
+def merge_duplicate_airports(driver):
+    """Collapse Airport nodes sharing a codeIATA into one. Returns the number of codes fixed."""
+    with driver.session() as session:
+        duplicates = session.run(DUPLICATE_AIRPORTS_QUERY).single()['duplicates']
+        if duplicates:
+            for query in MERGE_DUPLICATE_AIRPORTS_QUERIES:
+                session.run(query).consume()
+            logger.info("Merged duplicate Airport nodes for %d codes", duplicates)
+    return duplicates
+
+
+def apply_schema(driver, batch_size=5000):
+    """Create the constraints and indexes used by the loads and the API."""
+    # The uniqueness constraint can't be created while duplicates exist
+    merge_duplicate_airports(driver)
+    with driver.session() as session:
+        for statement in SCHEMA:
+            session.run(statement).consume()
+        while session.run(BACKFILL_ROUTE_QUERY, limit=batch_size).single()['updated'] == batch_size:
+            pass
+    logger.info("Neo4j schema is up to date")
+
+
+def _operators(plan):
+    yield plan['operatorType'].split('@')[0]
+    for child in plan.get('children', []):
+        yield from _operators(child)
+
+
+def find_full_scans(driver, query, **params):
+    """Return the scan operators of the plan of query (run with EXPLAIN, nothing is executed)."""
+    with driver.session() as session:
+        plan = session.run("EXPLAIN " + query, **params).consume().plan
+    return [op for op in _operators(plan) if op in SCAN_OPERATORS]
+
+
+def check_query_plans(driver, queries):
+    """
+    Raise RuntimeError if any of queries ({name: (query, params)}) is planned
+    with a full scan.
+    """
+    failures = {}
+    for name, (query, params) in queries.items():
+        scans = find_full_scans(driver, query, **params)
+        if scans:
+            failures[name] = scans
+        logger.info("%s: %s", name, ', '.join(scans) if scans else 'ok')
+    if failures:
+        raise RuntimeError(f"Queries fall back to full scans: {failures}")
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%d%b%y'
+
+LEG_FIELDS = ['origin', 'destination', 'sequenceNumber', 'aircraftDepartureTimeUTC',
+              'aircraftArrivalTimeUTC', 'aircraftType']
+
+FLIGHT_FIELDS = ['airline', 'flightNumber', 'startDate', 'endDate', 'daysOfOperation']
+
+# final_df: one narrow row per operated leg and day. Codes are categories,
+# departureTime/arrivalTime are int32 minutes since epoch (UTC), formatted
+# only when written out (see format_minutes).
+OUTPUT_DTYPES = {
+    'airline': 'category',
+    'flightNumber': 'int16',
+    'sequenceNumber': 'int8',
+    'origin': 'category',
+    'destination': 'category',
+    'aircraftType': 'category',
+    'departureTime': 'int32',
+    'arrivalTime': 'int32',
+}
+OUTPUT_COLUMNS = list(OUTPUT_DTYPES)
+# Columns of a leg copied to each of its days
+LEG_COLUMNS = OUTPUT_COLUMNS[:-2]
+
+
+def flatten_legs(flights):
+    """
+    Unpack the legs and period of operation of a flight-schedules response
+    to one row per leg.
+    """
+    # Built field by field: json_normalize deep-copies every leg
+    rows = []
+    for flight in flights:
+        period = flight.get('periodOfOperationUTC') or {}
+        head = (flight.get('airline'), flight.get('flightNumber'), period.get('startDate'),
+                period.get('endDate'), period.get('daysOfOperation'))
+        rows.extend(head + tuple(leg.get(field) for field in LEG_FIELDS) for leg in flight.get('legs') or ())
+    legs = pd.DataFrame.from_records(rows, columns=FLIGHT_FIELDS + LEG_FIELDS)
+    legs['flightNumber'] = legs['flightNumber'].astype('int64')
+    return legs
+
+
+def operating_days_mask(days):
+    """
+    Bit mask of the days of operation (bit 0 = Monday) from strings like
+    '1234567' or ' 2 4 6 '. Missing values mean the flight operates daily.
+    """
+    days = days.fillna('1234567').astype(str)
+    mask = np.zeros(len(days), dtype='int64')
+    for day in range(1, 8):
+        mask |= days.str.contains(str(day), regex=False).to_numpy(dtype='int64') << (day - 1)
+    return mask
+
+
+def format_minutes(minutes):
+    """'YYYY-MM-DDTHH:MM' strings of minutes since epoch."""
+    return np.datetime_as_string(np.asarray(minutes, dtype='int64').astype('datetime64[m]'), unit='m')
+
+
+def expand_schedule(legs):
+    """
+    Duplicate each leg once per day of its period of operation that is part
+    of its days of operation, with its departure/arrival times in minutes.
+    Returns the OUTPUT_COLUMNS of each operated leg and day.
+    """
+    start = pd.to_datetime(legs['startDate'], format=DATE_FORMAT).to_numpy(dtype='datetime64[D]')
+    end = pd.to_datetime(legs['endDate'], format=DATE_FORMAT).to_numpy(dtype='datetime64[D]')
+    n_days = np.maximum((end - start).astype('int64') + 1, 0)
+
+    # One row per (leg, day): offset of the day within its leg's period
+    row = np.repeat(np.arange(len(legs)), n_days)
+    first = np.repeat(np.cumsum(n_days) - n_days, n_days)
+    day = start[row] + (np.arange(len(row)) - first).astype('timedelta64[D]')
+
+    # 1970-01-01 was a Thursday: weekday 0 = Monday
+    weekday = (day.astype('int64') + 3) % 7
+    operates = (operating_days_mask(legs['daysOfOperation'])[row] >> weekday) & 1 == 1
+    row, day = row[operates], day[operates]
+
+    # Only the narrow typed columns are copied to every day
+    narrow = legs[LEG_COLUMNS].astype({column: OUTPUT_DTYPES[column] for column in LEG_COLUMNS})
+    expanded = narrow.iloc[row].reset_index(drop=True)
+
+    minutes = day.astype('int64') * 1440
+    departure = legs['aircraftDepartureTimeUTC'].to_numpy(dtype='int64')[row]
+    arrival = legs['aircraftArrivalTimeUTC'].to_numpy(dtype='int64')[row]
+    expanded['departureTime'] = (minutes + departure).astype('int32')
+    expanded['arrivalTime'] = (minutes + arrival).astype('int32')
+    return expanded
+
+
+def transform_schedule(flights):
+    """
+    Flatten a flight-schedules response (list of flights) to one row per
+    operated leg and day, sorted by flight and date.
+    """
+    return transform_pages([flights])
+
+
+def transform_pages(pages):
+    """
+    Same as transform_schedule for a stream of responses: each page is
+    flattened as it arrives. Legs returned by several overlapping
+    sub-queries are kept once.
+    """
+    legs = [flatten_legs(flights) for flights in pages if flights]
+    return transform_legs(legs)
+
+
+def transform_legs(legs):
+    """Expand frames of flattened legs (see flatten_legs) to the rows of transform_pages."""
+    legs = pd.concat(legs, ignore_index=True) if legs else flatten_legs([])
+    final_df = expand_schedule(legs)
+    final_df = final_df.drop_duplicates(['airline', 'flightNumber', 'sequenceNumber', 'departureTime'])
+    final_df = final_df.sort_values(['airline', 'flightNumber', 'sequenceNumber', 'departureTime'], kind='mergesort')
+    return final_df.reset_index(drop=True)
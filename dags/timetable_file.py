@@ -0,0 +1,210 @@
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, uint64 header length, JSON header, then one 64-byte
+# aligned array per section at the offsets listed in the header. Version 2
+# sorts the records by (STD, key) instead of STD alone.
+MAGIC = b'LHTT0002'
+ALIGNMENT = 64
+
+# Flight properties served by the API, in response order
+FIELDS = ['flight_number', 'airline', 'aircraft', 'STD', 'ATD', 'From', 'To', 'DepartAirport', 'ArrivalAirport']
+# Flight properties stored as string table ids
+STRING_FIELDS = ['airline', 'aircraft', 'From', 'To', 'DepartAirport', 'ArrivalAirport']
+
+NULL_TIME = np.iinfo(np.int64).min
+NULL_INT = np.iinfo(np.int32).min
+
+# One fixed-width record per flight, sorted by STD. Strings are ids in the
+# string table, times are minutes since epoch.
+RECORD_DTYPE = np.dtype([
+    ('std', '<i8'),
+    ('atd', '<i8'),
+    ('origin', '<u4'),
+    ('destination', '<u4'),
+    ('key', '<u4'),
+    ('flight_number', '<i4'),
+] + [(field, '<u4') for field in STRING_FIELDS])
+
+# Range of an index holding the flights of one airport (or route)
+GROUP_DTYPE = np.dtype([('code', '<u4'), ('start', '<u4'), ('end', '<u4')])
+
+SECTIONS = {
+    'records': RECORD_DTYPE,
+    'string_offsets': np.dtype('<u8'),
+    'string_data': np.dtype('u1'),
+    'departures': np.dtype('<u4'),
+    'departures_groups': GROUP_DTYPE,
+    'arrivals': np.dtype('<u4'),
+    'arrivals_groups': GROUP_DTYPE,
+    'routes': np.dtype('<u4'),
+    'routes_groups': GROUP_DTYPE,
+}
+
+# Every flight, read back after a load to write the timetable file. Airport
+# names and countries come from the airport nodes: the copies on FLIGHT are
+# only written with the flight, sync_flights skips them when an airport is renamed
+TIMETABLE_QUERY = """
+    MATCH (a1:Airport)-[f:FLIGHT]->(a2:Airport)
+    RETURN a1.codeIATA AS origin, a2.codeIATA AS destination, f.key AS key,
+           {flight_number: f.flight_number, airline: f.airline, aircraft: f.aircraft, STD: f.STD, ATD: f.ATD,
+            From: a1.country, To: a2.country, DepartAirport: a1.airport_name, ArrivalAirport: a2.airport_name} AS flight
+    """
+
+
+def to_minutes(times):
+    """Convert 'YYYY-MM-DDTHH:MM' strings (or None) to int64 minutes since epoch."""
+    return np.array(times, dtype='datetime64[m]').astype('int64')
+
+
+def format_minutes(minutes):
+    return None if minutes == NULL_TIME else str(np.datetime64(int(minutes), 'm'))
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class StringTable:
+    """
+    Strings of the timetable file. Id 0 is None and ids follow string order,
+    so comparing ids compares the strings.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i == 0:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def find(self, value):
+        """Id of value, 0 if it isn't in the table."""
+        i = self.first_after(value) - 1
+        return i if i > 0 and self[i] == value else 0
+
+    def first_after(self, value):
+        """Smallest id whose string sorts after value."""
+        lo, hi = 1, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if value < self[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+
+def _group_index(group, times, keys):
+    order = np.lexsort((keys, times, group))
+    codes, starts = np.unique(group[order], return_index=True)
+    groups = np.zeros(len(codes), GROUP_DTYPE)
+    groups['code'] = codes
+    groups['start'] = starts
+    groups['end'] = np.append(starts[1:], len(order))
+    return order, groups
+
+
+def build_tables(rows):
+    """Build the sections of a timetable file from (origin, destination, key, flight) rows."""
+    values = set()
+    for origin, destination, key, flight in rows:
+        values.update((origin, destination, key or '', f"{origin}-{destination}"))
+        values.update(flight[field] for field in STRING_FIELDS)
+    values.discard(None)
+    strings = [None] + sorted(values)
+    ids = {value: i for i, value in enumerate(strings)}
+    encoded = [value.encode('utf-8') for value in strings[1:]]
+    string_offsets = np.zeros(len(strings) + 1, SECTIONS['string_offsets'])
+    string_offsets[2:] = np.cumsum([len(value) for value in encoded], dtype='int64')
+
+    records = np.zeros(len(rows), RECORD_DTYPE)
+    flights = [r[3] for r in rows]
+    records['std'] = to_minutes([f['STD'] for f in flights])
+    records['atd'] = to_minutes([f['ATD'] for f in flights])
+    records['origin'] = [ids[r[0]] for r in rows]
+    records['destination'] = [ids[r[1]] for r in rows]
+    records['key'] = [ids[r[2] or ''] for r in rows]
+    records['flight_number'] = [NULL_INT if f['flight_number'] is None else f['flight_number'] for f in flights]
+    for field in STRING_FIELDS:
+        records[field] = [ids[f[field]] for f in flights]
+    routes = np.array([ids[f"{r[0]}-{r[1]}"] for r in rows], dtype='<u4')
+
+    # Records in (STD, key) order, the keyset order of the flight exports
+    order = np.lexsort((records['key'], records['std']))
+    records, routes = records[order], routes[order]
+    tables = {
+        'records': records,
+        'string_offsets': string_offsets,
+        'string_data': np.frombuffer(b''.join(encoded), SECTIONS['string_data']),
+    }
+    for name, group, times in (('departures', records['origin'], records['std']),
+                               ('arrivals', records['destination'], records['atd']),
+                               ('routes', routes, records['std'])):
+        tables[name], tables[name + '_groups'] = _group_index(group, times, records['key'])
+    return {name: np.ascontiguousarray(tables[name], dtype) for name, dtype in SECTIONS.items()}
+
+
+def write_timetable(path, version, rows):
+    """
+    Write the timetable file of a data version. The file is written next to
+    path then renamed over it, so readers see either the old or the new file.
+    """
+    tables = build_tables(rows)
+    sections, offset = {}, 0
+    for name, array in tables.items():
+        sections[name] = [offset, len(array)]
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'version': version, 'sections': sections}).encode('utf-8')
+    base = _align(len(MAGIC) + 8 + len(header))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, array in tables.items():
+            f.seek(base + sections[name][0])
+            f.write(array.tobytes())
+        f.truncate(base + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    logger.info("Wrote timetable version %d: %d flights, %d bytes", version, len(rows), base + offset)
+
+
+def open_timetable(path):
+    """
+    Map a timetable file read-only. Returns (version, sections) where the
+    sections are arrays backed by the mapping, shared with every process
+    mapping the same file.
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a timetable file")
+    length, = struct.unpack_from('<Q', mapping, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(mapping[start:start + length])
+    base = _align(start + length)
+    tables = {name: np.frombuffer(mapping, SECTIONS[name], count, base + offset)
+              for name, (offset, count) in header['sections'].items()}
+    return header['version'], tables
+
+
+def export_timetable(driver, path, version):
+    """Read every flight from Neo4j and write the timetable file of version."""
+    with driver.session() as session:
+        rows = session.read_transaction(
+            lambda tx: [(r['origin'], r['destination'], r['key'], r['flight']) for r in tx.run(TIMETABLE_QUERY)])
+    write_timetable(path, version, rows)
@@ -1,9 +1,12 @@
 import dash
-from dash import Dash, html, dcc
+from dash import Dash, html, dcc, ctx
+from dash_extensions import EventSource
+from flask import Response, stream_with_context
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import requests
-import pandas as pd
+import json
+import data
 
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 
@@ -19,28 +22,87 @@ app.layout = html.Div([
     ], 
     style = {'margin-left':'10px'}),
     dash.page_container,
-    dcc.Interval(id = 'data-refresh', interval =60*1000, n_intervals=0),
+    # Changes are pushed by the API through /events, the interval only catches
+    # what doesn't bump the data version (e.g. today's flights at midnight)
+    dcc.Interval(id = 'data-refresh', interval =15*60*1000, n_intervals=0),
+    EventSource(id = 'events', url = '/events'),
+    dcc.Store(id = 'data-version', storage_type='session'),
+    # Version tokens of the shared data (see data.py): the ETags of the airports
+    # flights and route network, the change-feed cursor of the statuses
     dcc.Store(id = 'airports-data', storage_type='session'),
     dcc.Store(id = 'flights-data', storage_type='session'),
+    dcc.Store(id = 'statuses-data', storage_type='session'),
+    dcc.Store(id = 'network-data', storage_type='session'),
     ])
 
+@app.server.route('/events')
+def relay_events():
+    # The browser can't reach the API nor authenticate an EventSource, the stream is relayed
+    # Uncompressed, so each event is relayed as soon as it arrives
+    upstream = requests.get('http://fastapi:8000/events', auth=('sabrine', 'sab_project23'), stream=True,
+                            headers={'Accept-Encoding': 'identity'}, timeout=(5, None))
+    def generate():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def pushed_event(message, event_type):
+    """The event pushed by the API if it triggered the callback and is of event_type."""
+    if ctx.triggered_id != 'events' or not message:
+        return None
+    event = json.loads(message)
+    return event if event['type'] == event_type else None
+
+@app.callback(Output('data-version', 'data'),
+            Input('events', 'message'),
+            State('data-version', 'data'))
+def apply_version(message, version):
+    event = pushed_event(message, 'version')
+    if event is None or event['version'] == version:
+        return dash.no_update
+    return event['version']
+
+def refreshed_token(name, token):
+    """Token of the current version of a shared resource, no update if the session already has it."""
+    # Dependent callbacks (figures, dropdowns) only run when the data changed
+    token_now = data.refresh(name)
+    return token_now if token_now != token else dash.no_update
+
 @app.callback(Output('airports-data', 'data'),
-            Input('data-refresh', 'n_intervals'))
-def refresh_airports(n): 
-    response_airports = requests.get('http://fastapi:8000/airports', auth=('sabrine', 'sab_project23'))
-    data = response_airports.json()
-    # Flatten the list of lists
-    flat_data = [item for sublist in data['airports'] for item in sublist]
-    airports = pd.DataFrame(flat_data, columns=["country", "airport_name", "city", "lon", "codeIATA", "lat"])
-    airports = airports.dropna()
-    return airports.to_dict() 
+            Input('data-refresh', 'n_intervals'),
+            Input('data-version', 'data'),
+            State('airports-data', 'data'))
+def refresh_airports(n, version, token): 
+    # The store only holds the token of the shared airports frame
+    return refreshed_token('airports', token)
     
 @app.callback(Output('flights-data', 'data'),
-            Input('data-refresh', 'n_intervals'))
-def refresh_flights(n): 
-    response_flights = requests.get('http://fastapi:8000/flights/today', auth=('sabrine', 'sab_project23'))
-    flights = pd.DataFrame(response_flights.json())
-    return flights.to_dict()
+            Input('data-refresh', 'n_intervals'),
+            Input('data-version', 'data'),
+            State('flights-data', 'data'))
+def refresh_flights(n, version, token): 
+    return refreshed_token('flights', token)
+
+@app.callback(Output('network-data', 'data'),
+            Input('data-refresh', 'n_intervals'),
+            Input('data-version', 'data'),
+            State('network-data', 'data'))
+def refresh_network(n, version, token): 
+    return refreshed_token('network', token)
+
+@app.callback(Output('statuses-data', 'data'),
+            Input('data-refresh', 'n_intervals'),
+            Input('events', 'message'),
+            State('statuses-data', 'data'))
+def refresh_statuses(n, message, since):
+    if ctx.triggered_id == 'events' and pushed_event(message, 'statuses') is None:
+        return dash.no_update
+    since_now = data.apply_status_event(pushed_event(message, 'statuses'))
+    return since_now if since_now != since else dash.no_update
 
 if __name__ == '__main__':
     app.run_server(debug=False, host='0.0.0.0', port=5000)
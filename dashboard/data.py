@@ -0,0 +1,137 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import requests
+
+API_URL = 'http://fastapi:8000'
+AUTH = ('sabrine', 'sab_project23')
+
+# Process-wide data layer: airports, today's flights and the flight statuses
+# are downloaded once per data version for all sessions and kept as read-only
+# frames with their dropdown options precomputed. Session stores only hold the
+# token of the version they have seen.
+
+
+class Dataset:
+    """One version of an API resource: its ETag, frame (or frames) and dropdown options. Never modified once built."""
+
+    def __init__(self, token, frame, options):
+        self.token = token
+        self.frame = frame
+        self.options = options
+
+
+def _build_airports(data):
+    airports = pd.DataFrame({'country': data['country'], 'airport_name': data['name'], 'city': data['city'],
+                             'lon': data['lon'], 'codeIATA': data['code'], 'lat': data['lat']})
+    airports = airports.dropna().reset_index(drop=True)
+    # Airport dropdowns search the API (/airports/search) instead of listing every airport
+    return airports, []
+
+
+def _build_flights(data):
+    flights = pd.DataFrame(data)
+    if flights.empty:
+        return flights, []
+    numbers = flights['airline'].astype(str) + flights['flight_number'].astype(str)
+    # One option per flight number, in timetable order
+    return flights, list(dict.fromkeys(numbers.tolist()))
+
+
+def _build_network(data):
+    airports = pd.DataFrame(data['airports'])
+    routes = pd.DataFrame(data['routes'])
+    # Routes carry the coordinates of both ends, ready to draw
+    coordinates = airports.set_index('code')[['lat', 'lon']]
+    routes = routes.join(coordinates, on='origin').join(coordinates.add_suffix('_to'), on='destination')
+    return {'airports': airports, 'routes': routes}, []
+
+
+# name -> (path, params, build)
+RESOURCES = {
+    'airports': ('/airports', {'format': 'columns'}, _build_airports),
+    'flights': ('/flights/today', None, _build_flights),
+    'network': ('/network', None, _build_network),
+}
+
+_lock = threading.Lock()
+_datasets = {}
+# Flight statuses by leg key and the change-feed cursor they are up to date with
+_statuses = {}
+_statuses_since = None
+
+
+def refresh(name):
+    """
+    Revalidate a resource with a conditional request and rebuild it if it
+    changed. Returns the token of the current version.
+    """
+    path, params, build = RESOURCES[name]
+    # Downloaded and built without the lock, so other sessions keep reading the current frames meanwhile
+    dataset = _datasets.get(name)
+    headers = {'If-None-Match': dataset.token} if dataset else {}
+    response = requests.get(API_URL + path, params=params, auth=AUTH, headers=headers)
+    if response.status_code == 304 or (response.status_code != 200 and dataset):
+        return dataset.token
+    response.raise_for_status()
+    frame, options = build(response.json())
+    with _lock:
+        # A concurrent refresh of the same version may have swapped in its download first
+        if _datasets.get(name) is dataset:
+            _datasets[name] = Dataset(response.headers.get('ETag') or '', frame, options)
+        return _datasets[name].token
+
+
+def get(name):
+    """The current Dataset of a resource, downloaded on first use."""
+    dataset = _datasets.get(name)
+    if dataset is None:
+        refresh(name)
+        dataset = _datasets[name]
+    return dataset
+
+
+def statuses():
+    """Flight statuses by leg key (read-only)."""
+    return _statuses
+
+
+def _merge_statuses(changes):
+    global _statuses
+    merged = dict(_statuses)
+    for status in changes:
+        merged[status['key']] = status
+    # Only keep the flights of the last two days
+    oldest = (datetime.now(timezone.utc) - timedelta(days=2)).strftime('%Y-%m-%dT%H:%M')
+    # Replaced rather than updated so readers never iterate a changing dict
+    _statuses = {key: status for key, status in merged.items() if status['STD'] >= oldest}
+
+
+def apply_status_event(event=None):
+    """
+    Apply a statuses event pushed by the API, or catch up from the /statuses
+    change feed when it doesn't follow the current cursor (first load,
+    missed events). Every session pushes the same events, those already
+    applied are skipped. Returns the cursor the statuses are up to date with.
+    """
+    global _statuses_since
+    with _lock:
+        if event is not None and _statuses_since is not None:
+            if event['after'] == _statuses_since:
+                _merge_statuses(event['statuses'])
+                _statuses_since = event['since']
+                return _statuses_since
+            if event['since'] <= _statuses_since:
+                return _statuses_since
+        more = True
+        while more:
+            response = requests.get(API_URL + '/statuses', params={'since': _statuses_since} if _statuses_since else None,
+                                    auth=AUTH)
+            if response.status_code != 200:
+                break
+            feed = response.json()
+            if feed['statuses']:
+                _merge_statuses(feed['statuses'])
+            _statuses_since, more = feed['since'], feed['more']
+        return _statuses_since
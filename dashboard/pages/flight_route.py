@@ -6,6 +6,7 @@ import dash
 from dash import dcc, html, callback, Input, Output, State
 import dash_bootstrap_components as dbc
 import requests
+import data
 import datetime
 from datetime import datetime 
 
@@ -25,13 +26,27 @@ def layout():
         html.Div(id = 'route-toast-placeholder')
     ])
     
-@callback([Output('origin-dropdown', 'options'),
-           Output('destination-dropdown', 'options')],
-           Input('airports-data', 'data'))
-def fill_aiport_dropdowns(airports): 
-    df = pd.DataFrame(airports)
-    airport_options = [{'label': f"({row['codeIATA']}) {row['airport_name']}", 'value': row['codeIATA']} for index, row in df.iterrows()]
-    return airport_options, airport_options
+def search_airports(search, value):
+    """Options of the airports matching what is typed, keeping the selected airport."""
+    # Without a search, the selected airport comes first (an exact code match)
+    response = requests.get('http://fastapi:8000/airports/search', params={'q': search or value or ''},
+                            auth=('sabrine', 'sab_project23'))
+    options = [{'label': f"({a['code']}) {a['name']}", 'value': a['code']} for a in response.json()]
+    if value and value not in [o['value'] for o in options]:
+        options.append({'label': value, 'value': value})
+    return options
+
+@callback(Output('origin-dropdown', 'options'),
+           Input('origin-dropdown', 'search_value'),
+           State('origin-dropdown', 'value'))
+def search_origin(search, value):
+    return search_airports(search, value)
+
+@callback(Output('destination-dropdown', 'options'),
+           Input('destination-dropdown', 'search_value'),
+           State('destination-dropdown', 'value'))
+def search_destination(search, value):
+    return search_airports(search, value)
     
 @callback(
     [Output('flight-route-graph', 'figure'),
@@ -39,14 +54,13 @@ def fill_aiport_dropdowns(airports):
     Output('route-error-message', 'style')],
     [Input('search-button', 'n_clicks')],
     [State('origin-dropdown', 'value'),
-     State('destination-dropdown', 'value'),
-     State('airports-data', 'data')])
-def update_map(n_clicks, origin_code, dest_code, airports): 
+     State('destination-dropdown', 'value')])
+def update_map(n_clicks, origin_code, dest_code): 
     # If no airports are selected, display the initial map
     if not (origin_code and dest_code and n_clicks):
         return dash.no_update ,[], {'color': 'red', 'display': 'none'}
     if (origin_code and dest_code and n_clicks > 0):
-        df = pd.DataFrame(airports)
+        df = data.get('airports').frame
         # If both airports are selected, filter the data to include only the selected airports
         selected_airports = df.loc[df['codeIATA'].isin([origin_code, dest_code])]
         print(selected_airports) 
@@ -64,11 +78,20 @@ def update_map(n_clicks, origin_code, dest_code, airports):
         fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
         
         response = requests.get(f"http://fastapi:8000/flights_by_route?origin={origin_code}&destination={dest_code}", auth=('sabrine', 'sab_project23'))
+        if 'flights' in response.json():
+            items = [dbc.ListGroupItem(f'{i[0]["airline"]}{i[0]["flight_number"]} Departure: {i[0]["STD"].replace("T", " ")}') for i in response.json()['flights']]
+        else:
+            # No direct flight: look for connections
+            response = requests.get("http://fastapi:8000/itineraries", params={'origin': origin_code, 'destination': dest_code},
+                                    auth=('sabrine', 'sab_project23'))
+            itineraries = response.json().get('itineraries', [])
+            if not itineraries:
+                return fig, [], {'color': 'red', 'display': 'block'}
+            items = [dbc.ListGroupItem(' / '.join(f'{f["airline"]}{f["flight_number"]} {f["STD"].replace("T", " ")}' for f in i['flights'])
+                                      + f' Arrival: {i["arrival"].replace("T", " ")}') for i in itineraries]
         toast =  html.Div([
         dbc.Toast(
-            dbc.ListGroup(
-                [dbc.ListGroupItem(f'{i[0]["airline"]}{i[0]["flight_number"]} Departure: {i[0]["STD"].replace("T", " ")}') for i in response.json()['flights']]
-                ),
+            dbc.ListGroup(items),
             header="Next flights",
             dismissable=True,
             is_open=True
@@ -6,7 +6,8 @@ import dash
 from dash import dcc, html, callback, Input, Output, State
 import dash_bootstrap_components as dbc
 import requests
-from datetime import datetime, timezone
+import data
+from datetime import datetime, timedelta, timezone
 from pprint import pprint 
 
 dash.register_page(__name__, path='/flight-status')
@@ -21,57 +22,61 @@ layout = html.Div([
     
 @callback(Output('flight-dropdown', 'options'),
            Input('flights-data', 'data'))
-def fill_flight_dropdown(flights): 
-    df = pd.DataFrame(flights)
-    flight_options = [f"{row['airline']}{row['flight_number']}" for index, row in df.iterrows()]
-    return flight_options
+def fill_flight_dropdown(token): 
+    # Options are built once per flights version by the data layer
+    return data.get('flights').options
 
 @callback([Output('flight-status-graph', 'figure'),
     Output('status-toast-placeholder', 'children')],
-    Input('flight-dropdown', 'value'),
-    State('airports-data', 'data'))
+    Input('flight-dropdown', 'value'))
     
-def update_map(flightNumber, airports): 
+def update_map(flightNumber): 
     # If no airports are selected, display the initial map
     if not flightNumber: return dash.no_update, []
         
     # ~ df = pd.DataFrame(airports)
     # If both airports are selected, filter the data to include only the selected airports
     # ~ selected_airports = df.loc[df['codeIATA'].isin([origin_code, dest_code])]
-    airports = pd.DataFrame(airports)
-    response = requests.get(f"http://fastapi:8000/flight_status/{flightNumber}", auth=('sabrine', 'sab_project23'))
-    r = response.json()['FlightStatusResource']['Flights']['Flight'][0]
-    status = r["FlightStatus"]["Code"]
-    if status == 'DP': arr_key, dep_key = 'Estimated', 'Actual'
-    elif status == 'LD': arr_key, dep_key = 'Actual', 'Actual' 
+    airports = data.get('airports').frame
+    # Statuses are polled in the background, the latest leg already left is shown
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M')
+    legs = sorted((s for s in data.statuses().values() if s['flight'] == flightNumber), key=lambda s: s['STD'])
+    started = [s for s in legs if s['STD'] <= now]
+    r = started[-1] if started else (legs[0] if legs else None)
+    status = r['status'] if r else None
+    if status == 'DP': arr_key, dep_key = 'estimated', 'actual'
+    elif status == 'LD': arr_key, dep_key = 'actual', 'actual' 
     else:
         return go.Figure(), dbc.Toast('Flight status is unknown',
                             header="Flight Information",
                             dismissable=True,
                             is_open=True,
                             style={"position": "fixed", "top": 100, "right": 10}) 
-    arr_key_api = arr_key + 'TimeLocal' 
-    dep_key_api = dep_key +'TimeLocal'
+    departure_time = r['departure_' + dep_key] or r['STD']
+    arrival_time = r['arrival_' + arr_key] or r['ATD']
     toast =  html.Div([
         dbc.Toast(
             dbc.ListGroup([
-                dbc.ListGroupItem(f'Flight Status : {r["FlightStatus"]["Definition"]}'),
-                dbc.ListGroupItem(f'Time Status : {r["Arrival"]["TimeStatus"]["Definition"]}'),
-                dbc.ListGroupItem(f'Scheduled Departure : {r["Departure"]["ScheduledTimeLocal"]["DateTime"].replace("T", " ")}'),
-                dbc.ListGroupItem(f'{dep_key} Departure : {r["Departure"][dep_key_api]["DateTime"].replace("T", " ")}'),
-                dbc.ListGroupItem(f'Scheduled Arrival : {r["Arrival"]["ScheduledTimeLocal"]["DateTime"].replace("T", " ")}'),
-                dbc.ListGroupItem(f'{arr_key} Arrival : {r["Arrival"][arr_key_api]["DateTime"].replace("T", " ")}'),
+                dbc.ListGroupItem(f'Flight Status : {r["status_text"]}'),
+                dbc.ListGroupItem(f'Time Status : {r["time_status"]}'),
+                dbc.ListGroupItem(f'Scheduled Departure (UTC) : {r["STD"].replace("T", " ")}'),
+                dbc.ListGroupItem(f'{dep_key.capitalize()} Departure (UTC) : {departure_time.replace("T", " ")}'),
+                dbc.ListGroupItem(f'Scheduled Arrival (UTC) : {r["ATD"].replace("T", " ")}'),
+                dbc.ListGroupItem(f'{arr_key.capitalize()} Arrival (UTC) : {arrival_time.replace("T", " ")}'),
                 ]),
             header="Flight Information",
             dismissable=True,
             is_open=True
             )],
         style={"position": "fixed", "top": 100, "right": 10})
-    origin = airports[airports['codeIATA'] == r['Departure']['AirportCode']]
-    dest = airports[airports['codeIATA'] == r['Arrival']['AirportCode']]
-    arrival = datetime.strptime(r['Arrival'][arr_key + 'TimeUTC']['DateTime'], '%Y-%m-%dT%H:%MZ')
-    departure = datetime.strptime(r['Departure'][dep_key +'TimeUTC']['DateTime'], '%Y-%m-%dT%H:%MZ')
-    now = datetime.now()
+    origin = airports[airports['codeIATA'] == r['origin']]
+    dest = airports[airports['codeIATA'] == r['destination']]
+    arrival = datetime.strptime(arrival_time, '%Y-%m-%dT%H:%M')
+    departure = datetime.strptime(departure_time, '%Y-%m-%dT%H:%M')
+    # ATD is stored on the day of departure: overnight flights land the next day
+    if arrival < departure:
+        arrival += timedelta(days=1)
+    now = datetime.utcnow()
     lon_origin , lat_origin = origin['lon'].iloc[0],  origin['lat'].iloc[0]
     lon_dest , lat_dest = dest['lon'].iloc[0],  dest['lat'].iloc[0]
     if departure > now:
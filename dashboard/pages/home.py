@@ -1,35 +1,123 @@
 import pandas as pd
+import numpy as np
+import functools
 import plotly.express as px
 import plotly.graph_objects as go
 import dash
-from dash import dcc, html, callback
+from dash import dcc, html, callback, ctx, Patch
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import requests
+import data
 from pprint import pprint
 
 dash.register_page(__name__, path='/')
 
+# Less connected airports and less frequent routes only appear when zooming in:
+# (min zoom, min airport degree, min daily flights) per level
+ZOOM_LEVELS = [(0, 20, 3), (3, 5, 1), (5, 0, 0)]
+DEFAULT_ZOOM = 3
+# Trace order of the map: routes under airports under the fleet
+ROUTES_TRACE, AIRPORTS_TRACE, FLEET_TRACE = range(3)
+
 def layout():
     return html.Div([ 
     dcc.Graph(id = 'airport-graph', style = {"height":"80vh"}),
+    # Fleet positions move every minute, without any data change
+    dcc.Interval(id = 'fleet-refresh', interval = 60*1000, n_intervals = 0),
+    dcc.Store(id = 'map-level'),
     html.Div(id = 'data-info')
     ])
-     
-@callback(Output('airport-graph', 'figure'),
-            Input('airports-data', 'data'))
-def display_airports(airports):
-    if not airports: return dash.no_update 
-    fig = px.scatter_mapbox(airports, lat="lat", lon="lon", hover_name="airport_name", hover_data=["codeIATA", "city"], zoom = 3,
-    mapbox_style = 'open-street-map') 
-    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})  
-    return fig
+
+def zoom_level(zoom):
+    return max(i for i, (min_zoom, _, _) in enumerate(ZOOM_LEVELS) if zoom >= min_zoom)
+
+@functools.lru_cache(maxsize=16)
+def network_figure(token, level):
+    """Map of the route network at a zoom level, built once per network version and level."""
+    network = data.get('network').frame
+    _, min_degree, min_daily = ZOOM_LEVELS[level]
+    airports = network['airports'][network['airports']['degree'] >= min_degree]
+    routes = network['routes']
+    routes = routes[(routes['daily'] >= min_daily) & routes['origin'].isin(airports['code'])
+                    & routes['destination'].isin(airports['code'])]
+    # All routes in one trace, segments separated by None
+    lon = np.full(3 * len(routes), None, dtype=object)
+    lat = np.full(3 * len(routes), None, dtype=object)
+    lon[0::3], lon[1::3] = routes['lon'], routes['lon_to']
+    lat[0::3], lat[1::3] = routes['lat'], routes['lat_to']
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattermapbox(
+        mode = "lines",
+        lon = lon,
+        lat = lat,
+        line = {'width': 1, 'color': 'rgba(0, 0, 128, 0.25)'},
+        hoverinfo = 'skip'))
+    fig.add_trace(go.Scattermapbox(
+        mode = "markers",
+        lon = airports['lon'],
+        lat = airports['lat'],
+        customdata = airports[['code', 'city']].values,
+        text = airports['name'] + ' (' + airports['code'] + ') ' + airports['degree'].astype(str) + ' destinations',
+        hoverinfo = 'text',
+        marker = {'size': 5 + 2 * np.sqrt(airports['degree']), 'color': '#f9b000'}))
+    fig.add_trace(go.Scattermapbox(mode = "markers", lon = [], lat = [], hoverinfo = 'text',
+                                   marker = {'size': 6, 'color': '#000080'}))
+    fig.update_layout(mapbox_style = 'open-street-map', mapbox_zoom = DEFAULT_ZOOM,
+                      mapbox_center = {'lat': 50, 'lon': 10},
+                      # Keeps the user's zoom and position when the figure is replaced
+                      uirevision = 'network',
+                      margin={"r":0,"t":0,"l":0,"b":0}, showlegend=False)
+    return fig.to_dict()
+
+def fleet_positions():
+    """Estimated positions of the whole airborne fleet, None if unavailable."""
+    fleet = requests.get('http://fastapi:8000/positions', auth=('sabrine', 'sab_project23'))
+    if fleet.status_code != 200:
+        return None
+    fleet = fleet.json()
+    fleet['text'] = [f"{f} {o} → {d}" for f, o, d in zip(fleet['flight'], fleet['origin'], fleet['destination'])]
+    return fleet
+
+@callback([Output('airport-graph', 'figure'),
+            Output('map-level', 'data')],
+            Input('network-data', 'data'),
+            Input('airport-graph', 'relayoutData'),
+            State('map-level', 'data'))
+def display_network(token, relayout, level):
+    if not token: return dash.no_update, dash.no_update
+    zoom = (relayout or {}).get('mapbox.zoom')
+    new_level = zoom_level(zoom) if zoom is not None else (level if level is not None else zoom_level(DEFAULT_ZOOM))
+    # Panning or zooming within a level keeps the figure
+    if ctx.triggered_id == 'airport-graph' and new_level == level:
+        return dash.no_update, dash.no_update
+    cached = network_figure(data.get('network').token, new_level)
+    fig = dict(cached, data=list(cached['data']))
+    fleet = fleet_positions()
+    if fleet:
+        fig['data'][FLEET_TRACE] = dict(fig['data'][FLEET_TRACE], lon=fleet['lon'], lat=fleet['lat'], text=fleet['text'])
+    return fig, new_level
+
+@callback(Output('airport-graph', 'figure', allow_duplicate=True),
+            Input('fleet-refresh', 'n_intervals'),
+            prevent_initial_call=True)
+def update_fleet(n):
+    # Only the fleet trace is sent, the network stays in the browser
+    fleet = fleet_positions()
+    if fleet is None: return dash.no_update
+    patched = Patch()
+    patched['data'][FLEET_TRACE]['lon'] = fleet['lon']
+    patched['data'][FLEET_TRACE]['lat'] = fleet['lat']
+    patched['data'][FLEET_TRACE]['text'] = fleet['text']
+    return patched
     
 @callback(Output('data-info', 'children'),
               Input('airport-graph', 'clickData'))
 def select_data(data):
     # Prevent update if no selected data
-    if not data: return dash.no_update
+    # Only airports open the boards, not the fleet markers
+    if not data or data['points'][0]['curveNumber'] != AIRPORTS_TRACE: return dash.no_update
     IATA = data['points'][0]['customdata'][0]
     departures_flight = requests.get(f'http://fastapi:8000/departures/{IATA}', auth=('sabrine', 'sab_project23')) 
     arrivals_flight = requests.get(f'http://fastapi:8000/arrivals/{IATA}', auth=('sabrine', 'sab_project23'))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The DAG and API modules are imported as top-level modules, as in their containers
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'dags'), os.path.join(ROOT, 'api'), os.path.dirname(os.path.abspath(__file__))]
@@ -0,0 +1,147 @@
+"""In-memory stand-in for the neo4j driver, running the DAG queries on dicts of airports and FLIGHT relationships."""
+import flight_status
+import neo4j_loader
+
+
+class FakeRecord(dict):
+
+    def data(self):
+        return dict(self)
+
+
+class FakeResult:
+
+    def __init__(self, rows):
+        self.rows = [FakeRecord(row) for row in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def single(self):
+        return self.rows[0] if self.rows else None
+
+    def consume(self):
+        pass
+
+
+class FakeTransaction:
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, **params):
+        self.graph.queries.append((query, params))
+        return FakeResult(self.graph.handlers[query](params) or [])
+
+
+class FakeSession:
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def read_transaction(self, function, *args):
+        return function(FakeTransaction(self.graph), *args)
+
+    write_transaction = read_transaction
+
+
+class FakeGraph:
+    """
+    Airports by code and flights by (origin, destination, key), as a MERGE on
+    the key between two airports would store them. Every query run is
+    recorded in queries with its parameters.
+    """
+
+    def __init__(self):
+        self.airports = {}
+        self.flights = {}
+        self.queries = []
+        self.handlers = {
+            neo4j_loader.STORED_FLIGHTS_QUERY: self._stored_flights,
+            neo4j_loader.STORED_ORIGIN_FLIGHTS_QUERY: self._stored_flights,
+            neo4j_loader.DELETE_UNKEYED_FLIGHTS_QUERY: self._delete_unkeyed_flights,
+            neo4j_loader.FLIGHT_QUERY: self._merge_flights,
+            neo4j_loader.DELETE_FLIGHT_QUERY: self._delete_flights,
+            neo4j_loader.STORED_AIRPORTS_QUERY: self._stored_airports,
+            neo4j_loader.AIRPORT_QUERY: self._merge_airports,
+            neo4j_loader.DELETE_STALE_AIRPORTS_QUERY: self._delete_stale_airports,
+            flight_status.ACTIVE_FLIGHTS_QUERY: self._active_flights,
+            flight_status.STATUS_QUERY: self._write_statuses,
+        }
+
+    def session(self):
+        return FakeSession(self)
+
+    def ran(self, query):
+        """Parameters of the runs of query."""
+        return [params for run, params in self.queries if run == query]
+
+    def _stored_flights(self, params):
+        origins = params.get('origins')
+        return [{'key': f['key'], 'origin': origin, 'destination': destination,
+                 'aircraftType': f['aircraft'], 'arrivalTime': f['ATD']}
+                for (origin, destination, key), f in self.flights.items()
+                if key is not None and (origins is None or origin in origins)]
+
+    def _delete_unkeyed_flights(self, params):
+        unkeyed = [edge for edge in self.flights if edge[2] is None][:params['limit']]
+        for edge in unkeyed:
+            del self.flights[edge]
+        return [{'deleted': len(unkeyed)}]
+
+    def _merge_flights(self, params):
+        for r in params['rows']:
+            origin = self.airports.setdefault(r['origin'], {'codeIATA': r['origin']})
+            destination = self.airports.setdefault(r['destination'], {'codeIATA': r['destination']})
+            flight = self.flights.setdefault((r['origin'], r['destination'], r['key']), {'key': r['key']})
+            flight.update(flight_number=r['flight_number'], airline=r['airline'], sequence=r['sequence'],
+                          aircraft=r['aircraft'], STD=r['STD'], ATD=r['ATD'], origin=r['origin'],
+                          destination=r['destination'], From=origin.get('country'), To=destination.get('country'),
+                          FromAirportName=origin.get('airport_name'), ToAirportName=destination.get('airport_name'))
+
+    def _delete_flights(self, params):
+        deletes = {(r['origin'], r['key']) for r in params['rows']}
+        for edge in [edge for edge in self.flights if (edge[0], edge[2]) in deletes]:
+            del self.flights[edge]
+
+    def _stored_airports(self, params):
+        return [{'code': code, 'hash': a.get('content_hash')} for code, a in self.airports.items()]
+
+    def _merge_airports(self, params):
+        for r in params['rows']:
+            airport = self.airports.setdefault(r['code'], {'codeIATA': r['code']})
+            airport.update(airport_name=r['name'], country=r['country'], city=r['city'], lat=r['lat'], lon=r['lon'],
+                           content_hash=r['hash'])
+
+    def _delete_stale_airports(self, params):
+        used = {code for origin, destination, _ in self.flights for code in (origin, destination)}
+        stale = [r['code'] for r in params['rows'] if r['code'] in self.airports and r['code'] not in used]
+        for code in stale:
+            del self.airports[code]
+        return [{'deleted': len(stale)}]
+
+    def _active_flights(self, params):
+        return [{'key': f['key'], 'origin': f['origin'], 'airline': f['airline'], 'flight_number': f['flight_number'],
+                 'STD': f['STD'], 'ATD': f['ATD'], 'checked': f.get('status_checked')}
+                for f in self.flights.values()
+                if params['start'] <= f['STD'] <= params['end'] and f.get('status') not in params['final']]
+
+    def _write_statuses(self, params):
+        changed = 0
+        for r in params['rows']:
+            for (origin, _, key), f in self.flights.items():
+                if (origin, key) != (r['origin'], r['key']):
+                    continue
+                f['status_checked'] = r['checked']
+                if r['fingerprint'] is not None and f.get('status_fingerprint', '') != r['fingerprint']:
+                    f.update({field: r[field] for field in flight_status.STATUS_FIELDS})
+                    f['status_fingerprint'] = r['fingerprint']
+                    f['status_updated'] = params['updated']
+                    changed += 1
+        return [{'changed': changed}]
@@ -0,0 +1,56 @@
+"""
+The schedule transform of the flights DAG before schedule_transform,
+copied verbatim from get_flights_data (the response body is passed in
+instead of being requested). Reference output of the vectorized transform.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+if not hasattr(pd.DataFrame, 'applymap'):
+    # Renamed DataFrame.map in pandas 2.1 and removed in 3.0; the DAGs run pandas 1.1
+    pd.DataFrame.applymap = pd.DataFrame.map
+
+
+def old_transform(flights):
+    df = pd.DataFrame(flights)
+
+    #Unpack flight legs and period of operation 
+    df_legs = df['legs'].apply(pd.Series)
+    df_op = df['periodOfOperationUTC'].apply(pd.Series)
+    df = pd.concat((df, df_op, df_legs), axis=1)
+    flight_list = []
+
+    # Flatten flight legs to one row per flight
+    for i in df_legs:
+            leg_df  = df[['airline', 'flightNumber','startDate', 'endDate', i]]
+            leg_df = leg_df.dropna(axis = 0)
+            unpacked_leg = leg_df[i].apply(pd.Series)
+            leg_df =  pd.concat((leg_df, unpacked_leg[['origin', 'destination', 'sequenceNumber',
+                    'aircraftDepartureTimeUTC', 'aircraftArrivalTimeUTC', 'aircraftType']]), axis = 1)
+            leg_df = leg_df.drop(i, axis = 1)
+            flight_list.append(leg_df)
+
+    clean_df = pd.concat((i for i in flight_list))
+    clean_df[['startDate', 'endDate']] = clean_df[['startDate', 'endDate']].applymap(lambda x:datetime.strptime(x, '%d%b%y'))
+
+    # Duplicate flights that operates on multiple day
+    df1 = clean_df[clean_df['startDate'] == clean_df['endDate']]
+    df2 = clean_df[clean_df['startDate'] != clean_df['endDate']]
+    sub_dfs= []
+    for gv ,gd in df2.groupby(['airline', 'flightNumber', 'sequenceNumber']):
+            gsd = gd['startDate'].min()
+            ged = gd['endDate'].max()
+            gdr = pd.date_range(gsd, ged, freq = 'd')
+            ngd= gd.set_index('startDate').reindex(gdr, method='ffill').reset_index().rename({'index':'startDate'}, axis=1)
+            sub_dfs.append(ngd)
+    df2b = pd.concat(sub_dfs, axis=0)
+    final_df = pd.concat([df1, df2b])
+    final_df = final_df.reset_index()
+
+    # Format departure and arrival time to neo4j date format
+    final_df['aircraftDepartureTimeUTC'] = final_df['aircraftDepartureTimeUTC'].apply(lambda x: f'{x//60:02d}:{x%60:02d}')
+    final_df['aircraftArrivalTimeUTC'] = final_df['aircraftArrivalTimeUTC'].apply(lambda x: f'{x//60:02d}:{x%60:02d}')
+    final_df['departureTime'] = final_df['startDate'].astype(str) + 'T' + final_df['aircraftDepartureTimeUTC']
+    final_df['arrivalTime'] = final_df['startDate'].astype(str) + 'T' + final_df['aircraftArrivalTimeUTC']
+    return final_df
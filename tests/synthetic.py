@@ -0,0 +1,75 @@
+"""Synthetic data shaped like the Lufthansa and Data.World responses, shared by the tests and benchmarks."""
+import random
+from datetime import date, datetime, timedelta
+
+AIRPORTS = ['FRA', 'MUC', 'JFK', 'LHR', 'CDG', 'BER', 'HAM', 'ZRH', 'VIE', 'ORD']
+AIRCRAFT = ['32N', '744', '359', '333', 'E90']
+DAYS = ['1234567', ' 2 4 6 ', '1 3 5  ', '     67']
+
+
+def _api_date(day):
+    return day.strftime('%d%b%y').upper()
+
+
+def schedules(n_flights, seed=0, daily=True, start=date(2023, 5, 1)):
+    """A flight-schedules response of n_flights flights of 1 to 3 legs."""
+    rnd = random.Random(seed)
+    flights = []
+    for number in range(1, n_flights + 1):
+        first = start + timedelta(days=rnd.randint(0, 3))
+        last = first + timedelta(days=rnd.choice([0, 0, 1, 2, 6]))
+        legs = []
+        for sequence in range(1, rnd.choice([1, 1, 1, 2, 3]) + 1):
+            origin, destination = rnd.sample(AIRPORTS, 2)
+            legs.append({
+                'sequenceNumber': sequence,
+                'origin': origin,
+                'destination': destination,
+                'serviceType': 'J',
+                'aircraftType': rnd.choice(AIRCRAFT),
+                'aircraftDepartureTimeUTC': rnd.randint(0, 1439),
+                'aircraftArrivalTimeUTC': rnd.randint(0, 1439),
+                'aircraftDepartureTimeDateDiffUTC': 0,
+            })
+        flights.append({
+            'airline': 'LH',
+            'flightNumber': number,
+            'suffix': '',
+            'periodOfOperationUTC': {
+                'startDate': _api_date(first),
+                'endDate': _api_date(last),
+                'daysOfOperation': '1234567' if daily else rnd.choice(DAYS),
+            },
+            'legs': legs,
+            'dataElements': [],
+        })
+    return flights
+
+
+def timetable_rows(n_flights, n_airports=200, days=2, seed=0, start='2099-05-01T00:00'):
+    """
+    (origin, destination, key, flight) rows as read from Neo4j for the
+    timetable snapshot, ATD stored on the day of departure.
+    """
+    rnd = random.Random(seed)
+    codes = [f'X{i:03d}' for i in range(n_airports)]
+    first = datetime.strptime(start, '%Y-%m-%dT%H:%M')
+    rows = []
+    for i in range(n_flights):
+        origin, destination = rnd.sample(codes, 2)
+        departure = first + timedelta(minutes=rnd.randrange(days * 1440))
+        arrival = departure + timedelta(minutes=rnd.randrange(45, 720))
+        number = rnd.randrange(1, 3000)
+        flight = {'flight_number': number, 'airline': rnd.choice(['LH', 'LX', 'OS']), 'aircraft': rnd.choice(AIRCRAFT),
+                  'STD': f'{departure:%Y-%m-%dT%H:%M}', 'ATD': f'{departure:%Y-%m-%d}T{arrival:%H:%M}',
+                  'From': None, 'To': None, 'DepartAirport': None, 'ArrivalAirport': None}
+        rows.append((origin, destination, f"{flight['airline']}{number}/1/{flight['STD']}/{i}", flight))
+    return rows
+
+
+def airport_columns(codes, seed=0):
+    """/airports?format=columns of codes at random coordinates."""
+    rnd = random.Random(seed)
+    return {'code': list(codes), 'name': [f'{code} Airport' for code in codes], 'city': list(codes),
+            'country': ['Germany'] * len(codes), 'lat': [round(rnd.uniform(-60, 70), 4) for _ in codes],
+            'lon': [round(rnd.uniform(-180, 180), 4) for _ in codes]}
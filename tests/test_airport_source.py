@@ -0,0 +1,103 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import airport_source
+
+ETAG = '"airports-1"'
+LAST_MODIFIED = 'Mon, 01 May 2023 10:00:00 GMT'
+
+CSV = (
+    '\ufeffAirport Name,three-digit code,Country,City,l1,l2\r\n'
+    'Frankfurt am Main,FRA,Germany,Frankfurt,50.0333,8.5706\r\n'
+    'No code,,Germany,Nowhere,50.0,8.0\r\n'
+    'München,MUC,Germany,Munich,48.3538,11.7861\r\n'
+    'Bad latitude,XXX,Nowhere,Nowhere,north,8.0\r\n'
+    'Out of range,YYY,Nowhere,Nowhere,91.0,8.0\r\n'
+    'Berlin Brandenburg,BER,Germany,Berlin,52.3667,13.5033\r\n'
+    '"Zürich, Kloten",ZRH,Switzerland,Zurich,47.4647,8.5492\r\n'
+    'Vienna,VIE,Austria,Vienna,48.1103,16.5697\r\n'
+)
+
+
+class FakeDataWorld(BaseHTTPRequestHandler):
+    """The airports CSV download, 304 when either validator of the request matches."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG or self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = CSV.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeDataWorld)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url_of(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/airports.csv'
+
+
+def test_download_and_validators(server):
+    response = airport_source.open_airports(url_of(server))
+    assert airport_source.response_validators(response) == {'etag': ETAG, 'last_modified': LAST_MODIFIED}
+    codes = [airport['codeIATA'] for airport in airport_source.iter_airports(response.iter_lines())]
+    assert codes == ['FRA', 'MUC', 'BER', 'ZRH', 'VIE']
+    assert 'If-None-Match' not in server.requests[0]
+
+
+@pytest.mark.parametrize('validators, header', [
+    ({'etag': ETAG, 'last_modified': None}, 'If-None-Match'),
+    ({'etag': None, 'last_modified': LAST_MODIFIED}, 'If-Modified-Since'),
+])
+def test_not_modified(server, validators, header):
+    assert airport_source.open_airports(url_of(server), validators) is None
+    assert len(server.requests) == 1 and header in server.requests[0]
+
+
+def test_changed_file_is_downloaded(server):
+    response = airport_source.open_airports(url_of(server), {'etag': '"airports-0"', 'last_modified': None})
+    assert response is not None and response.status_code == 200
+    response.close()
+
+
+def test_skips_bom_and_malformed_rows(caplog):
+    lines = CSV.encode('utf-8').splitlines()
+    airports = list(airport_source.iter_airports(lines))
+    # The byte order mark would otherwise be part of the first column name
+    assert airports[0] == {'airport_name': 'Frankfurt am Main', 'codeIATA': 'FRA', 'country': 'Germany',
+                           'city': 'Frankfurt', 'lat': 50.0333, 'lon': 8.5706}
+    assert airports[1]['airport_name'] == 'München'
+    assert airports[3]['airport_name'] == 'Zürich, Kloten'
+    assert 'Skipped 3 airport rows' in caplog.text
+
+
+@pytest.mark.parametrize('batch_size, sizes', [(2, [2, 2, 1]), (5, [5]), (10, [5]), (1, [1, 1, 1, 1, 1])])
+def test_batch_boundaries(batch_size, sizes):
+    batches = list(airport_source.iter_airport_batches(CSV.encode('utf-8').splitlines(), batch_size))
+    assert [len(batch) for batch in batches] == sizes
+    assert [airport['codeIATA'] for batch in batches for airport in batch] == ['FRA', 'MUC', 'BER', 'ZRH', 'VIE']
+
+
+def test_empty_file_has_no_batches():
+    assert list(airport_source.iter_airport_batches([], 2)) == []
@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import flight_status
+import neo4j_loader
+import schedule_transform
+import synthetic
+from fake_graph import FakeGraph
+
+NOW = datetime(2023, 5, 2, 12, 0, tzinfo=timezone.utc)
+
+
+def flight(number, std, atd, checked=None):
+    return {'key': f'LH{number}/1/{std}', 'origin': 'FRA', 'airline': 'LH', 'flight_number': number,
+            'STD': std, 'ATD': atd, 'checked': checked}
+
+
+class FakeStatusClient:
+    """Answers every request with the given status code for each leg of the flight stored in graph."""
+
+    def __init__(self, graph, code='DP'):
+        self.graph = graph
+        self.code = code
+        self.requests = []
+
+    def iter_flight_statuses(self, requests):
+        for flight_number, date in requests:
+            self.requests.append((flight_number, date))
+            legs = [f for f in self.graph.flights.values()
+                    if f"{f['airline']}{f['flight_number']}" == flight_number and f['STD'][:10] == date]
+            yield flight_number, date, {'FlightStatusResource': {'Flights': {'Flight': [{
+                'Departure': {'AirportCode': f['origin'], 'ScheduledTimeUTC': {'DateTime': f['STD'] + 'Z'}},
+                'Arrival': {'AirportCode': f['destination'], 'TimeStatus': {'Code': 'OT', 'Definition': 'On Time'}},
+                'FlightStatus': {'Code': self.code, 'Definition': self.code},
+            } for f in legs]}}}
+
+
+@pytest.fixture
+def graph():
+    graph = FakeGraph()
+    neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule(synthetic.schedules(200)))
+    graph.queries.clear()
+    return graph
+
+
+def test_due_flights_nearest_first():
+    flights = [
+        flight(1, '2023-05-02T06:00', '2023-05-02T20:00'),
+        flight(2, '2023-05-02T12:20', '2023-05-02T14:00'),
+        flight(3, '2023-05-02T11:55', '2023-05-02T13:00'),
+        flight(4, '2023-05-02T09:00', '2023-05-02T11:50'),
+    ]
+    assert list(flight_status.due_flights(flights, NOW, 10)) == [
+        ('LH3', '2023-05-02'), ('LH4', '2023-05-02'), ('LH2', '2023-05-02'), ('LH1', '2023-05-02')]
+    # The calls left after the most urgent flights are not spent on the others
+    assert list(flight_status.due_flights(flights, NOW, 2)) == [('LH3', '2023-05-02'), ('LH4', '2023-05-02')]
+
+
+def test_due_flights_skips_recent_checks():
+    flights = [
+        # Near flights are due every 5 minutes, the others every 30
+        flight(1, '2023-05-02T12:10', '2023-05-02T14:00', checked='2023-05-02T11:57:00+00:00'),
+        flight(2, '2023-05-02T12:10', '2023-05-02T14:00', checked='2023-05-02T11:50:00+00:00'),
+        flight(3, '2023-05-02T16:00', '2023-05-02T18:00', checked='2023-05-02T11:50:00+00:00'),
+        flight(4, '2023-05-02T16:00', '2023-05-02T18:00', checked='2023-05-02T11:20:00+00:00'),
+    ]
+    assert list(flight_status.due_flights(flights, NOW, 10)) == [('LH2', '2023-05-02'), ('LH4', '2023-05-02')]
+
+
+def test_poll_stamps_batches_in_increasing_order(graph, monkeypatch):
+    # A frozen clock gives every batch the same time, the stamps must still grow
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return NOW
+
+    monkeypatch.setattr(flight_status, 'datetime', FrozenDatetime)
+    client = FakeStatusClient(graph)
+    counts = flight_status.poll_statuses(graph, client, now=NOW, max_calls=1000, batch_size=10)
+    stamps = [params['updated'] for params in graph.ran(flight_status.STATUS_QUERY)]
+    assert len(stamps) > 2
+    assert stamps == sorted(set(stamps))
+    assert counts['changed'] == counts['checked'] > 0
+
+    updated = [f for f in graph.flights.values() if f.get('status_updated')]
+    assert len(updated) == counts['changed']
+    assert all(f['status'] == 'DP' for f in updated)
+
+
+def test_poll_only_stamps_changed_statuses(graph):
+    client = FakeStatusClient(graph)
+    flight_status.poll_statuses(graph, client, now=NOW, max_calls=1000)
+    stamped = {f['key']: f['status_updated'] for f in graph.flights.values() if f.get('status_updated')}
+
+    # Nothing is due again within the polling interval
+    assert flight_status.poll_statuses(graph, client, now=NOW, max_calls=1000)['requests'] == 0
+
+    # The same statuses later on: only the flights entering the window are stamped
+    later = NOW.replace(minute=40)
+    again = flight_status.poll_statuses(graph, client, now=later, max_calls=1000)
+    restamped = {f['key']: f['status_updated'] for f in graph.flights.values() if f.get('status_updated')}
+    assert again['checked'] > again['changed'] == len(restamped) - len(stamped)
+    assert {key: restamped[key] for key in stamped} == stamped
+
+    client.code = 'LD'
+    landed = flight_status.poll_statuses(graph, client, now=later.replace(hour=13), max_calls=1000)
+    assert landed['changed'] == landed['checked'] > 0
+    assert min(f['status_updated'] for f in graph.flights.values() if f.get('status') == 'LD') > max(stamped.values())
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import lufthansa_client
+
+
+class FakeLufthansa(BaseHTTPRequestHandler):
+    """
+    Token and flight-schedules endpoints: two pages per day linked with
+    Link: rel="next", 404 for days without flights. The first token issued
+    is rejected with 401 and the first request of throttled days gets a 429.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        state = self.server.state
+        self.rfile.read(int(self.headers['Content-Length']))
+        with state['lock']:
+            state['tokens'] += 1
+            token = f"token-{state['tokens']}"
+        self._send(200, {'access_token': token, 'token_type': 'bearer', 'expires_in': 3600})
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        day, page = query['startDate'], int(query.get('page', 1))
+        with state['lock']:
+            state['requests'].append((day, page, self.headers['Authorization']))
+            if self.headers['Authorization'] in state['revoked']:
+                return self._send(401, {'error': 'invalid token'})
+            if page == 1 and day in state['throttled']:
+                state['throttled'].discard(day)
+                return self._send(429, {'error': 'rate limited'}, {'Retry-After': '0'})
+        flights = state['schedules'].get(day)
+        if not flights:
+            return self._send(404, {'error': 'no flights'})
+        headers = {}
+        if page == 1:
+            headers['Link'] = f'<http://{self.headers["Host"]}{url.path}?startDate={day}&page=2>; rel="next"'
+        half = len(flights) // 2
+        self._send(200, flights[:half] if page == 1 else flights[half:], headers)
+
+
+def flights_of(day, numbers):
+    return [{'airline': 'LH', 'flightNumber': number, 'periodOfOperationUTC': {'startDate': day, 'endDate': day},
+             'legs': []} for number in numbers]
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeLufthansa)
+    httpd.state = {
+        'lock': threading.Lock(),
+        'tokens': 0,
+        'requests': [],
+        'revoked': set(),
+        'throttled': set(),
+        'schedules': {'01MAY23': flights_of('01MAY23', range(1, 7)), '02MAY23': flights_of('02MAY23', range(7, 11))},
+    }
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def client_for(server, **kwargs):
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    tokens = lufthansa_client.TokenManager('id', 'secret', base_url=base_url)
+    # backoff is long enough to tell a Retry-After wait from an exponential one
+    return lufthansa_client.LufthansaClient(tokens, base_url=base_url, rate=1000, backoff=30, **kwargs)
+
+
+def pulled_numbers(client, start, end):
+    return sorted(flight['flightNumber'] for flights in client.iter_schedules(['LH'], start, end)
+                  for flight in flights)
+
+
+def test_follows_link_pages(server):
+    client = client_for(server)
+    assert pulled_numbers(client, date(2023, 5, 1), date(2023, 5, 2)) == list(range(1, 11))
+    pages = sorted((day, page) for day, page, _ in server.state['requests'])
+    assert pages == [('01MAY23', 1), ('01MAY23', 2), ('02MAY23', 1), ('02MAY23', 2)]
+
+
+def test_day_without_flights(server):
+    client = client_for(server)
+    assert list(client.iter_schedules(['LH'], date(2023, 5, 3), date(2023, 5, 3))) == [[]]
+
+
+def test_retries_429_after_retry_after(server):
+    server.state['throttled'] = {'01MAY23', '02MAY23'}
+    client = client_for(server, max_workers=2)
+    start = time.monotonic()
+    assert pulled_numbers(client, date(2023, 5, 1), date(2023, 5, 2)) == list(range(1, 11))
+    # Retry-After: 0 is honoured instead of the 30 s backoff
+    assert time.monotonic() - start < 10
+    first_pages = [day for day, page, _ in server.state['requests'] if page == 1]
+    assert sorted(first_pages) == ['01MAY23', '01MAY23', '02MAY23', '02MAY23']
+
+
+def test_refreshes_token_after_401(server):
+    server.state['revoked'] = {'Bearer token-1'}
+    client = client_for(server, max_workers=1)
+    assert pulled_numbers(client, date(2023, 5, 1), date(2023, 5, 1)) == list(range(1, 7))
+    assert server.state['tokens'] == 2
+    assert [auth for _, _, auth in server.state['requests']] == ['Bearer token-1', 'Bearer token-2', 'Bearer token-2']
@@ -0,0 +1,162 @@
+import copy
+
+import pytest
+
+import neo4j_loader
+import schedule_transform
+import synthetic
+from fake_graph import FakeGraph
+
+
+def keyed(flights):
+    return neo4j_loader.add_flight_keys(schedule_transform.transform_schedule(flights))
+
+
+def stored_legs(graph):
+    return sorted((origin, destination, key, f['aircraft'], f['ATD'])
+                  for (origin, destination, key), f in graph.flights.items())
+
+
+def expected_legs(legs):
+    return sorted(zip(legs['origin'], legs['destination'], legs['key'], legs['aircraftType'], legs['arrivalTime']))
+
+
+def synced(flights):
+    graph = FakeGraph()
+    neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule(flights), batch_size=50)
+    graph.queries.clear()
+    return graph
+
+
+def leg_keys(final_df, flight_number, sequence):
+    legs = final_df[(final_df['flightNumber'] == flight_number) & (final_df['sequenceNumber'] == sequence)]
+    return set(legs['key'])
+
+
+def test_first_sync_inserts_every_leg():
+    final_df = schedule_transform.transform_schedule(synthetic.schedules(40))
+    graph = FakeGraph()
+    counts = neo4j_loader.sync_flights(graph, final_df, batch_size=50)
+    assert counts == {'inserted': len(final_df), 'updated': 0, 'deleted': 0}
+    assert stored_legs(graph) == expected_legs(keyed(synthetic.schedules(40)))
+    # One write transaction per batch of at most 50 legs
+    batches = [len(params['rows']) for params in graph.ran(neo4j_loader.FLIGHT_QUERY)]
+    assert max(batches) == 50 and sum(batches) == len(final_df)
+
+
+def test_counts_inserted_updated_and_deleted_legs():
+    flights = synthetic.schedules(40)
+    graph = synced(flights)
+    changed = copy.deepcopy(flights)
+    changed[0]['legs'][0]['aircraftType'] = '388'
+    del changed[1]
+    changed.append(synthetic.schedules(41)[-1])
+
+    old, new = keyed(flights), keyed(changed)
+    counts = neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule(changed), batch_size=50)
+    assert counts == {
+        'inserted': len(set(new['key']) - set(old['key'])),
+        'updated': len(leg_keys(new, 1, 1)),
+        'deleted': len(set(old['key']) - set(new['key'])),
+    }
+    assert counts['inserted'] and counts['updated'] and counts['deleted']
+    assert stored_legs(graph) == expected_legs(new)
+    # Only the changed legs are written
+    upserted = {r['key'] for params in graph.ran(neo4j_loader.FLIGHT_QUERY) for r in params['rows']}
+    assert upserted == leg_keys(new, 1, 1) | (set(new['key']) - set(old['key']))
+
+
+def test_moved_leg_is_deleted_then_recreated():
+    flights = synthetic.schedules(40)
+    graph = synced(flights)
+    moved = copy.deepcopy(flights)
+    leg = moved[0]['legs'][0]
+    old_origin = leg['origin']
+    leg['origin'] = next(code for code in synthetic.AIRPORTS if code not in (leg['origin'], leg['destination']))
+
+    new = keyed(moved)
+    counts = neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule(moved), batch_size=50)
+    keys = leg_keys(new, 1, 1)
+    assert counts == {'inserted': 0, 'updated': len(keys), 'deleted': 0}
+    deleted = [(r['origin'], r['key']) for params in graph.ran(neo4j_loader.DELETE_FLIGHT_QUERY) for r in params['rows']]
+    assert sorted(deleted) == sorted((old_origin, key) for key in keys)
+    # Deleted before the upserts, which would otherwise leave two relationships per key
+    runs = [query for query, _ in graph.queries]
+    assert runs.index(neo4j_loader.DELETE_FLIGHT_QUERY) < runs.index(neo4j_loader.FLIGHT_QUERY)
+    assert stored_legs(graph) == expected_legs(new)
+
+
+def test_origin_partition_leaves_other_origins_alone():
+    flights = synthetic.schedules(40)
+    graph = synced(flights)
+    full = keyed(flights)
+    partition = schedule_transform.transform_schedule(flights)
+    partition = partition[partition['origin'] == 'FRA']
+    dropped = full[(full['origin'] == 'FRA') & (full['flightNumber'] == partition['flightNumber'].iloc[0])]
+    partition = partition[partition['flightNumber'] != partition['flightNumber'].iloc[0]]
+
+    counts = neo4j_loader.sync_flights(graph, partition, batch_size=50, origins=['FRA'])
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': len(dropped)}
+    assert graph.ran(neo4j_loader.STORED_ORIGIN_FLIGHTS_QUERY) == [{'origins': ['FRA']}]
+    assert not graph.ran(neo4j_loader.STORED_FLIGHTS_QUERY)
+    assert stored_legs(graph) == expected_legs(full[~full['key'].isin(dropped['key'])])
+
+
+def test_unchanged_resync_writes_nothing():
+    flights = synthetic.schedules(40)
+    graph = synced(flights)
+    counts = neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule(flights), batch_size=50)
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 0}
+    assert not graph.ran(neo4j_loader.FLIGHT_QUERY)
+    assert not graph.ran(neo4j_loader.DELETE_FLIGHT_QUERY)
+
+
+def test_empty_schedule_is_refused():
+    graph = synced(synthetic.schedules(5))
+    with pytest.raises(ValueError):
+        neo4j_loader.sync_flights(graph, schedule_transform.transform_schedule([]))
+    assert graph.flights
+
+
+def airports(codes, **changes):
+    return [dict({'codeIATA': code, 'airport_name': f'{code} Airport', 'country': 'Germany', 'city': code,
+                  'lat': 50.0, 'lon': 8.5}, **changes) for code in codes]
+
+
+def test_unchanged_airports_are_skipped():
+    graph = FakeGraph()
+    codes = synthetic.AIRPORTS
+    assert neo4j_loader.sync_airports(graph, [airports(codes[:6]), airports(codes[6:])], batch_size=4) == \
+        {'inserted': len(codes), 'updated': 0, 'unchanged': 0}
+    graph.queries.clear()
+    assert neo4j_loader.sync_airports(graph, [airports(codes)], batch_size=4) == \
+        {'inserted': 0, 'updated': 0, 'unchanged': len(codes)}
+    assert not graph.ran(neo4j_loader.AIRPORT_QUERY)
+
+    moved = airports(codes)
+    moved[1]['lat'] = 48.35
+    assert neo4j_loader.sync_airports(graph, [moved], batch_size=4) == \
+        {'inserted': 0, 'updated': 1, 'unchanged': len(codes) - 1}
+    assert [r['code'] for params in graph.ran(neo4j_loader.AIRPORT_QUERY) for r in params['rows']] == [codes[1]]
+    assert graph.airports[codes[1]]['lat'] == 48.35
+
+
+def test_first_row_of_a_code_wins():
+    graph = FakeGraph()
+    batches = [airports(['FRA', 'MUC']), airports(['FRA'], airport_name='Frankfurt Hahn') + airports(['', 'BER'])]
+    assert neo4j_loader.sync_airports(graph, batches, batch_size=10) == {'inserted': 3, 'updated': 0, 'unchanged': 0}
+    assert sorted(graph.airports) == ['BER', 'FRA', 'MUC']
+    assert graph.airports['FRA']['airport_name'] == 'FRA Airport'
+
+
+def test_cleanup_deletes_vanished_airports_without_flights():
+    graph = synced(synthetic.schedules(5))
+    used = sorted(graph.airports)
+    neo4j_loader.sync_airports(graph, [airports(used + ['OLD'])])
+    assert neo4j_loader.sync_airports(graph, [airports(used[1:])], cleanup=True) == \
+        {'inserted': 0, 'updated': 0, 'unchanged': len(used) - 1, 'deleted': 1}
+    # used[0] still has flights and is kept
+    assert sorted(graph.airports) == used
+    # Without cleanup nothing is deleted
+    assert 'deleted' not in neo4j_loader.sync_airports(graph, [airports(used[2:])])
+    assert sorted(graph.airports) == used
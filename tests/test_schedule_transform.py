@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import schedule_transform
+from old_transform import old_transform
+from synthetic import schedules
+
+
+# old_transform's freq='d' is deprecated in recent pandas
+pytestmark = pytest.mark.filterwarnings("ignore:'d' is deprecated")
+
+ROW_COLUMNS = ['airline', 'flightNumber', 'sequenceNumber', 'origin', 'destination', 'aircraftType',
+               'departureTime', 'arrivalTime']
+
+
+def output_rows(final_df):
+    """Sorted (airline, flight number, sequence, origin, destination, aircraft, STD, ATD) of final_df."""
+    final_df = final_df.assign(departureTime=schedule_transform.format_minutes(final_df['departureTime']),
+                               arrivalTime=schedule_transform.format_minutes(final_df['arrivalTime']))
+    return old_rows(final_df)
+
+
+def old_rows(final_df):
+    """Same tuples from the string columns of old_transform."""
+    columns = [final_df[column].tolist() for column in ROW_COLUMNS]
+    return sorted((airline, int(number), int(sequence), origin, destination, aircraft, std, atd)
+                  for airline, number, sequence, origin, destination, aircraft, std, atd in zip(*columns))
+
+
+def operating(rows, flights):
+    """rows on the days of operation of their flight (1 = Monday, from the STD)."""
+    days = {flight['flightNumber']: flight['periodOfOperationUTC']['daysOfOperation'] for flight in flights}
+    return [row for row in rows
+            if str(datetime.strptime(row[6][:10], '%Y-%m-%d').isoweekday()) in days[row[1]]]
+
+
+def test_matches_old_transform():
+    flights = schedules(300, seed=1)
+    assert output_rows(schedule_transform.transform_schedule(flights)) == old_rows(old_transform(flights))
+
+
+def test_skips_days_not_operated():
+    # The old transform copied every leg to every day of its period,
+    # the vectorized one only to the days of operation
+    flights = schedules(300, seed=1, daily=False)
+    every_day = old_rows(old_transform(flights))
+    expected = operating(every_day, flights)
+    assert output_rows(schedule_transform.transform_schedule(flights)) == expected
+    assert len(expected) < len(every_day)
+
+
+def test_pages_match_single_response():
+    flights = schedules(500, seed=2, daily=False)
+    pages = [flights[i:i + 50] for i in range(0, len(flights), 50)]
+    pd.testing.assert_frame_equal(schedule_transform.transform_pages(pages),
+                                  schedule_transform.transform_schedule(flights))
+
+
+def test_overlapping_pages_are_kept_once():
+    flights = schedules(300, seed=3)
+    # Sub-queries of consecutive days return the flights operating on both
+    pages = [flights[:200], flights[100:]]
+    assert output_rows(schedule_transform.transform_pages(pages)) == old_rows(old_transform(flights))
+
+
+def test_days_of_operation():
+    flight = schedules(1)[0]
+    # Monday 1 to Sunday 7 May 2023, Tuesdays, Thursdays and Saturdays only
+    flight['periodOfOperationUTC'] = {'startDate': '01MAY23', 'endDate': '07MAY23', 'daysOfOperation': ' 2 4 6 '}
+    flight['legs'] = flight['legs'][:1]
+    flight['legs'][0]['aircraftDepartureTimeUTC'] = 600
+    final_df = schedule_transform.transform_schedule([flight])
+    assert schedule_transform.format_minutes(final_df['departureTime']).tolist() == [
+        '2023-05-02T10:00', '2023-05-04T10:00', '2023-05-06T10:00']
+
+
+def test_output_dtypes():
+    final_df = schedule_transform.transform_schedule(schedules(50))
+    assert list(final_df.columns) == schedule_transform.OUTPUT_COLUMNS
+    assert {column: str(dtype) for column, dtype in final_df.dtypes.items()} == schedule_transform.OUTPUT_DTYPES
+
+
+def test_empty_response():
+    final_df = schedule_transform.transform_pages([[], []])
+    assert final_df.empty
+    assert list(final_df.columns) == schedule_transform.OUTPUT_COLUMNS